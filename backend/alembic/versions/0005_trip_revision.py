@@ -0,0 +1,25 @@
+"""add revision counter to trips
+
+Revision ID: 0005_trip_revision
+Revises: 0004_budget_notes
+Create Date: 2026-10-19 09:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005_trip_revision"
+down_revision = "0004_budget_notes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("trips") as batch_op:
+        batch_op.add_column(sa.Column("revision", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("trips") as batch_op:
+        batch_op.drop_column("revision")
@@ -0,0 +1,62 @@
+"""database-level cascading deletes for trip children
+
+Revision ID: 0006_cascade_deletes
+Revises: 0005_trip_revision
+Create Date: 2026-10-19 09:30:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006_cascade_deletes"
+down_revision = "0005_trip_revision"
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table, ondelete)
+FOREIGN_KEYS = [
+    ("trip_members", "trip_id", "trips", "CASCADE"),
+    ("trip_destinations", "trip_id", "trips", "CASCADE"),
+    ("events", "trip_id", "trips", "CASCADE"),
+    ("budget_envelopes", "trip_id", "trips", "CASCADE"),
+    ("expenses", "trip_id", "trips", "CASCADE"),
+    ("expenses", "event_id", "events", "CASCADE"),
+    ("expenses", "envelope_id", "budget_envelopes", "SET NULL"),
+    ("weather_alerts", "trip_id", "trips", "CASCADE"),
+]
+
+# 0001 created these constraints unnamed; SQLite reflects them without a name, so give them one.
+SQLITE_NAMING = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+
+def _existing_name(table: str, column: str, referred: str) -> str:
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        if fk["constrained_columns"] == [column] and fk.get("name"):
+            return fk["name"]
+    return f"fk_{table}_{column}_{referred}"
+
+
+def _rebuild(ondelete_for) -> None:
+    tables = dict.fromkeys(table for table, _, _, _ in FOREIGN_KEYS)
+    for table in tables:
+        with op.batch_alter_table(table, naming_convention=SQLITE_NAMING) as batch_op:
+            for fk_table, column, referred, ondelete in FOREIGN_KEYS:
+                if fk_table != table:
+                    continue
+                batch_op.drop_constraint(_existing_name(table, column, referred), type_="foreignkey")
+                batch_op.create_foreign_key(
+                    f"{table}_{column}_fkey",
+                    referred,
+                    [column],
+                    ["id"],
+                    ondelete=ondelete_for(ondelete),
+                )
+
+
+def upgrade() -> None:
+    _rebuild(lambda ondelete: ondelete)
+
+
+def downgrade() -> None:
+    _rebuild(lambda ondelete: None)
@@ -0,0 +1,27 @@
+"""add template flag to trips
+
+Revision ID: 0007_trip_templates
+Revises: 0006_cascade_deletes
+Create Date: 2026-10-19 10:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007_trip_templates"
+down_revision = "0006_cascade_deletes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("trips") as batch_op:
+        batch_op.add_column(sa.Column("is_template", sa.Boolean(), nullable=False, server_default=sa.text("false")))
+    op.create_index("ix_trips_is_template", "trips", ["is_template"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_trips_is_template", table_name="trips")
+    with op.batch_alter_table("trips") as batch_op:
+        batch_op.drop_column("is_template")
@@ -0,0 +1,22 @@
+"""composite index for date-windowed event listing
+
+Revision ID: 0008_events_trip_date_index
+Revises: 0007_trip_templates
+Create Date: 2026-10-19 10:30:00.000000
+"""
+
+from alembic import op
+
+
+revision = "0008_events_trip_date_index"
+down_revision = "0007_trip_templates"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_events_trip_id_date_start_time", "events", ["trip_id", "date", "start_time"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_events_trip_id_date_start_time", table_name="events")
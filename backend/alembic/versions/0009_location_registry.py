@@ -0,0 +1,29 @@
+"""normalized key for deduplicating locations
+
+Revision ID: 0009_location_registry
+Revises: 0008_events_trip_date_index
+Create Date: 2026-10-19 11:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0009_location_registry"
+down_revision = "0008_events_trip_date_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing rows keep a NULL key (NULLs don't collide) until `python -m app.backfill_locations`
+    # merges their duplicates and fills it in.
+    with op.batch_alter_table("locations") as batch_op:
+        batch_op.add_column(sa.Column("normalized_key", sa.String(), nullable=True))
+    op.create_index("ix_locations_normalized_key", "locations", ["normalized_key"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_locations_normalized_key", table_name="locations")
+    with op.batch_alter_table("locations") as batch_op:
+        batch_op.drop_column("normalized_key")
@@ -0,0 +1,72 @@
+"""geohash column for proximity search over locations
+
+Revision ID: 0010_location_geohash
+Revises: 0009_location_registry
+Create Date: 2026-10-19 12:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0010_location_geohash"
+down_revision = "0009_location_registry"
+branch_labels = None
+depends_on = None
+
+# Frozen copy of app.services.geo.geohash_encode as of this revision; later edits there must not change it.
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lon: float, precision: int = 9) -> str:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # bits alternate starting with longitude
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            value = value * 2 + (lon >= mid)
+            lon_lo, lon_hi = (mid, lon_hi) if lon >= mid else (lon_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            value = value * 2 + (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("locations") as batch_op:
+        batch_op.add_column(sa.Column("geohash", sa.String(length=12), nullable=True))
+    op.create_index("ix_locations_geohash", "locations", ["geohash"], unique=False)
+
+    locations = sa.table(
+        "locations",
+        sa.column("id", sa.Integer),
+        sa.column("latitude", sa.Float),
+        sa.column("longitude", sa.Float),
+        sa.column("geohash", sa.String),
+    )
+    conn = op.get_bind()
+    rows = conn.execute(
+        sa.select(locations.c.id, locations.c.latitude, locations.c.longitude).where(
+            locations.c.latitude.is_not(None), locations.c.longitude.is_not(None)
+        )
+    ).all()
+    if rows:
+        conn.execute(
+            locations.update().where(locations.c.id == sa.bindparam("loc_id")).values(geohash=sa.bindparam("hash")),
+            [{"loc_id": row.id, "hash": geohash_encode(row.latitude, row.longitude)} for row in rows],
+        )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_locations_geohash", table_name="locations")
+    with op.batch_alter_table("locations") as batch_op:
+        batch_op.drop_column("geohash")
@@ -0,0 +1,95 @@
+"""full-text search over trips, events, locations and budget envelopes
+
+Postgres: a generated tsvector column with a GIN index on each searchable table.
+SQLite: one FTS5 table, search_index, kept in sync by triggers. Its rowid encodes
+the source row as id * 4 + kind (see app.services.search.SEARCH_KINDS), so the
+triggers update and delete entries by rowid instead of scanning.
+
+The generated columns are deliberately not mapped on the models.
+
+Revision ID: 0011_full_text_search
+Revises: 0010_location_geohash
+Create Date: 2026-10-19 13:00:00.000000
+"""
+
+from alembic import op
+
+
+revision = "0011_full_text_search"
+down_revision = "0010_location_geohash"
+branch_labels = None
+depends_on = None
+
+# table -> (kind code, trip id expression, title column, body column)
+SOURCES = {
+    "events": (0, "trip_id", "title", "notes"),
+    "locations": (1, "NULL", "name", "address"),
+    "trips": (2, "id", "name", "destination"),
+    "budget_envelopes": (3, "trip_id", "category", "notes"),
+}
+
+
+def _upgrade_postgres() -> None:
+    for table, (_, _, title, body) in SOURCES.items():
+        op.execute(
+            f"""
+            ALTER TABLE {table} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce({title}, '')), 'A')
+                || setweight(to_tsvector('english', coalesce({body}, '')), 'B')
+            ) STORED
+            """
+        )
+        op.execute(f"CREATE INDEX ix_{table}_search_vector ON {table} USING GIN (search_vector)")
+
+
+def _downgrade_postgres() -> None:
+    for table in SOURCES:
+        op.execute(f"DROP INDEX IF EXISTS ix_{table}_search_vector")
+        op.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector")
+
+
+def _upgrade_sqlite() -> None:
+    op.execute(
+        "CREATE VIRTUAL TABLE search_index USING fts5("
+        "trip_id UNINDEXED, title, body, tokenize='porter unicode61 remove_diacritics 2')"
+    )
+    for table, (kind, trip_id, title, body) in SOURCES.items():
+        new_trip_id = trip_id if trip_id == "NULL" else f"new.{trip_id}"
+        insert_new = (
+            f"INSERT INTO search_index(rowid, trip_id, title, body) "
+            f"VALUES (new.id * 4 + {kind}, {new_trip_id}, coalesce(new.{title}, ''), coalesce(new.{body}, ''));"
+        )
+        delete_old = f"DELETE FROM search_index WHERE rowid = old.id * 4 + {kind};"
+        op.execute(f"CREATE TRIGGER {table}_search_ai AFTER INSERT ON {table} BEGIN {insert_new} END")
+        op.execute(f"CREATE TRIGGER {table}_search_ad AFTER DELETE ON {table} BEGIN {delete_old} END")
+        watched = ", ".join(column for column in (trip_id, title, body) if column not in ("NULL", "id"))
+        op.execute(
+            f"CREATE TRIGGER {table}_search_au AFTER UPDATE OF {watched} ON {table} BEGIN {delete_old} {insert_new} END"
+        )
+        op.execute(
+            f"INSERT INTO search_index(rowid, trip_id, title, body) "
+            f"SELECT id * 4 + {kind}, {trip_id}, coalesce({title}, ''), coalesce({body}, '') FROM {table}"
+        )
+
+
+def _downgrade_sqlite() -> None:
+    for table in SOURCES:
+        for suffix in ("ai", "ad", "au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {table}_search_{suffix}")
+    op.execute("DROP TABLE IF EXISTS search_index")
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        _upgrade_postgres()
+    elif dialect == "sqlite":
+        _upgrade_sqlite()
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        _downgrade_postgres()
+    elif dialect == "sqlite":
+        _downgrade_sqlite()
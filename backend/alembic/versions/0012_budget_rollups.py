@@ -0,0 +1,46 @@
+"""budget rollups per trip and envelope
+
+Revision ID: 0012_budget_rollups
+Revises: 0011_full_text_search
+Create Date: 2026-10-19 14:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0012_budget_rollups"
+down_revision = "0011_full_text_search"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "budget_rollups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("trip_id", sa.Integer(), sa.ForeignKey("trips.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("envelope_key", sa.Integer(), nullable=False),
+        sa.Column("total_amount", sa.Float(), nullable=False, server_default="0"),
+        sa.Column("expense_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("last_spent_date", sa.Date(), nullable=True),
+        sa.UniqueConstraint("trip_id", "envelope_key", name="uq_budget_rollups_trip_envelope"),
+    )
+    op.create_index("ix_budget_rollups_id", "budget_rollups", ["id"], unique=False)
+    op.create_index("ix_budget_rollups_trip_id", "budget_rollups", ["trip_id"], unique=False)
+
+    # Seed from the existing ledger.
+    op.execute(
+        """
+        INSERT INTO budget_rollups (trip_id, envelope_key, total_amount, expense_count, last_spent_date)
+        SELECT trip_id, coalesce(envelope_id, 0), sum(amount), count(*), max(spent_at_date)
+        FROM expenses
+        GROUP BY trip_id, coalesce(envelope_id, 0)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_budget_rollups_trip_id", table_name="budget_rollups")
+    op.drop_index("ix_budget_rollups_id", table_name="budget_rollups")
+    op.drop_table("budget_rollups")
@@ -0,0 +1,66 @@
+"""fx rates and trip-currency expense amounts
+
+Revision ID: 0013_fx_rates
+Revises: 0012_budget_rollups
+Create Date: 2026-10-19 15:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0013_fx_rates"
+down_revision = "0012_budget_rollups"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "fx_rates",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("currency", sa.String(length=3), nullable=False),
+        sa.Column("rate_date", sa.Date(), nullable=False),
+        sa.Column("rate", sa.Float(), nullable=False),
+        sa.UniqueConstraint("currency", "rate_date", name="uq_fx_rates_currency_date"),
+    )
+    op.create_index("ix_fx_rates_id", "fx_rates", ["id"], unique=False)
+
+    with op.batch_alter_table("expenses") as batch_op:
+        batch_op.add_column(sa.Column("amount_converted", sa.Float(), nullable=True))
+    with op.batch_alter_table("budget_rollups") as batch_op:
+        batch_op.add_column(sa.Column("total_converted", sa.Float(), nullable=False, server_default="0"))
+        batch_op.add_column(sa.Column("unconverted_count", sa.Integer(), nullable=False, server_default="0"))
+
+    # No rates exist yet: only same-currency expenses can be priced in the trip currency.
+    # Loading rates (python -m app.load_fx_rates) converts the rest.
+    op.execute(
+        """
+        UPDATE expenses SET amount_converted = amount
+        WHERE currency = (SELECT trips.currency FROM trips WHERE trips.id = expenses.trip_id)
+        """
+    )
+    op.execute(
+        """
+        UPDATE budget_rollups SET
+            total_converted = coalesce((
+                SELECT sum(e.amount_converted) FROM expenses e
+                WHERE e.trip_id = budget_rollups.trip_id AND coalesce(e.envelope_id, 0) = budget_rollups.envelope_key
+            ), 0),
+            unconverted_count = (
+                SELECT count(*) FROM expenses e
+                WHERE e.trip_id = budget_rollups.trip_id AND coalesce(e.envelope_id, 0) = budget_rollups.envelope_key
+                  AND e.amount_converted IS NULL
+            )
+        """
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("budget_rollups") as batch_op:
+        batch_op.drop_column("unconverted_count")
+        batch_op.drop_column("total_converted")
+    with op.batch_alter_table("expenses") as batch_op:
+        batch_op.drop_column("amount_converted")
+    op.drop_index("ix_fx_rates_id", table_name="fx_rates")
+    op.drop_table("fx_rates")
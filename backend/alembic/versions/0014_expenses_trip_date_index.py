@@ -0,0 +1,22 @@
+"""composite index for the paginated expense ledger
+
+Revision ID: 0014_expenses_trip_date_index
+Revises: 0013_fx_rates
+Create Date: 2026-10-19 18:00:00.000000
+"""
+
+from alembic import op
+
+
+revision = "0014_expenses_trip_date_index"
+down_revision = "0013_fx_rates"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index("ix_expenses_trip_id_spent_at_date_id", "expenses", ["trip_id", "spent_at_date", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_expenses_trip_id_spent_at_date_id", table_name="expenses")
@@ -0,0 +1,27 @@
+"""duplicate-detection hash for imported statement expenses
+
+Revision ID: 0015_expense_dedupe_hash
+Revises: 0014_expenses_trip_date_index
+Create Date: 2026-10-19 19:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0015_expense_dedupe_hash"
+down_revision = "0014_expenses_trip_date_index"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("expenses") as batch_op:
+        batch_op.add_column(sa.Column("dedupe_hash", sa.String(length=40), nullable=True))
+    op.create_index("ix_expenses_trip_id_dedupe_hash", "expenses", ["trip_id", "dedupe_hash"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_expenses_trip_id_dedupe_hash", table_name="expenses")
+    with op.batch_alter_table("expenses") as batch_op:
+        batch_op.drop_column("dedupe_hash")
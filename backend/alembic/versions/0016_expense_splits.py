@@ -0,0 +1,45 @@
+"""expense payer and split shares
+
+Revision ID: 0016_expense_splits
+Revises: 0015_expense_dedupe_hash
+Create Date: 2026-10-19 20:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0016_expense_splits"
+down_revision = "0015_expense_dedupe_hash"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.batch_alter_table("expenses") as batch_op:
+        batch_op.add_column(sa.Column("paid_by_user_id", sa.Integer(), nullable=True))
+        batch_op.create_foreign_key(
+            "fk_expenses_paid_by_user_id_users", "users", ["paid_by_user_id"], ["id"], ondelete="SET NULL"
+        )
+        batch_op.create_index("ix_expenses_paid_by_user_id", ["paid_by_user_id"], unique=False)
+
+    op.create_table(
+        "expense_shares",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("expense_id", sa.Integer(), sa.ForeignKey("expenses.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("weight", sa.Float(), nullable=False, server_default="1"),
+        sa.UniqueConstraint("expense_id", "user_id", name="uq_expense_shares_expense_user"),
+    )
+    op.create_index("ix_expense_shares_id", "expense_shares", ["id"], unique=False)
+    op.create_index("ix_expense_shares_user_id", "expense_shares", ["user_id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_expense_shares_user_id", table_name="expense_shares")
+    op.drop_index("ix_expense_shares_id", table_name="expense_shares")
+    op.drop_table("expense_shares")
+    with op.batch_alter_table("expenses") as batch_op:
+        batch_op.drop_index("ix_expenses_paid_by_user_id")
+        batch_op.drop_constraint("fk_expenses_paid_by_user_id_users", type_="foreignkey")
+        batch_op.drop_column("paid_by_user_id")
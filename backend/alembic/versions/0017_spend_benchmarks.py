@@ -0,0 +1,42 @@
+"""cross-trip spend benchmarks per segment and category
+
+Revision ID: 0017_spend_benchmarks
+Revises: 0016_expense_splits
+Create Date: 2026-10-19 21:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0017_spend_benchmarks"
+down_revision = "0016_expense_splits"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "spend_benchmarks",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("trip_type", sa.String(), nullable=False),
+        sa.Column("price_sensitivity", sa.String(), nullable=False),
+        sa.Column("duration_bucket", sa.String(), nullable=False),
+        sa.Column("category", sa.String(), nullable=False),
+        sa.Column("trip_count", sa.Integer(), nullable=False),
+        sa.Column("segment_trip_count", sa.Integer(), nullable=False),
+        sa.Column("mean_share", sa.Float(), nullable=False),
+        sa.Column("p25_share", sa.Float(), nullable=False),
+        sa.Column("p50_share", sa.Float(), nullable=False),
+        sa.Column("p75_share", sa.Float(), nullable=False),
+        sa.Column("computed_at", sa.DateTime(), nullable=False),
+        sa.UniqueConstraint(
+            "trip_type", "price_sensitivity", "duration_bucket", "category", name="uq_spend_benchmarks_segment_category"
+        ),
+    )
+    op.create_index("ix_spend_benchmarks_id", "spend_benchmarks", ["id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_spend_benchmarks_id", table_name="spend_benchmarks")
+    op.drop_table("spend_benchmarks")
@@ -0,0 +1,126 @@
+"""event commitments: envelope and paid amount per event, committed totals in the rollups
+
+SQLite: events.envelope_id is added with a plain ALTER TABLE (REFERENCES inline) rather
+than a batch rebuild, which would drop the events full-text triggers from 0011.
+
+Revision ID: 0018_event_commitments
+Revises: 0017_spend_benchmarks
+Create Date: 2026-10-19 23:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0018_event_commitments"
+down_revision = "0017_spend_benchmarks"
+branch_labels = None
+depends_on = None
+
+ROLLUP_COLUMNS = ("committed_amount", "paid_amount", "refundable_amount")
+
+# Frozen copy of app.services.budgeting's mapping as of this revision; later edits there must not change it.
+EVENT_TYPE_CATEGORIES = {
+    "meal": "food",
+    "breakfast": "food",
+    "lunch": "food",
+    "dinner": "food",
+    "restaurant": "food",
+    "food": "food",
+    "flight": "transport",
+    "train": "transport",
+    "bus": "transport",
+    "ferry": "transport",
+    "car": "transport",
+    "transfer": "transport",
+    "transport": "transport",
+    "activity": "activities",
+    "tour": "activities",
+    "museum": "activities",
+    "show": "activities",
+    "hotel": "lodging",
+    "lodging": "lodging",
+}
+FALLBACK_CATEGORY = "flex"
+
+
+def _envelope_for(category_sql: str) -> str:
+    return (
+        "(SELECT min(b.id) FROM budget_envelopes b "
+        f"WHERE b.trip_id = events.trip_id AND lower(b.category) = {category_sql})"
+    )
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute(
+            "ALTER TABLE events ADD COLUMN envelope_id INTEGER REFERENCES budget_envelopes(id) ON DELETE SET NULL"
+        )
+    else:
+        op.add_column(
+            "events",
+            sa.Column(
+                "envelope_id",
+                sa.Integer(),
+                sa.ForeignKey("budget_envelopes.id", name="fk_events_envelope_id_budget_envelopes", ondelete="SET NULL"),
+                nullable=True,
+            ),
+        )
+    op.create_index("ix_events_envelope_id", "events", ["envelope_id"], unique=False)
+    op.add_column("events", sa.Column("paid_amount", sa.Float(), nullable=False, server_default="0"))
+    for column in ROLLUP_COLUMNS:
+        op.add_column("budget_rollups", sa.Column(column, sa.Float(), nullable=False, server_default="0"))
+
+    # Commit existing events against the envelope matching their type, else the flex envelope.
+    whens = " ".join(f"WHEN '{event_type}' THEN '{category}'" for event_type, category in EVENT_TYPE_CATEGORIES.items())
+    category = f"(CASE lower(trim(events.type)) {whens} ELSE '{FALLBACK_CATEGORY}' END)"
+    op.execute(
+        f"UPDATE events SET envelope_id = coalesce({_envelope_for(category)}, {_envelope_for(repr(FALLBACK_CATEGORY))})"
+    )
+    op.execute(
+        """
+        UPDATE events SET paid_amount = coalesce((
+            SELECT sum(e.amount_converted) FROM expenses e WHERE e.event_id = events.id
+        ), 0)
+        """
+    )
+
+    # Existing rollup rows, then rows for envelopes that only have events.
+    committed = """
+        SELECT trip_id, coalesce(envelope_id, 0) AS envelope_key,
+               sum(cost) AS committed_amount,
+               sum(CASE WHEN paid_amount < cost THEN paid_amount ELSE cost END) AS paid_amount,
+               sum(CASE WHEN is_refundable THEN cost ELSE 0 END) AS refundable_amount
+        FROM events WHERE cost IS NOT NULL
+        GROUP BY trip_id, coalesce(envelope_id, 0)
+    """
+    sets = ", ".join(
+        f"{column} = coalesce((SELECT c.{column} FROM ({committed}) c "
+        "WHERE c.trip_id = budget_rollups.trip_id AND c.envelope_key = budget_rollups.envelope_key), 0)"
+        for column in ROLLUP_COLUMNS
+    )
+    op.execute(f"UPDATE budget_rollups SET {sets}")
+    op.execute(
+        f"""
+        INSERT INTO budget_rollups (trip_id, envelope_key, total_amount, expense_count, total_converted,
+                                    unconverted_count, committed_amount, paid_amount, refundable_amount)
+        SELECT c.trip_id, c.envelope_key, 0, 0, 0, 0, c.committed_amount, c.paid_amount, c.refundable_amount
+        FROM ({committed}) c
+        WHERE NOT EXISTS (
+            SELECT 1 FROM budget_rollups r WHERE r.trip_id = c.trip_id AND r.envelope_key = c.envelope_key
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "DELETE FROM budget_rollups WHERE expense_count = 0 AND total_amount = 0 AND committed_amount <> 0"
+    )
+    for column in reversed(ROLLUP_COLUMNS):
+        op.drop_column("budget_rollups", column)
+    op.drop_column("events", "paid_amount")
+    op.drop_index("ix_events_envelope_id", table_name="events")
+    if op.get_bind().dialect.name != "sqlite":
+        op.drop_constraint("fk_events_envelope_id_budget_envelopes", "events", type_="foreignkey")
+    op.drop_column("events", "envelope_id")
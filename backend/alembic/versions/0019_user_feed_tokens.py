@@ -0,0 +1,25 @@
+"""per-user calendar feed tokens
+
+Revision ID: 0019_user_feed_tokens
+Revises: 0018_event_commitments
+Create Date: 2026-10-20 09:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0019_user_feed_tokens"
+down_revision = "0018_event_commitments"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("users", sa.Column("feed_token_hash", sa.String(length=64), nullable=True))
+    op.create_index("ix_users_feed_token_hash", "users", ["feed_token_hash"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_users_feed_token_hash", table_name="users")
+    op.drop_column("users", "feed_token_hash")
@@ -0,0 +1,33 @@
+"""events listing index matching the (date, start_time NULLS FIRST, id) keyset order
+
+Postgres sorts NULLs last in an ascending index by default, so the old
+(trip_id, date, start_time) index could not supply the listing's order or its
+cursor range. SQLite already sorts NULLs first and ignores postgresql_ops.
+
+Revision ID: 0020_events_keyset_index
+Revises: 0019_user_feed_tokens
+Create Date: 2026-10-20 10:00:00.000000
+"""
+
+from alembic import op
+
+
+revision = "0020_events_keyset_index"
+down_revision = "0019_user_feed_tokens"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.drop_index("ix_events_trip_id_date_start_time", table_name="events")
+    op.create_index(
+        "ix_events_trip_id_date_start_time_id",
+        "events",
+        ["trip_id", "date", "start_time", "id"],
+        postgresql_ops={"start_time": "NULLS FIRST"},
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_events_trip_id_date_start_time_id", table_name="events")
+    op.create_index("ix_events_trip_id_date_start_time", "events", ["trip_id", "date", "start_time"])
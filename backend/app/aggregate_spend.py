@@ -0,0 +1,26 @@
+"""Rebuild the cross-trip spend benchmarks behind data-driven envelope ratios.
+
+Run periodically (e.g. nightly): `python -m app.aggregate_spend`.
+"""
+
+import argparse
+
+from app.db import SessionLocal
+from app.services.analytics import aggregate_spend_benchmarks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        written = aggregate_spend_benchmarks(db)
+        db.commit()
+        print(f"Wrote {written} spend benchmark row(s).")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
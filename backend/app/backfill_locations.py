@@ -0,0 +1,98 @@
+"""Merge duplicate locations into the registry and geocode the ones missing coordinates.
+
+Run after migration 0009: `python -m app.backfill_locations [--no-geocode]`.
+"""
+
+import argparse
+import asyncio
+from collections import defaultdict
+from typing import Dict, List
+
+from sqlalchemy import case, delete, select, update
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal
+from app.models import Event, Location, TripDestination
+from app.services.geo import geohash_or_none
+from app.services.locations import bump_trips_using_locations, geocode_locations, location_key
+from app.services.revisions import bump_trip_revision
+
+CHUNK_SIZE = 500
+
+
+def _chunks(items: List, size: int = CHUNK_SIZE):
+    for offset in range(0, len(items), size):
+        yield items[offset : offset + size]
+
+
+def merge_duplicates(db: Session) -> int:
+    """Point every reference at the oldest row of each duplicate group, drop the rest and set the keys.
+
+    Returns the number of rows removed. Runs in the caller's transaction.
+    """
+    groups: Dict[str, List[tuple]] = defaultdict(list)
+    for row in db.execute(
+        select(Location.id, Location.name, Location.address, Location.latitude, Location.longitude).order_by(Location.id)
+    ):
+        groups[location_key(row.name, row.address)].append(row)
+
+    remap: Dict[int, int] = {}
+    coords: Dict[int, tuple] = {}
+    for rows in groups.values():
+        keeper = rows[0]
+        if keeper.latitude is None:
+            located = next((row for row in rows if row.latitude is not None and row.longitude is not None), None)
+            if located:
+                coords[keeper.id] = (located.latitude, located.longitude)
+        for row in rows[1:]:
+            remap[row.id] = keeper.id
+
+    duplicate_ids = list(remap)
+    for ids in _chunks(duplicate_ids):
+        touched = set()
+        for model in (TripDestination, Event):
+            touched.update(db.scalars(select(model.trip_id).where(model.location_id.in_(ids)).distinct()))
+            db.execute(
+                update(model)
+                .where(model.location_id.in_(ids))
+                .values(location_id=case({dup: remap[dup] for dup in ids}, value=model.location_id))
+            )
+        bump_trip_revision(db, touched)
+        db.execute(delete(Location).where(Location.id.in_(ids)))
+
+    if coords:
+        db.execute(
+            update(Location),
+            [
+                {"id": loc_id, "latitude": lat, "longitude": lon, "geohash": geohash_or_none(lat, lon)}
+                for loc_id, (lat, lon) in coords.items()
+            ],
+        )
+        bump_trips_using_locations(db, list(coords))
+    db.execute(
+        update(Location),
+        [{"id": rows[0].id, "normalized_key": key} for key, rows in groups.items()],
+    )
+    return len(duplicate_ids)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--no-geocode", action="store_true", help="only merge duplicates, skip geocoding")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        removed = merge_duplicates(db)
+        db.commit()
+        print(f"Merged {removed} duplicate location(s).")
+        if not args.no_geocode:
+            missing = db.scalars(select(Location.id).where(Location.latitude.is_(None)).order_by(Location.id)).all()
+            geocoded = asyncio.run(geocode_locations(missing))
+            print(f"Geocoded {geocoded} of {len(missing)} location(s) without coordinates.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""Check or rebuild the budget rollups from the expense ledger.
+
+`python -m app.budget_rollups --check [--trip ID ...]` reports drift and exits 1 if any;
+`python -m app.budget_rollups [--trip ID ...]` rebuilds (all trips by default).
+"""
+
+import argparse
+import sys
+
+from app.db import SessionLocal
+from app.services.revisions import bump_trip_revision
+from app.services.rollups import check_rollups, rebuild_rollups
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--check", action="store_true", help="only report mismatches, don't rewrite anything")
+    parser.add_argument("--trip", type=int, action="append", dest="trip_ids", help="limit to this trip (repeatable)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        mismatches = check_rollups(db, args.trip_ids)
+        for mismatch in mismatches:
+            print(
+                f"trip {mismatch['trip_id']} envelope {mismatch['envelope_key'] or 'uncategorized'}: "
+                f"stored {mismatch['stored']} expected {mismatch['expected']}"
+            )
+        if args.check:
+            print(f"{len(mismatches)} inconsistent rollup(s).")
+            sys.exit(1 if mismatches else 0)
+
+        rebuild_rollups(db, args.trip_ids)
+        # Cached budget views are tagged by revision; make them refetch.
+        bump_trip_revision(db, {mismatch["trip_id"] for mismatch in mismatches})
+        db.commit()
+        print(f"Rebuilt rollups; {len(mismatches)} had drifted.")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,19 @@
 
 from typing import Generator
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 
 from .config import get_settings
+from .services.commitments import assign_envelopes_on_flush
+from .services.fx import convert_expenses_on_flush
+from .services.revisions import bump_revisions_on_flush
+from .services.rollups import apply_rollup_changes_after_flush, collect_cascades_on_flush
+from .services.suggest import (
+    apply_location_changes_on_commit,
+    discard_location_changes_on_rollback,
+    queue_location_changes_on_flush,
+)
 
 settings = get_settings()
 
@@ -21,6 +30,38 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Full-text search and the budget rollup upserts are implemented for these backends only;
+# fail at startup rather than on every request or write.
+SUPPORTED_DIALECTS = ("postgresql", "sqlite")
+if engine.dialect.name not in SUPPORTED_DIALECTS:
+    raise RuntimeError(
+        f"Unsupported database {engine.dialect.name!r}: TRIP_PLANNER_DATABASE_URL must point at PostgreSQL or SQLite"
+    )
+
+if settings.database_url.startswith("sqlite"):
+
+    @event.listens_for(engine, "connect")
+    def _enable_sqlite_foreign_keys(dbapi_connection, connection_record) -> None:
+        # SQLite ships with FK enforcement off; ON DELETE CASCADE depends on it.
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+# Keep trip revision counters (and therefore ETags) in step with every ORM write.
+event.listen(SessionLocal, "before_flush", bump_revisions_on_flush)
+
+# Price expenses in their trip's currency and commit new events to an envelope, then
+# keep budget rollups in the same transaction as the writes they summarize.
+event.listen(SessionLocal, "before_flush", convert_expenses_on_flush)
+event.listen(SessionLocal, "before_flush", assign_envelopes_on_flush)
+event.listen(SessionLocal, "before_flush", collect_cascades_on_flush)
+event.listen(SessionLocal, "after_flush", apply_rollup_changes_after_flush)
+
+# Keep the in-memory location autocomplete index in step with committed writes.
+event.listen(SessionLocal, "after_flush", queue_location_changes_on_flush)
+event.listen(SessionLocal, "after_commit", apply_location_changes_on_commit)
+event.listen(SessionLocal, "after_rollback", discard_location_changes_on_rollback)
+
 
 def get_db() -> Generator:
     """Provide a SQLAlchemy session for FastAPI dependency injection."""
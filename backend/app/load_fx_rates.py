@@ -0,0 +1,74 @@
+"""Load historical FX rates from a CSV file and re-price foreign-currency expenses.
+
+`python -m app.load_fx_rates rates.csv`
+
+The file needs `date`, `currency` and `rate` columns, where rate is units of the
+currency per one USD on that date (e.g. `2024-05-01,EUR,0.93`). Existing
+(currency, date) pairs are overwritten, so re-running with corrected data is safe.
+"""
+
+import argparse
+import csv
+from datetime import date
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.db import SessionLocal
+from app.models import FxRate
+from app.services.fx import fx_rates, reconvert_expenses
+from app.services.revisions import bump_trip_revision
+from app.services.rollups import rebuild_rollups
+
+BATCH_SIZE = 1000
+
+
+def _upsert(db):
+    dialect = db.get_bind().dialect.name
+    stmt = (postgresql if dialect == "postgresql" else sqlite).insert(FxRate)
+    return stmt.on_conflict_do_update(
+        index_elements=[FxRate.currency, FxRate.rate_date], set_={"rate": stmt.excluded.rate}
+    )
+
+
+def load_rates(db, path: str) -> int:
+    loaded = 0
+    batch = []
+    with open(path, newline="", encoding="utf-8-sig") as fp:
+        for row in csv.DictReader(fp):
+            batch.append(
+                {
+                    "currency": row["currency"].strip().upper(),
+                    "rate_date": date.fromisoformat(row["date"].strip()),
+                    "rate": float(row["rate"]),
+                }
+            )
+            if len(batch) >= BATCH_SIZE:
+                db.execute(_upsert(db), batch)
+                loaded += len(batch)
+                batch = []
+    if batch:
+        db.execute(_upsert(db), batch)
+        loaded += len(batch)
+    return loaded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="CSV file with date,currency,rate columns")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        loaded = load_rates(db, args.path)
+        fx_rates.invalidate()
+        trip_ids = reconvert_expenses(db, foreign_only=True)
+        rebuild_rollups(db, trip_ids)
+        bump_trip_revision(db, trip_ids)
+        db.commit()
+        print(f"Loaded {loaded} rate(s); re-priced expenses on {len(trip_ids)} trip(s).")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
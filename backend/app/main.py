@@ -3,7 +3,7 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .routers import auth, budget, destinations, events, trips, weather
+from .routers import auth, budget, calendar, destinations, events, itinerary, locations, search, trips, weather
 from .schemas import HealthResponse
 
 app = FastAPI(title="Trip Itinerary Planner")
@@ -22,6 +22,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
 @app.get("/health", response_model=HealthResponse, tags=["health"])
@@ -42,3 +43,7 @@ app.include_router(destinations.router)
 app.include_router(events.router)
 app.include_router(budget.router)
 app.include_router(weather.router)
+app.include_router(calendar.router)
+app.include_router(itinerary.router)
+app.include_router(locations.router)
+app.include_router(search.router)
@@ -1,6 +1,6 @@
 """SQLAlchemy models for the trip planner domain."""
 
-from sqlalchemy import Column, Date, Float, ForeignKey, Integer, JSON, String, Text, Time
+from sqlalchemy import Column, Date, DateTime, Float, ForeignKey, Index, Integer, JSON, String, Text, Time, UniqueConstraint
 from sqlalchemy.orm import declarative_base, relationship
 from sqlalchemy import Boolean
 
@@ -14,6 +14,8 @@ class User(Base):
     email = Column(String, unique=True, nullable=False, index=True)
     username = Column(String, unique=True, nullable=False, index=True)
     password_hash = Column(String, nullable=False)
+    # SHA-256 of the calendar feed token (see app.routers.auth); None until one is issued.
+    feed_token_hash = Column(String(64), nullable=True, unique=True, index=True)
 
     trips_owned = relationship("Trip", back_populates="owner", cascade="all, delete-orphan")
     memberships = relationship("TripMember", back_populates="user", cascade="all, delete-orphan")
@@ -33,21 +35,26 @@ class Trip(Base):
     party_size = Column(Integer, nullable=False, default=1)
     price_sensitivity = Column(String, nullable=False, default="balanced")
     trip_type = Column(String, nullable=False, default="balanced")
+    # Bumped in the same transaction as any write to the trip or its children; backs the ETags.
+    revision = Column(Integer, nullable=False, default=0)
+    # Templates are public: any user may clone them.
+    is_template = Column(Boolean, nullable=False, default=False, index=True)
 
     owner = relationship("User", back_populates="trips_owned")
-    members = relationship("TripMember", back_populates="trip", cascade="all, delete-orphan")
-    destinations = relationship("TripDestination", back_populates="trip", cascade="all, delete-orphan")
-    events = relationship("Event", back_populates="trip", cascade="all, delete-orphan")
-    budget_envelopes = relationship("BudgetEnvelope", back_populates="trip", cascade="all, delete-orphan")
-    expenses = relationship("Expense", back_populates="trip", cascade="all, delete-orphan")
-    weather_alerts = relationship("WeatherAlert", back_populates="trip", cascade="all, delete-orphan")
+    # Child rows are removed by ON DELETE CASCADE; passive_deletes keeps the ORM from loading them first.
+    members = relationship("TripMember", back_populates="trip", cascade="all, delete-orphan", passive_deletes=True)
+    destinations = relationship("TripDestination", back_populates="trip", cascade="all, delete-orphan", passive_deletes=True)
+    events = relationship("Event", back_populates="trip", cascade="all, delete-orphan", passive_deletes=True)
+    budget_envelopes = relationship("BudgetEnvelope", back_populates="trip", cascade="all, delete-orphan", passive_deletes=True)
+    expenses = relationship("Expense", back_populates="trip", cascade="all, delete-orphan", passive_deletes=True)
+    weather_alerts = relationship("WeatherAlert", back_populates="trip", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class TripMember(Base):
     __tablename__ = "trip_members"
 
     id = Column(Integer, primary_key=True, index=True)
-    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
+    trip_id = Column(Integer, ForeignKey("trips.id", ondelete="CASCADE"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     role = Column(String, nullable=False)
 
@@ -64,6 +71,10 @@ class Location(Base):
     address = Column(String, nullable=True)
     latitude = Column(Float, nullable=True)
     longitude = Column(Float, nullable=True)
+    # Normalized "name|address"; the unique index makes the table a deduplicated registry.
+    normalized_key = Column(String, nullable=True, unique=True, index=True)
+    # Geohash of (latitude, longitude); prefix ranges on this index back proximity search.
+    geohash = Column(String(12), nullable=True, index=True)
 
     destinations = relationship("TripDestination", back_populates="location", cascade="all, delete-orphan")
     events = relationship("Event", back_populates="location")
@@ -73,7 +84,7 @@ class TripDestination(Base):
     __tablename__ = "trip_destinations"
 
     id = Column(Integer, primary_key=True, index=True)
-    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
+    trip_id = Column(Integer, ForeignKey("trips.id", ondelete="CASCADE"), nullable=False, index=True)
     location_id = Column(Integer, ForeignKey("locations.id"), nullable=False, index=True)
     sort_order = Column(Integer, nullable=False, default=0)
 
@@ -83,9 +94,21 @@ class TripDestination(Base):
 
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        # Serves the (trip, date window) scans and the listing's keyset in (date, start_time NULLS FIRST, id)
+        # order; Postgres needs NULLS FIRST spelled out, SQLite sorts NULLs first already.
+        Index(
+            "ix_events_trip_id_date_start_time_id",
+            "trip_id",
+            "date",
+            "start_time",
+            "id",
+            postgresql_ops={"start_time": "NULLS FIRST"},
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
+    trip_id = Column(Integer, ForeignKey("trips.id", ondelete="CASCADE"), nullable=False, index=True)
     location_id = Column(Integer, ForeignKey("locations.id"), nullable=True, index=True)
     date = Column(Date, nullable=False)
     start_time = Column(Time, nullable=True)
@@ -97,47 +120,136 @@ class Event(Base):
     category_type = Column(String, nullable=False, default="other")
     is_refundable = Column(Boolean, nullable=False, default=False)
     reservation_link = Column(String, nullable=True)
+    # Envelope the planned cost is committed against (assigned from the type when not given).
+    envelope_id = Column(Integer, ForeignKey("budget_envelopes.id", ondelete="SET NULL"), nullable=True, index=True)
+    # Converted amount of the expenses linked to this event; maintained by app.services.rollups.
+    paid_amount = Column(Float, nullable=False, default=0.0)
 
     trip = relationship("Trip", back_populates="events")
     location = relationship("Location", back_populates="events")
-    expenses = relationship("Expense", back_populates="event", cascade="all, delete-orphan")
+    expenses = relationship("Expense", back_populates="event", cascade="all, delete-orphan", passive_deletes=True)
 
 
 class BudgetEnvelope(Base):
     __tablename__ = "budget_envelopes"
 
     id = Column(Integer, primary_key=True, index=True)
-    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
+    trip_id = Column(Integer, ForeignKey("trips.id", ondelete="CASCADE"), nullable=False, index=True)
     category = Column(String, nullable=False)
     planned_amount = Column(Float, nullable=False)
     notes = Column(Text, nullable=True)
 
     trip = relationship("Trip", back_populates="budget_envelopes")
-    expenses = relationship("Expense", back_populates="envelope")
+    expenses = relationship("Expense", back_populates="envelope", passive_deletes=True)
 
 
 class Expense(Base):
     __tablename__ = "expenses"
+    __table_args__ = (
+        # Serves the ledger's keyset pages over (trip, spent_at_date, id) in either direction.
+        Index("ix_expenses_trip_id_spent_at_date_id", "trip_id", "spent_at_date", "id"),
+        # Statement imports skip rows whose hash the trip already has; NULL for hand-entered expenses.
+        Index("ix_expenses_trip_id_dedupe_hash", "trip_id", "dedupe_hash", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
-    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
-    envelope_id = Column(Integer, ForeignKey("budget_envelopes.id"), nullable=True, index=True)
-    event_id = Column(Integer, ForeignKey("events.id"), nullable=True, index=True)
+    trip_id = Column(Integer, ForeignKey("trips.id", ondelete="CASCADE"), nullable=False, index=True)
+    envelope_id = Column(Integer, ForeignKey("budget_envelopes.id", ondelete="SET NULL"), nullable=True, index=True)
+    event_id = Column(Integer, ForeignKey("events.id", ondelete="CASCADE"), nullable=True, index=True)
     description = Column(String, nullable=False)
     amount = Column(Float, nullable=False)
     currency = Column(String, nullable=False, default="USD")
     spent_at_date = Column(Date, nullable=False)
+    # Amount in the trip's currency at the spend date's FX rate; NULL when no rate is known.
+    amount_converted = Column(Float, nullable=True)
+    dedupe_hash = Column(String(40), nullable=True)
+    # Who fronted the money; NULL when the expense is not part of the group settlement.
+    paid_by_user_id = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True, index=True)
 
     trip = relationship("Trip", back_populates="expenses")
     envelope = relationship("BudgetEnvelope", back_populates="expenses")
     event = relationship("Event", back_populates="expenses")
+    # Loaded in one extra query per list of expenses rather than one per expense.
+    shares = relationship("ExpenseShare", cascade="all, delete-orphan", passive_deletes=True, lazy="selectin")
+
+
+class ExpenseShare(Base):
+    """Weighted share of an expense owed by one user; expenses without shares split evenly across the trip."""
+
+    __tablename__ = "expense_shares"
+    __table_args__ = (UniqueConstraint("expense_id", "user_id", name="uq_expense_shares_expense_user"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    expense_id = Column(Integer, ForeignKey("expenses.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    weight = Column(Float, nullable=False, default=1.0)
+
+
+class BudgetRollup(Base):
+    """Running expense and commitment totals per trip and envelope; maintained by app.services.rollups."""
+
+    __tablename__ = "budget_rollups"
+    __table_args__ = (UniqueConstraint("trip_id", "envelope_key", name="uq_budget_rollups_trip_envelope"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    trip_id = Column(Integer, ForeignKey("trips.id", ondelete="CASCADE"), nullable=False, index=True)
+    # Envelope id, or 0 for uncategorized expenses (a real key so the upsert's unique index applies).
+    envelope_key = Column(Integer, nullable=False)
+    total_amount = Column(Float, nullable=False, default=0.0)
+    expense_count = Column(Integer, nullable=False, default=0)
+    # Sum of amount_converted (trip currency) and the number of expenses without a rate.
+    total_converted = Column(Float, nullable=False, default=0.0)
+    unconverted_count = Column(Integer, nullable=False, default=0)
+    last_spent_date = Column(Date, nullable=True)
+    # Planned event costs in this envelope, the part already paid, and the refundable part.
+    committed_amount = Column(Float, nullable=False, default=0.0)
+    paid_amount = Column(Float, nullable=False, default=0.0)
+    refundable_amount = Column(Float, nullable=False, default=0.0)
+
+
+class FxRate(Base):
+    """Daily FX rate: units of `currency` per one unit of app.services.fx.BASE_CURRENCY."""
+
+    __tablename__ = "fx_rates"
+    __table_args__ = (UniqueConstraint("currency", "rate_date", name="uq_fx_rates_currency_date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    currency = Column(String(3), nullable=False)
+    rate_date = Column(Date, nullable=False)
+    rate = Column(Float, nullable=False)
+
+
+class SpendBenchmark(Base):
+    """Distribution of one category's share of trip spend within a trip segment; rebuilt by app.aggregate_spend."""
+
+    __tablename__ = "spend_benchmarks"
+    __table_args__ = (
+        UniqueConstraint(
+            "trip_type", "price_sensitivity", "duration_bucket", "category", name="uq_spend_benchmarks_segment_category"
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    trip_type = Column(String, nullable=False)
+    price_sensitivity = Column(String, nullable=False)
+    # See app.services.analytics.DURATION_BUCKETS; "*" aggregates all durations.
+    duration_bucket = Column(String, nullable=False)
+    category = Column(String, nullable=False)
+    # Segment trips with an envelope in this category, out of all segment trips.
+    trip_count = Column(Integer, nullable=False)
+    segment_trip_count = Column(Integer, nullable=False)
+    mean_share = Column(Float, nullable=False)
+    p25_share = Column(Float, nullable=False)
+    p50_share = Column(Float, nullable=False)
+    p75_share = Column(Float, nullable=False)
+    computed_at = Column(DateTime, nullable=False)
 
 
 class WeatherAlert(Base):
     __tablename__ = "weather_alerts"
 
     id = Column(Integer, primary_key=True, index=True)
-    trip_id = Column(Integer, ForeignKey("trips.id"), nullable=False, index=True)
+    trip_id = Column(Integer, ForeignKey("trips.id", ondelete="CASCADE"), nullable=False, index=True)
     date = Column(Date, nullable=False)
     severity = Column(String, nullable=False)
     summary = Column(String, nullable=False)
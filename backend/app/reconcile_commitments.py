@@ -0,0 +1,32 @@
+"""Reconcile committed event costs with the expense ledger.
+
+`python -m app.reconcile_commitments [--trip ID ...]` assigns envelopes to events without
+one, links expenses that evidently paid for an event, and rebuilds the budget rollups
+(all trips by default).
+"""
+
+import argparse
+
+from app.db import SessionLocal
+from app.services.commitments import reconcile_commitments
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--trip", type=int, action="append", dest="trip_ids", help="limit to this trip (repeatable)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        result = reconcile_commitments(db, args.trip_ids)
+        db.commit()
+        print(
+            f"Assigned envelopes to {result.envelopes_assigned} event(s), linked {result.expenses_linked} "
+            f"expense(s) across {len(result.trip_ids)} trip(s); rollups rebuilt."
+        )
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 """Authentication endpoints and JWT utilities."""
 
+import hashlib
+import secrets
 from datetime import datetime, timedelta
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -13,7 +15,7 @@ from sqlalchemy.orm import Session
 from app.config import get_settings
 from app.db import get_db
 from app.models import User
-from app.schemas import UserCreate, UserLogin, UserRead
+from app.schemas import FeedTokenResponse, UserCreate, UserLogin, UserRead
 
 settings = get_settings()
 SECRET_KEY = getattr(settings, "secret_key", "change-me-in-production")
@@ -23,6 +25,7 @@ ACCESS_TOKEN_EXPIRE_MINUTES = getattr(settings, "access_token_expire_minutes", 6
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
 
 router = APIRouter(tags=["auth"])
 
@@ -98,3 +101,45 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     if user is None:
         raise credentials_exception
     return user
+
+
+def _feed_token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+@router.post("/feed-token", response_model=FeedTokenResponse, status_code=status.HTTP_201_CREATED)
+def issue_feed_token(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    """Issue a calendar feed token, revoking any previous one. It never expires and only works on .ics feeds."""
+    token = secrets.token_urlsafe(32)
+    current_user.feed_token_hash = _feed_token_hash(token)
+    db.commit()
+    return FeedTokenResponse(feed_token=token)
+
+
+@router.delete("/feed-token", status_code=status.HTTP_204_NO_CONTENT)
+def revoke_feed_token(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    current_user.feed_token_hash = None
+    db.commit()
+    return None
+
+
+def get_feed_user(
+    token: Optional[str] = Query(default=None),
+    bearer: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(get_db),
+) -> User:
+    """Resolve the user for subscription feeds.
+
+    Calendar apps can only pass a credential in the URL, so `?token=` takes the per-user
+    feed token (never the account JWT); API clients may still send their bearer token.
+    """
+    if bearer:
+        return get_current_user(bearer, db)
+    user = db.query(User).filter(User.feed_token_hash == _feed_token_hash(token)).first() if token else None
+    if user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or missing feed token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
@@ -1,21 +1,45 @@
 """Budget endpoints."""
 
-from collections import defaultdict
+import io
+import tempfile
 from datetime import date
-from typing import Dict, List, Optional
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 
-from app.db import get_db
-from app.models import BudgetEnvelope, Expense, Trip
+from app.db import SessionLocal, get_db
+from app.models import BudgetEnvelope, Expense, ExpenseShare, Trip
 from app.routers.auth import get_current_user
-from app.schemas import BudgetEnvelopeCreate, BudgetEnvelopeRead, ExpenseCreate, ExpenseRead, BudgetEnvelopeSummary, BudgetSummaryResponse
+from app.schemas import (
+    BudgetEnvelopeCreate,
+    BudgetEnvelopeRead,
+    BudgetScenarioRequest,
+    BudgetScenarioResponse,
+    BudgetSummaryResponse,
+    ExpenseCreate,
+    ExpenseRead,
+    ExpenseShareIn,
+    SettlementResponse,
+    StatementImportResult,
+)
+from app.services.budget_summary import summarize_budget
 from app.services.budgeting import allocate_default_envelopes, ensure_envelopes
+from app.services.forecast import forecast_budget
+from app.services.paging import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.services.revisions import not_modified, trip_etag
+from app.services.scenarios import evaluate_scenarios
+from app.services.settlement import settle_trip, trip_participant_ids
+from app.services.statements import StatementImportError, import_statement, iter_csv_statement, iter_ofx_statement
 
 router = APIRouter(tags=["budget"])
 
+# Uploads larger than this spill from memory to a temporary file while they are parsed.
+SPOOL_MAX_MEMORY = 1024 * 1024
+
 
 def _get_trip(db: Session, trip_id: int) -> Trip:
     trip = db.query(Trip).filter(Trip.id == trip_id).first()
@@ -59,61 +83,44 @@ class ExpenseUpdate(BaseModel):
     amount: Optional[float] = None
     currency: Optional[str] = None
     spent_at_date: Optional[date] = None
+    paid_by_user_id: Optional[int] = None
+    shares: Optional[List[ExpenseShareIn]] = None
+
+
+def _validate_split(db: Session, trip: Trip, paid_by_user_id: Optional[int], shares: Optional[List[ExpenseShareIn]]) -> None:
+    user_ids = [share.user_id for share in shares or []]
+    if paid_by_user_id is not None:
+        user_ids.append(paid_by_user_id)
+    if not user_ids:
+        return
+    if shares and len({share.user_id for share in shares}) != len(shares):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Each user may appear once in shares")
+    outsiders = set(user_ids) - trip_participant_ids(db, trip)
+    if outsiders:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail=f"Users {sorted(outsiders)} are not on this trip"
+        )
 
 
-@router.get("/trips/{trip_id}/budget")
-def budget_summary(trip_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+@router.get("/trips/{trip_id}/budget", response_model=BudgetSummaryResponse)
+def budget_summary(
+    trip_id: int,
+    request: Request,
+    response: Response,
+    include_expenses: bool = Query(default=True, description="False returns totals only; page the ledger via /expenses"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
     trip = _get_trip(db, trip_id)
     _require_view_access(trip, current_user.id)
+    # recommended_daily_spend depends on today's date, so the tag does too.
+    cached = not_modified(request, response, trip_etag(trip, date.today().isoformat()))
+    if cached:
+        return cached
 
-    envelopes = db.query(BudgetEnvelope).filter(BudgetEnvelope.trip_id == trip_id).all()
-    expenses = db.query(Expense).filter(Expense.trip_id == trip_id).all()
-
-    category_planned: Dict[str, float] = defaultdict(float)
-    category_actual: Dict[str, float] = defaultdict(float)
-
-    for env in envelopes:
-        category_planned[env.category] += env.planned_amount
-
-    for exp in expenses:
-        if exp.envelope:
-            category_actual[exp.envelope.category] += exp.amount
-        else:
-            category_actual["uncategorized"] += exp.amount
-
-    planned_total_all = sum(category_planned.values())
-    actual_total_all = sum(category_actual.values())
-
-    # Remaining budget and forward-looking guidance
-    remaining_total = max(trip.total_budget - actual_total_all, 0.0)
-    days_left = max((trip.end_date - date.today()).days + 1, 1)
-    recommended_daily = remaining_total / days_left if days_left > 0 else 0.0
-
-    envelope_summaries: List[BudgetEnvelopeSummary] = []
-    for env in envelopes:
-        actual = sum(exp.amount for exp in expenses if exp.envelope_id == env.id)
-        remaining = max(env.planned_amount - actual, 0.0)
-        pct = env.planned_amount and max(0.0, min(100.0, (actual / env.planned_amount) * 100.0)) or 0.0
-        envelope_summaries.append(
-            BudgetEnvelopeSummary(
-                envelope=BudgetEnvelopeRead.model_validate(env),
-                actual_spent=actual,
-                remaining=remaining,
-                percent_used=pct,
-            )
-        )
-
-    return BudgetSummaryResponse(
-        envelopes=envelope_summaries,
-        expenses=[ExpenseRead.model_validate(e) for e in expenses],
-        categories={
-            cat: {"planned_total": category_planned.get(cat, 0.0), "actual_total": category_actual.get(cat, 0.0)}
-            for cat in set(category_planned.keys()).union(set(category_actual.keys()))
-        },
-        totals={"planned_total_all": planned_total_all, "actual_total_all": actual_total_all},
-        remaining_total=remaining_total,
-        recommended_daily_spend=recommended_daily,
-    )
+    summary = summarize_budget(db, trip, include_expenses=include_expenses)
+    summary.forecast = forecast_budget(db, trip)
+    return summary
 
 
 @router.post("/trips/{trip_id}/envelopes", response_model=BudgetEnvelopeRead, status_code=status.HTTP_201_CREATED)
@@ -168,6 +175,74 @@ def delete_envelope(envelope_id: int, db: Session = Depends(get_db), current_use
     return None
 
 
+def _after_cursor(cursor: str, descending: bool):
+    """Keyset predicate for rows after the cursor in (spent_at_date, id) order."""
+    try:
+        raw_date, last_id = decode_cursor(cursor)
+        last_date = date.fromisoformat(raw_date)
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    if descending:
+        return or_(Expense.spent_at_date < last_date, and_(Expense.spent_at_date == last_date, Expense.id < last_id))
+    return or_(Expense.spent_at_date > last_date, and_(Expense.spent_at_date == last_date, Expense.id > last_id))
+
+
+@router.get("/trips/{trip_id}/expenses", response_model=List[ExpenseRead])
+def list_expenses(
+    trip_id: int,
+    request: Request,
+    response: Response,
+    envelope_id: Optional[int] = Query(default=None),
+    event_id: Optional[int] = Query(default=None),
+    from_date: Optional[date] = Query(default=None, alias="from"),
+    to_date: Optional[date] = Query(default=None, alias="to"),
+    min_amount: Optional[float] = Query(default=None),
+    max_amount: Optional[float] = Query(default=None),
+    order: Literal["asc", "desc"] = Query(default="asc"),
+    limit: int = Query(default=50, ge=1, le=500),
+    cursor: Optional[str] = Query(default=None),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """One page of the trip's ledger in spent_at_date order; follow X-Next-Cursor for the next."""
+    trip = _get_trip(db, trip_id)
+    _require_view_access(trip, current_user.id)
+    cached = not_modified(request, response, trip_etag(trip))
+    if cached:
+        return cached
+
+    query = db.query(Expense).filter(Expense.trip_id == trip_id)
+    if envelope_id is not None:
+        query = query.filter(Expense.envelope_id == envelope_id)
+    if event_id is not None:
+        query = query.filter(Expense.event_id == event_id)
+    if from_date:
+        query = query.filter(Expense.spent_at_date >= from_date)
+    if to_date:
+        query = query.filter(Expense.spent_at_date <= to_date)
+    # Amounts as entered, in each expense's own currency.
+    if min_amount is not None:
+        query = query.filter(Expense.amount >= min_amount)
+    if max_amount is not None:
+        query = query.filter(Expense.amount <= max_amount)
+    descending = order == "desc"
+    if cursor:
+        query = query.filter(_after_cursor(cursor, descending))
+    if descending:
+        query = query.order_by(Expense.spent_at_date.desc(), Expense.id.desc())
+    else:
+        query = query.order_by(Expense.spent_at_date, Expense.id)
+
+    expenses = query.limit(limit + 1).all()
+    if len(expenses) > limit:
+        expenses = expenses[:limit]
+        last = expenses[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.spent_at_date, last.id)
+    return expenses
+
+
 @router.post("/trips/{trip_id}/expenses", response_model=ExpenseRead, status_code=status.HTTP_201_CREATED)
 def create_expense(trip_id: int, payload: ExpenseCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     trip = _get_trip(db, trip_id)
@@ -176,13 +251,62 @@ def create_expense(trip_id: int, payload: ExpenseCreate, db: Session = Depends(g
     if payload.trip_id != trip_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Trip ID mismatch")
 
-    expense = Expense(**payload.model_dump())
+    _validate_split(db, trip, payload.paid_by_user_id, payload.shares)
+    expense = Expense(**payload.model_dump(exclude={"shares"}))
+    expense.shares = [ExpenseShare(**share.model_dump()) for share in payload.shares or []]
     db.add(expense)
     db.commit()
     db.refresh(expense)
     return expense
 
 
+def _import_statement_from_spool(
+    trip_id: int, user_id: int, spool, fmt: str, currency: Optional[str], spend_sign: int, date_format: Optional[str]
+) -> StatementImportResult:
+    """Runs in a worker thread with its own session, so nothing blocking touches the event loop."""
+    db = SessionLocal()
+    try:
+        trip = _get_trip(db, trip_id)
+        _require_edit_access(trip, user_id)
+        text = io.TextIOWrapper(spool, encoding="utf-8-sig", errors="replace", newline="")
+        rows = iter_ofx_statement(text) if fmt == "ofx" else iter_csv_statement(text, date_format)
+        try:
+            result = import_statement(db, trip, rows, currency=currency, spend_sign=spend_sign)
+        except StatementImportError as exc:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=exc.errors)
+        except ValueError as exc:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not parse {fmt} statement: {exc}")
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+
+@router.post("/trips/{trip_id}/expenses/import", response_model=StatementImportResult)
+async def import_expense_statement(
+    trip_id: int,
+    request: Request,
+    format: Optional[Literal["csv", "ofx"]] = Query(default=None),
+    currency: Optional[str] = Query(default=None, min_length=3, max_length=3, description="Defaults to the trip currency"),
+    spending: Literal["negative", "positive"] = Query(default="negative", description="Sign of spending rows"),
+    date_format: Optional[str] = Query(default=None, description="strptime format, e.g. %d/%m/%Y"),
+    current_user=Depends(get_current_user),
+):
+    """Import a bank statement as expenses, categorized into envelopes; re-imports skip known rows."""
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("ofx" if "ofx" in content_type else "csv")
+    spend_sign = -1 if fmt == "ofx" or spending == "negative" else 1
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        # The trip lookup, parsing and batched inserts are blocking; keep them off the event loop.
+        return await run_in_threadpool(
+            _import_statement_from_spool, trip_id, current_user.id, spool, fmt, currency, spend_sign, date_format
+        )
+
+
 def _get_expense_or_404(db: Session, expense_id: int) -> Expense:
     expense = db.query(Expense).filter(Expense.id == expense_id).first()
     if not expense:
@@ -199,10 +323,15 @@ def update_expense(expense_id: int, payload: ExpenseUpdate, db: Session = Depend
     if payload.trip_id and payload.trip_id != expense.trip_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot move expense to another trip")
 
-    for field, value in payload.model_dump(exclude_unset=True).items():
-        if field == "trip_id":
-            continue
+    changes = payload.model_dump(exclude_unset=True, exclude={"trip_id", "shares"})
+    _validate_split(db, trip, changes.get("paid_by_user_id"), payload.shares)
+    for field, value in changes.items():
         setattr(expense, field, value)
+    if "shares" in payload.model_fields_set:
+        # Flush the removals first so re-adding a user does not trip the unique constraint.
+        expense.shares = []
+        db.flush()
+        expense.shares = [ExpenseShare(**share.model_dump()) for share in payload.shares or []]
 
     db.commit()
     db.refresh(expense)
@@ -220,12 +349,42 @@ def delete_expense(expense_id: int, db: Session = Depends(get_db), current_user=
     return None
 
 
+@router.get("/trips/{trip_id}/settlement", response_model=SettlementResponse)
+def trip_settlement(
+    trip_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Who owes whom for expenses with a payer, settled with as few transfers as possible."""
+    trip = _get_trip(db, trip_id)
+    _require_view_access(trip, current_user.id)
+    cached = not_modified(request, response, trip_etag(trip))
+    if cached:
+        return cached
+    return settle_trip(db, trip)
+
+
+@router.post("/trips/{trip_id}/budget/scenarios", response_model=BudgetScenarioResponse)
+def budget_scenarios(
+    trip_id: int,
+    payload: BudgetScenarioRequest,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Compare what-if budgets (budget, profile, length, spend changes) side by side; nothing is saved."""
+    trip = _get_trip(db, trip_id)
+    _require_view_access(trip, current_user.id)
+    return evaluate_scenarios(db, trip, payload.scenarios)
+
+
 @router.post("/trips/{trip_id}/budget/recalculate", response_model=List[BudgetEnvelopeRead])
 def recalc_envelopes(trip_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     trip = _get_trip(db, trip_id)
     _require_edit_access(trip, current_user.id)
 
-    ensure_envelopes(trip, db, allocate_default_envelopes(trip))
+    ensure_envelopes(trip, db, allocate_default_envelopes(trip, db))
     db.commit()
     updated = db.query(BudgetEnvelope).filter(BudgetEnvelope.trip_id == trip_id).all()
     return [BudgetEnvelopeRead.model_validate(env) for env in updated]
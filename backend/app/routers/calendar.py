@@ -0,0 +1,122 @@
+"""iCalendar subscription feeds for trip itineraries."""
+
+import hashlib
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import or_, select
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app.models import Event, Location, Trip, TripMember
+from app.routers.auth import get_feed_user
+from app.services.icalendar import stream_calendar
+from app.services.revisions import not_modified, trip_etag
+
+router = APIRouter(tags=["calendar"])
+
+ICS_MEDIA_TYPE = "text/calendar; charset=utf-8"
+# Subscribers poll often; let them reuse a copy briefly and revalidate with If-None-Match after that.
+FEED_CACHE_CONTROL = "private, max-age=300"
+FEED_BATCH_SIZE = 500
+
+
+def _get_trip(db: Session, trip_id: int) -> Trip:
+    trip = db.query(Trip).filter(Trip.id == trip_id).first()
+    if not trip:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trip not found")
+    return trip
+
+
+def _require_view_access(trip: Trip, user_id: int) -> None:
+    if trip.owner_id == user_id:
+        return
+    if any(m.user_id == user_id for m in trip.members):
+        return
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized for this trip")
+
+
+def _itinerary_rows(db: Session, *criteria):
+    """Event rows joined with their location, read through a server-side cursor."""
+    stmt = (
+        select(
+            Event.id,
+            Event.trip_id,
+            Event.date,
+            Event.start_time,
+            Event.end_time,
+            Event.title,
+            Event.type,
+            Event.notes,
+            Event.reservation_link,
+            Location.name.label("location_name"),
+            Location.address.label("location_address"),
+            Location.latitude,
+            Location.longitude,
+        )
+        .outerjoin(Location, Location.id == Event.location_id)
+        .where(*criteria)
+        .order_by(Event.date, Event.start_time, Event.id)
+        .execution_options(stream_results=True, yield_per=FEED_BATCH_SIZE)
+    )
+    return db.execute(stmt)
+
+
+def _feed_response(body, filename: str, etag: str) -> StreamingResponse:
+    return StreamingResponse(
+        body,
+        media_type=ICS_MEDIA_TYPE,
+        headers={
+            "ETag": etag,
+            "Cache-Control": FEED_CACHE_CONTROL,
+            "Content-Disposition": f'inline; filename="{filename}"',
+        },
+    )
+
+
+@router.get("/trips/{trip_id}/calendar.ics")
+def trip_calendar(
+    trip_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_feed_user),
+):
+    trip = _get_trip(db, trip_id)
+    _require_view_access(trip, current_user.id)
+    etag = trip_etag(trip, "ics")
+    cached = not_modified(request, response, etag)
+    if cached:
+        cached.headers["Cache-Control"] = FEED_CACHE_CONTROL
+        return cached
+
+    rows = _itinerary_rows(db, Event.trip_id == trip_id)
+    return _feed_response(stream_calendar(trip.name, rows), f"trip-{trip_id}.ics", etag)
+
+
+@router.get("/calendar.ics")
+def user_calendar(
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_feed_user),
+):
+    accessible = (
+        select(Trip.id, Trip.name, Trip.revision)
+        .outerjoin(TripMember, TripMember.trip_id == Trip.id)
+        .where(or_(Trip.owner_id == current_user.id, TripMember.user_id == current_user.id))
+        .distinct()
+        .order_by(Trip.id)
+    )
+    trips = db.execute(accessible).all()
+    # The feed changes exactly when the set of trips or any of their revisions does.
+    fingerprint = hashlib.sha1(",".join(f"{t.id}:{t.revision}" for t in trips).encode()).hexdigest()[:16]
+    etag = f'W/"user-{current_user.id}-{fingerprint}"'
+    cached = not_modified(request, response, etag)
+    if cached:
+        cached.headers["Cache-Control"] = FEED_CACHE_CONTROL
+        return cached
+
+    trip_names = {t.id: t.name for t in trips}
+    rows = _itinerary_rows(db, Event.trip_id.in_(list(trip_names)))
+    return _feed_response(stream_calendar("My trips", rows, trip_names), "trips.ics", etag)
@@ -1,13 +1,19 @@
 """Trip destinations and locations management."""
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy import func
+from typing import List, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response, status
+from sqlalchemy import case, func, select, update
 from sqlalchemy.orm import Session, joinedload
 
 from app.db import get_db
 from app.models import Trip, TripDestination, Location
 from app.routers.auth import get_current_user
-from app.schemas import LocationCreate, LocationRead, TripDestinationRead
+from app.schemas import DestinationOptimizeRequest, DestinationOrderUpdate, LocationCreate, LocationRead, TripDestinationRead
+from app.services.geo import haversine_matrix
+from app.services.locations import geocode_in_background, resolve_location
+from app.services.revisions import bump_trip_revision, not_modified, trip_etag
+from app.services.routing import optimize_order, path_length
 
 router = APIRouter(prefix="/trips", tags=["destinations"])
 
@@ -36,10 +42,21 @@ def _require_owner_or_editor(trip: Trip, user_id: int) -> None:
     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only owners or editors can modify destinations")
 
 
-@router.get("/{trip_id}/destinations")
-def list_destinations(trip_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
-    trip = _get_trip(db, trip_id)
-    _require_owner_or_member(trip, current_user.id)
+def _write_sort_order(db: Session, trip_id: int, ordered_ids: List[int]) -> None:
+    """Rewrite every destination's sort_order in a single CASE update and bump the trip revision."""
+    if not ordered_ids:
+        return
+    positions = {dest_id: position for position, dest_id in enumerate(ordered_ids, start=1)}
+    db.execute(
+        update(TripDestination)
+        .where(TripDestination.trip_id == trip_id, TripDestination.id.in_(ordered_ids))
+        .values(sort_order=case(positions, value=TripDestination.id))
+        .execution_options(synchronize_session=False)
+    )
+    bump_trip_revision(db, trip_id)
+
+
+def _serialize_destinations(db: Session, trip_id: int) -> list:
     destinations = (
         db.query(TripDestination)
         .options(joinedload(TripDestination.location))
@@ -58,26 +75,122 @@ def list_destinations(trip_id: int, db: Session = Depends(get_db), current_user=
     ]
 
 
+@router.get("/{trip_id}/destinations")
+def list_destinations(
+    trip_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    trip = _get_trip(db, trip_id)
+    _require_owner_or_member(trip, current_user.id)
+    cached = not_modified(request, response, trip_etag(trip))
+    if cached:
+        return cached
+    return _serialize_destinations(db, trip_id)
+
+
+@router.put("/{trip_id}/destinations/order")
+def set_destination_order(
+    trip_id: int,
+    payload: DestinationOrderUpdate,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    trip = _get_trip(db, trip_id)
+    _require_owner_or_editor(trip, current_user.id)
+
+    # Serialize concurrent reorders of the same trip (no-op on SQLite, which locks the whole file).
+    db.execute(select(Trip.id).where(Trip.id == trip_id).with_for_update())
+    current_ids = set(db.scalars(select(TripDestination.id).where(TripDestination.trip_id == trip_id)))
+    requested = payload.destination_ids
+    if len(set(requested)) != len(requested) or set(requested) != current_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="destination_ids must list every destination of this trip exactly once",
+        )
+
+    _write_sort_order(db, trip_id, requested)
+    db.commit()
+    return _serialize_destinations(db, trip_id)
+
+
+@router.post("/{trip_id}/destinations/optimize")
+def optimize_destinations(
+    trip_id: int,
+    payload: Optional[DestinationOptimizeRequest] = None,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    trip = _get_trip(db, trip_id)
+    _require_owner_or_editor(trip, current_user.id)
+    payload = payload or DestinationOptimizeRequest()
+
+    rows = db.execute(
+        select(TripDestination.id, Location.latitude, Location.longitude)
+        .join(Location, Location.id == TripDestination.location_id)
+        .where(TripDestination.trip_id == trip_id)
+        .order_by(TripDestination.sort_order, TripDestination.id)
+    ).all()
+    located = [row for row in rows if row.latitude is not None and row.longitude is not None]
+    # Stops without coordinates can't be placed; keep them after the routed ones in their current order.
+    unlocated = [row.id for row in rows if row.latitude is None or row.longitude is None]
+    index_of = {row.id: i for i, row in enumerate(located)}
+
+    if payload.start_destination_id is not None and payload.start_destination_id == payload.end_destination_id:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Start and end destinations must be different"
+        )
+    endpoints = []
+    for dest_id in (payload.start_destination_id, payload.end_destination_id):
+        if dest_id is None:
+            endpoints.append(None)
+        elif dest_id not in index_of:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Destination {dest_id} is not a located destination of this trip",
+            )
+        else:
+            endpoints.append(index_of[dest_id])
+
+    lat = [row.latitude for row in located]
+    lon = [row.longitude for row in located]
+    order = optimize_order(lat, lon, start=endpoints[0], end=endpoints[1])
+    dist = haversine_matrix(lat, lon) if located else None
+
+    _write_sort_order(db, trip_id, [located[i].id for i in order] + unlocated)
+    db.commit()
+    return {
+        "destinations": _serialize_destinations(db, trip_id),
+        "distance_km_before": round(path_length(dist, list(range(len(located)))), 3) if located else 0.0,
+        "distance_km_after": round(path_length(dist, order), 3) if located else 0.0,
+    }
+
+
 @router.post("/{trip_id}/destinations", status_code=status.HTTP_201_CREATED)
 def add_destination(
     trip_id: int,
     payload: LocationCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
     trip = _get_trip(db, trip_id)
     _require_owner_or_editor(trip, current_user.id)
 
-    location = Location(name=payload.name, type=payload.type, address=payload.address)
-    db.add(location)
-    db.commit()
-    db.refresh(location)
+    location, _ = resolve_location(db, payload.name, payload.type, payload.address)
 
     max_order = db.query(func.coalesce(func.max(TripDestination.sort_order), 0)).filter(TripDestination.trip_id == trip_id).scalar()
     dest = TripDestination(trip_id=trip_id, location_id=location.id, sort_order=max_order + 1)
     db.add(dest)
     db.commit()
     db.refresh(dest)
+    db.refresh(location)
+
+    if location.latitude is None:
+        # Geocode after the response is sent; reused rows that still lack coordinates get another try.
+        background_tasks.add_task(geocode_in_background, [location.id])
 
     return {"destination": TripDestinationRead.model_validate(dest), "location": LocationRead.model_validate(location)}
 
@@ -1,15 +1,36 @@
 """Event management endpoints."""
 
 from datetime import date as date_type
-from typing import List, Optional
+from datetime import time as time_type
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from pydantic import ValidationError
+from sqlalchemy import and_, delete, insert, or_, select, update
 from sqlalchemy.orm import Session
 
 from app.db import get_db
-from app.models import Event, Trip, TripMember
+from app.models import BudgetEnvelope, Event, Location, Trip, TripMember
 from app.routers.auth import get_current_user
-from app.schemas import EventCreate, EventRead, EventUpdate
+from app.schemas import (
+    EventBatchRequest,
+    EventBatchResult,
+    EventConflict,
+    EventCreate,
+    EventRead,
+    EventUpdate,
+    EventWithConflicts,
+    ItineraryFeasibilityResponse,
+    NearbyLocation,
+)
+from app.services.commitments import envelope_for_event, trip_envelope_ids
+from app.services.conflicts import conflicts_by_event, trip_conflicts
+from app.services.feasibility import itinerary_feasibility
+from app.services.nearby import nearby_locations
+from app.services.paging import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from app.services.revisions import bump_trip_revision, not_modified, trip_etag
+from app.services.rollups import RollupDelta, add_event_contributions, event_expense_delta
+from app.services.suggest import track_location_use
 
 router = APIRouter(tags=["events"])
 
@@ -41,24 +62,110 @@ def _require_edit_access(trip: Trip, user_id: int) -> None:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only owner or editor can modify events")
 
 
+def _check_envelope(db: Session, trip_id: int, envelope_id: Optional[int]) -> None:
+    if envelope_id is None:
+        return
+    envelope = db.query(BudgetEnvelope).filter(BudgetEnvelope.id == envelope_id).first()
+    if not envelope or envelope.trip_id != trip_id:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Envelope not found in this trip")
+
+
+def _after_cursor(cursor: str):
+    """Keyset predicate for rows after the cursor in (date, start_time NULLS FIRST, id) order."""
+    try:
+        raw_date, raw_time, last_id = decode_cursor(cursor)
+        last_date = date_type.fromisoformat(raw_date)
+        last_time = time_type.fromisoformat(raw_time) if raw_time is not None else None
+        last_id = int(last_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+    if last_time is None:
+        same_time_after = or_(and_(Event.start_time.is_(None), Event.id > last_id), Event.start_time.is_not(None))
+    else:
+        same_time_after = or_(Event.start_time > last_time, and_(Event.start_time == last_time, Event.id > last_id))
+    return or_(Event.date > last_date, and_(Event.date == last_date, same_time_after))
+
+
 @router.get("/trips/{trip_id}/events", response_model=List[EventRead])
 def list_events(
     trip_id: int,
+    request: Request,
+    response: Response,
     date: Optional[date_type] = Query(default=None),
+    from_date: Optional[date_type] = Query(default=None, alias="from"),
+    to_date: Optional[date_type] = Query(default=None, alias="to"),
+    limit: Optional[int] = Query(default=None, ge=1, le=1000),
+    cursor: Optional[str] = Query(default=None),
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user),
 ):
     trip = _get_trip(db, trip_id)
     _require_view_access(trip, current_user.id)
+    cached = not_modified(request, response, trip_etag(trip))
+    if cached:
+        return cached
 
     query = db.query(Event).filter(Event.trip_id == trip_id)
     if date:
         query = query.filter(Event.date == date)
-    events = query.order_by(Event.date, Event.start_time).all()
+    if from_date:
+        query = query.filter(Event.date >= from_date)
+    if to_date:
+        query = query.filter(Event.date <= to_date)
+    if cursor:
+        query = query.filter(_after_cursor(cursor))
+    query = query.order_by(Event.date, Event.start_time.nulls_first(), Event.id)
+    if limit is None:
+        return query.all()
+
+    events = query.limit(limit + 1).all()
+    if len(events) > limit:
+        events = events[:limit]
+        last = events[-1]
+        response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.date, last.start_time, last.id)
     return events
 
 
-@router.post("/trips/{trip_id}/events", response_model=EventRead, status_code=status.HTTP_201_CREATED)
+def _with_conflicts(db: Session, event: Event) -> EventWithConflicts:
+    conflicts = conflicts_by_event(db, event.trip_id, [event.id], [event.date])[event.id]
+    return EventWithConflicts(**EventRead.model_validate(event).model_dump(), conflicts=conflicts)
+
+
+@router.get("/trips/{trip_id}/conflicts", response_model=List[EventConflict])
+def list_conflicts(
+    trip_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    trip = _get_trip(db, trip_id)
+    _require_view_access(trip, current_user.id)
+    cached = not_modified(request, response, trip_etag(trip))
+    if cached:
+        return cached
+    return trip_conflicts(db, trip_id)
+
+
+@router.get("/trips/{trip_id}/feasibility", response_model=ItineraryFeasibilityResponse)
+def itinerary_feasibility_check(
+    trip_id: int,
+    request: Request,
+    response: Response,
+    mode: Literal["auto", "walk", "transit", "drive"] = Query(default="auto"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    trip = _get_trip(db, trip_id)
+    _require_view_access(trip, current_user.id)
+    cached = not_modified(request, response, trip_etag(trip))
+    if cached:
+        return cached
+    return itinerary_feasibility(db, trip, mode)
+
+
+@router.post("/trips/{trip_id}/events", response_model=EventWithConflicts, status_code=status.HTTP_201_CREATED)
 def create_event(
     trip_id: int,
     payload: EventCreate,
@@ -70,12 +177,116 @@ def create_event(
 
     if payload.trip_id != trip_id:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Trip ID mismatch")
+    _check_envelope(db, trip_id, payload.envelope_id)
 
     event = Event(**payload.model_dump())
     db.add(event)
     db.commit()
     db.refresh(event)
-    return event
+    return _with_conflicts(db, event)
+
+
+@router.post("/trips/{trip_id}/events:batch", response_model=List[EventBatchResult])
+def batch_events(
+    trip_id: int,
+    payload: EventBatchRequest,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Apply many create/update/delete operations atomically; any invalid operation rejects the batch."""
+    trip = _get_trip(db, trip_id)
+    _require_edit_access(trip, current_user.id)
+
+    errors = []
+    creates, updates, delete_ids = [], [], []
+    seen_ids = set()
+    for index, operation in enumerate(payload.operations):
+        try:
+            if operation.op == "create":
+                fields = EventCreate.model_validate({**operation.data, "trip_id": trip_id}).model_dump()
+                creates.append((index, fields))
+                continue
+            if operation.id is None:
+                raise ValueError(f"'{operation.op}' requires an event id")
+            if operation.id in seen_ids:
+                raise ValueError(f"Event {operation.id} appears in more than one operation")
+            seen_ids.add(operation.id)
+            if operation.op == "update":
+                fields = EventUpdate.model_validate(operation.data).model_dump(exclude_unset=True)
+                updates.append((index, {"id": operation.id, **fields}))
+            else:
+                delete_ids.append((index, operation.id))
+        except (ValidationError, ValueError) as exc:
+            detail = exc.errors(include_url=False, include_input=False) if isinstance(exc, ValidationError) else str(exc)
+            errors.append({"index": index, "error": detail})
+
+    # Existence checks for every referenced event and location in one query each.
+    if seen_ids:
+        owned = set(db.scalars(select(Event.id).where(Event.trip_id == trip_id, Event.id.in_(seen_ids))))
+        for index, event_id in [(i, row["id"]) for i, row in updates] + delete_ids:
+            if event_id not in owned:
+                errors.append({"index": index, "error": f"Event {event_id} not found in this trip"})
+    location_refs = [(i, row["location_id"]) for i, row in creates + updates if row.get("location_id") is not None]
+    if location_refs:
+        known = set(db.scalars(select(Location.id).where(Location.id.in_({loc for _, loc in location_refs}))))
+        for index, location_id in location_refs:
+            if location_id not in known:
+                errors.append({"index": index, "error": f"Location {location_id} not found"})
+    envelope_refs = [(i, row["envelope_id"]) for i, row in creates + updates if row.get("envelope_id") is not None]
+    if envelope_refs:
+        known = set(db.scalars(select(BudgetEnvelope.id).where(BudgetEnvelope.trip_id == trip_id)))
+        for index, envelope_id in envelope_refs:
+            if envelope_id not in known:
+                errors.append({"index": index, "error": f"Envelope {envelope_id} not found in this trip"})
+
+    if errors:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=sorted(errors, key=lambda e: e["index"]))
+
+    # Core writes bypass the rollup flush hook: take the touched events' commitments out
+    # before the writes and put the surviving ones back after.
+    deleted = [event_id for _, event_id in delete_ids]
+    updated = [row["id"] for _, row in updates]
+    # Deleted events' expenses go with them (ON DELETE CASCADE).
+    rollups = event_expense_delta(db, deleted) if deleted else RollupDelta()
+    add_event_contributions(db, rollups, deleted + updated, sign=-1)
+    if deleted:
+        db.execute(delete(Event).where(Event.id.in_(deleted)))
+    if updates:
+        db.execute(update(Event), [row for _, row in updates])
+    created_ids = []
+    if creates:
+        envelope_ids = trip_envelope_ids(db, trip_id)
+        for _, row in creates:
+            if row["envelope_id"] is None:
+                row["envelope_id"] = envelope_for_event(envelope_ids, row["type"])
+        created_ids = db.scalars(
+            insert(Event).returning(Event.id, sort_by_parameter_order=True),
+            [row for _, row in creates],
+        ).all()
+    add_event_contributions(db, rollups, updated + list(created_ids))
+    rollups.apply(db)
+    bump_trip_revision(db, trip_id)
+    for _, row in creates + updates:
+        if row.get("location_id") is not None:
+            track_location_use(db, row["location_id"])
+    db.commit()
+
+    touched_ids = list(created_ids) + [row["id"] for _, row in updates]
+    events = {evt.id: evt for evt in db.scalars(select(Event).where(Event.id.in_(touched_ids)))} if touched_ids else {}
+    conflicts = conflicts_by_event(db, trip_id, touched_ids, [evt.date for evt in events.values()])
+    results = [
+        EventBatchResult(
+            index=index,
+            op=op,
+            id=event_id,
+            event=EventRead.model_validate(events[event_id]),
+            conflicts=conflicts[event_id],
+        )
+        for op, index, event_id in [("create", index, event_id) for (index, _), event_id in zip(creates, created_ids)]
+        + [("update", index, row["id"]) for index, row in updates]
+    ]
+    results += [EventBatchResult(index=index, op="delete", id=event_id) for index, event_id in delete_ids]
+    return sorted(results, key=lambda result: result.index)
 
 
 def _get_event_or_404(db: Session, event_id: int) -> Event:
@@ -85,7 +296,7 @@ def _get_event_or_404(db: Session, event_id: int) -> Event:
     return event
 
 
-@router.patch("/events/{event_id}", response_model=EventRead)
+@router.patch("/events/{event_id}", response_model=EventWithConflicts)
 def update_event(
     event_id: int,
     payload: EventUpdate,
@@ -95,13 +306,37 @@ def update_event(
     event = _get_event_or_404(db, event_id)
     trip = _get_trip(db, event.trip_id)
     _require_edit_access(trip, current_user.id)
+    fields = payload.model_dump(exclude_unset=True)
+    if "envelope_id" in fields:
+        _check_envelope(db, trip.id, fields["envelope_id"])
 
-    for field, value in payload.model_dump(exclude_unset=True).items():
+    for field, value in fields.items():
         setattr(event, field, value)
 
     db.commit()
     db.refresh(event)
-    return event
+    return _with_conflicts(db, event)
+
+
+@router.get("/events/{event_id}/nearby", response_model=List[NearbyLocation])
+def list_places_near_event(
+    event_id: int,
+    radius: float = Query(default=1.0, gt=0, le=50, description="Search radius in km"),
+    type: Optional[str] = Query(default=None, description="e.g. restaurant or attraction"),
+    limit: int = Query(default=10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    event = _get_event_or_404(db, event_id)
+    trip = _get_trip(db, event.trip_id)
+    _require_view_access(trip, current_user.id)
+
+    location = event.location
+    if not location or location.latitude is None or location.longitude is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Event has no location with coordinates")
+    return nearby_locations(
+        db, location.latitude, location.longitude, radius, type=type, limit=limit, exclude_id=location.id
+    )
 
 
 @router.delete("/events/{event_id}", status_code=status.HTTP_204_NO_CONTENT)
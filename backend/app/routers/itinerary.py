@@ -0,0 +1,119 @@
+"""Bulk itinerary import and export endpoints."""
+
+import io
+import tempfile
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app.db import SessionLocal, get_db
+from app.models import Trip
+from app.routers.auth import get_current_user
+from app.schemas import ItineraryImportResult
+from app.services.itinerary_io import (
+    ItineraryImportError,
+    import_itinerary,
+    iter_csv_records,
+    iter_json_records,
+    stream_export_csv,
+    stream_export_json,
+)
+from app.services.locations import geocode_in_background
+
+router = APIRouter(tags=["itinerary"])
+
+# Uploads larger than this spill from memory to a temporary file while they are parsed.
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+
+def _get_trip(db: Session, trip_id: int) -> Trip:
+    trip = db.query(Trip).filter(Trip.id == trip_id).first()
+    if not trip:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trip not found")
+    return trip
+
+
+def _user_role_for_trip(trip: Trip, user_id: int) -> Optional[str]:
+    if trip.owner_id == user_id:
+        return "owner"
+    membership = next((m for m in trip.members if m.user_id == user_id), None)
+    return membership.role if membership else None
+
+
+def _require_view_access(trip: Trip, user_id: int) -> str:
+    role = _user_role_for_trip(trip, user_id)
+    if not role:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized for this trip")
+    return role
+
+
+def _require_edit_access(trip: Trip, user_id: int) -> None:
+    role = _require_view_access(trip, user_id)
+    if role not in {"owner", "editor"}:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only owner or editor can import itineraries")
+
+
+def _import_from_spool(trip_id: int, user_id: int, spool, fmt: str, geocode_queue: List[int]) -> ItineraryImportResult:
+    """Runs in a worker thread with its own session, so nothing blocking touches the event loop."""
+    db = SessionLocal()
+    try:
+        trip = _get_trip(db, trip_id)
+        _require_edit_access(trip, user_id)
+        text = io.TextIOWrapper(spool, encoding="utf-8-sig", newline="")
+        records = iter_csv_records(text) if fmt == "csv" else iter_json_records(text)
+        try:
+            result = import_itinerary(db, trip, records, geocode_queue)
+        except ItineraryImportError as exc:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=exc.errors)
+        except (ValueError, UnicodeDecodeError) as exc:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not parse {fmt} upload: {exc}")
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+
+@router.post("/trips/{trip_id}/import", response_model=ItineraryImportResult)
+async def import_trip_itinerary(
+    trip_id: int,
+    request: Request,
+    background_tasks: BackgroundTasks,
+    format: Optional[Literal["json", "csv"]] = Query(default=None),
+    current_user=Depends(get_current_user),
+):
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "json")
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY) as spool:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        # The trip lookup, parsing and batched inserts are blocking; keep them off the event loop.
+        geocode_queue: List[int] = []
+        result = await run_in_threadpool(_import_from_spool, trip_id, current_user.id, spool, fmt, geocode_queue)
+    if geocode_queue:
+        background_tasks.add_task(geocode_in_background, geocode_queue)
+    return result
+
+
+@router.get("/trips/{trip_id}/export")
+def export_trip_itinerary(
+    trip_id: int,
+    format: Literal["json", "csv"] = Query(default="json"),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    trip = _get_trip(db, trip_id)
+    _require_view_access(trip, current_user.id)
+
+    if format == "csv":
+        body, media_type = stream_export_csv(db, trip_id), "text/csv; charset=utf-8"
+    else:
+        body, media_type = stream_export_json(db, trip_id), "application/json"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="trip-{trip_id}-itinerary.{format}"'},
+    )
@@ -0,0 +1,39 @@
+"""Location registry lookups."""
+
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app.routers.auth import get_current_user
+from app.schemas import LocationRead, NearbyLocation
+from app.services.nearby import nearby_locations
+from app.services.suggest import location_suggestions
+
+router = APIRouter(prefix="/locations", tags=["locations"])
+
+
+@router.get("/nearby", response_model=List[NearbyLocation])
+def list_nearby_locations(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius: float = Query(default=2.0, gt=0, le=50, description="Search radius in km"),
+    type: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    return nearby_locations(db, lat, lon, radius, type=type, limit=limit)
+
+
+@router.get("/suggest", response_model=List[LocationRead])
+def suggest_locations(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(default=10, ge=1, le=25),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Autocomplete over known location names and addresses, most used first."""
+    location_suggestions.ensure_loaded(db)
+    return location_suggestions.suggest(q, limit)
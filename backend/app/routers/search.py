@@ -0,0 +1,25 @@
+"""Full-text search across the current user's trips."""
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.orm import Session
+
+from app.db import get_db
+from app.routers.auth import get_current_user
+from app.schemas import SearchResults
+from app.services.search import search
+
+router = APIRouter(tags=["search"])
+
+
+@router.get("/search", response_model=SearchResults)
+def search_trips(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(default=20, ge=1, le=100),
+    offset: int = Query(default=0, ge=0),
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    """Ranked matches over trip names, events, budget envelope notes and the places used in them."""
+    hits = search(db, current_user.id, q, limit=limit + 1, offset=offset)
+    next_offset = offset + limit if len(hits) > limit else None
+    return SearchResults(query=q, results=hits[:limit], next_offset=next_offset)
@@ -3,25 +3,31 @@
 from typing import List, Optional
 import io
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.responses import StreamingResponse
 
 from pydantic import BaseModel
-from sqlalchemy import or_
+from sqlalchemy import delete, or_
 from sqlalchemy.orm import Session
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 
 from app.db import get_db
-from app.models import Trip, TripMember, Event, BudgetEnvelope, Expense, WeatherAlert
+from app.models import Trip, TripMember, Event, WeatherAlert
 from app.routers.auth import get_current_user
 from app.schemas import (
+    TripClone,
     TripCreate,
     TripMemberRead,
     TripRead,
     TripUpdate,
 )
+from app.services.budget_summary import summarize_budget
 from app.services.budgeting import allocate_default_envelopes, ensure_envelopes
+from app.services.cloning import clone_trip as clone_trip_rows
+from app.services.fx import reconvert_expenses
+from app.services.revisions import not_modified, trip_etag
+from app.services.rollups import rebuild_rollups
 
 router = APIRouter(prefix="/trips", tags=["trips"])
 
@@ -62,6 +68,11 @@ def list_trips(db: Session = Depends(get_db), current_user=Depends(get_current_u
     return trips
 
 
+@router.get("/templates", response_model=List[TripRead])
+def list_templates(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    return db.query(Trip).filter(Trip.is_template.is_(True)).order_by(Trip.name).all()
+
+
 @router.post("", response_model=TripRead, status_code=status.HTTP_201_CREATED)
 def create_trip(payload: TripCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     trip_data = payload.model_dump(exclude={"owner_id"})
@@ -69,15 +80,24 @@ def create_trip(payload: TripCreate, db: Session = Depends(get_db), current_user
     db.add(trip)
     db.commit()
     db.refresh(trip)
-    ensure_envelopes(trip, db, allocate_default_envelopes(trip))
+    ensure_envelopes(trip, db, allocate_default_envelopes(trip, db))
     db.commit()
     return trip
 
 
 @router.get("/{trip_id}", response_model=TripRead)
-def get_trip(trip_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def get_trip(
+    trip_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
     trip = _get_trip_or_404(db, trip_id)
     _ensure_member_or_owner(trip, current_user.id)
+    cached = not_modified(request, response, trip_etag(trip))
+    if cached:
+        return cached
     return trip
 
 
@@ -92,9 +112,14 @@ def update_trip(
     _ensure_owner(trip, current_user.id)
 
     update_data = payload.model_dump(exclude_unset=True)
+    currency_changed = "currency" in update_data and update_data["currency"] != trip.currency
     for field, value in update_data.items():
         setattr(trip, field, value)
 
+    if currency_changed:
+        # Every expense is re-priced in the new trip currency, so the rollups are rebuilt too.
+        db.flush()
+        rebuild_rollups(db, reconvert_expenses(db, [trip.id]))
     db.commit()
     db.refresh(trip)
     return trip
@@ -105,11 +130,43 @@ def delete_trip(trip_id: int, db: Session = Depends(get_db), current_user=Depend
     trip = _get_trip_or_404(db, trip_id)
     _ensure_owner(trip, current_user.id)
 
-    db.delete(trip)
+    # Members, destinations, events, envelopes, expenses and alerts go with the trip via
+    # ON DELETE CASCADE, so none of them are loaded into the session.
+    db.execute(delete(Trip).where(Trip.id == trip_id))
     db.commit()
     return None
 
 
+@router.post("/{trip_id}/clone", response_model=TripRead, status_code=status.HTTP_201_CREATED)
+def clone_trip(
+    trip_id: int,
+    payload: TripClone,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
+    source = _get_trip_or_404(db, trip_id)
+    if not source.is_template:
+        _ensure_member_or_owner(source, current_user.id)
+
+    if payload.start_date is not None and payload.shift_days is not None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide either start_date or shift_days, not both")
+    shift_days = payload.shift_days or 0
+    if payload.start_date is not None:
+        shift_days = (payload.start_date - source.start_date).days
+
+    clone = clone_trip_rows(
+        db,
+        source,
+        owner_id=current_user.id,
+        name=payload.name,
+        shift_days=shift_days,
+        is_template=payload.is_template,
+    )
+    db.commit()
+    db.refresh(clone)
+    return clone
+
+
 @router.get("/{trip_id}/members", response_model=List[TripMemberRead])
 def list_trip_members(trip_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     trip = _get_trip_or_404(db, trip_id)
@@ -175,8 +232,7 @@ def export_trip_pdf(trip_id: int, db: Session = Depends(get_db), current_user=De
         .order_by(Event.date, Event.start_time)
         .all()
     )
-    envelopes = db.query(BudgetEnvelope).filter(BudgetEnvelope.trip_id == trip_id).all()
-    expenses = db.query(Expense).filter(Expense.trip_id == trip_id).all()
+    budget = summarize_budget(db, trip, include_expenses=False)
     alerts = db.query(WeatherAlert).filter(WeatherAlert.trip_id == trip_id).all()
 
     buffer = io.BytesIO()
@@ -236,16 +292,16 @@ def export_trip_pdf(trip_id: int, db: Session = Depends(get_db), current_user=De
     line_break(12)
 
     # Section: Budget
-    planned_total_all = sum(env.planned_amount for env in envelopes)
-    actual_total_all = sum(exp.amount for exp in expenses)
+    planned_total_all = budget.totals["planned_total_all"]
+    actual_total_all = budget.totals["actual_total_all"]
     p.setFont("Helvetica-Bold", 14)
     p.drawString(margin, y, "Budget")
     line_break(16)
     p.setFont("Helvetica", 11)
     p.drawString(margin + 5, y, f"Planned total: ${planned_total_all:.2f}   Actual total: ${actual_total_all:.2f}")
     line_break(16)
-    for env in envelopes:
-        actual = sum(exp.amount for exp in expenses if exp.envelope_id == env.id)
+    for summary in budget.envelopes:
+        env, actual = summary.envelope, summary.actual_spent
         pct = f"{(actual / env.planned_amount * 100):.0f}%" if env.planned_amount else "0%"
         p.drawString(margin + 8, y, f"{env.category.capitalize()}: planned ${env.planned_amount:.2f} / actual ${actual:.2f} ({pct} used)")
         line_break(12)
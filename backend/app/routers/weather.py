@@ -1,6 +1,6 @@
 """Live weather forecast for a trip."""
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 
 from app.db import get_db
@@ -9,6 +9,7 @@ from app.routers.auth import get_current_user
 from app.schemas import TripWeatherDay, TripWeatherResponse, WeatherAlertDetail
 from app.services.weather_client import geocode_city, fetch_daily_forecast
 from app.services.weather_risk import annotate_weather_with_risk, upsert_weather_alerts, evaluate_schedule_impacts
+from app.services.revisions import not_modified, trip_etag
 from app.models import Event
 
 router = APIRouter(tags=["weather"])
@@ -83,9 +84,18 @@ async def trip_weather(trip_id: int, db: Session = Depends(get_db), current_user
 
 
 @router.get("/trips/{trip_id}/alerts", response_model=list[WeatherAlertDetail])
-def trip_alerts(trip_id: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def trip_alerts(
+    trip_id: int,
+    request: Request,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user),
+):
     trip = _get_trip(db, trip_id)
     _require_view_access(trip, current_user.id)
+    cached = not_modified(request, response, trip_etag(trip))
+    if cached:
+        return cached
     alerts = db.query(WeatherAlert).filter(WeatherAlert.trip_id == trip.id).order_by(WeatherAlert.date).all()
     return [
         WeatherAlertDetail(
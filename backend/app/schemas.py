@@ -1,9 +1,10 @@
 """Pydantic schemas for request/response models."""
 
 from datetime import date, time
-from typing import Any, Optional
+from datetime import date as date_type
+from typing import Annotated, Any, Literal, Optional
 
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class HealthResponse(BaseModel):
@@ -30,6 +31,11 @@ class UserRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class FeedTokenResponse(BaseModel):
+    # Shown once; only its hash is stored. Append as ?token= to the .ics URLs.
+    feed_token: str
+
+
 class TripCreate(BaseModel):
     owner_id: Optional[int] = None
     name: str
@@ -41,6 +47,7 @@ class TripCreate(BaseModel):
     party_size: int = 1
     price_sensitivity: str = "balanced"
     trip_type: str = "balanced"
+    is_template: bool = False
 
 
 class TripUpdate(BaseModel):
@@ -53,6 +60,15 @@ class TripUpdate(BaseModel):
     party_size: Optional[int] = None
     price_sensitivity: Optional[str] = None
     trip_type: Optional[str] = None
+    is_template: Optional[bool] = None
+
+
+class TripClone(BaseModel):
+    name: Optional[str] = None
+    # Either a new start date or an explicit day offset; all event dates move with it.
+    start_date: Optional[date] = None
+    shift_days: Optional[int] = None
+    is_template: bool = False
 
 
 class TripRead(BaseModel):
@@ -67,6 +83,8 @@ class TripRead(BaseModel):
     party_size: int
     price_sensitivity: str
     trip_type: str
+    revision: int = 0
+    is_template: bool = False
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -97,6 +115,10 @@ class LocationRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class NearbyLocation(LocationRead):
+    distance_km: float
+
+
 class TripDestinationCreate(BaseModel):
     trip_id: int
     location_id: int
@@ -112,6 +134,16 @@ class TripDestinationRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class DestinationOrderUpdate(BaseModel):
+    # Every destination id of the trip, in the desired visiting order.
+    destination_ids: list[int]
+
+
+class DestinationOptimizeRequest(BaseModel):
+    start_destination_id: Optional[int] = None
+    end_destination_id: Optional[int] = None
+
+
 class EventCreate(BaseModel):
     trip_id: int
     location_id: Optional[int] = None
@@ -125,11 +157,14 @@ class EventCreate(BaseModel):
     category_type: Optional[str] = "other"
     is_refundable: Optional[bool] = False
     reservation_link: Optional[str] = None
+    # Envelope the cost is committed against; defaults to the one for the event's type.
+    envelope_id: Optional[int] = None
 
 
 class EventUpdate(BaseModel):
     location_id: Optional[int] = None
-    date: Optional[date] = None
+    # Aliased type: a bare `date` here would resolve to this field's own default (None).
+    date: Optional[date_type] = None
     start_time: Optional[time] = None
     end_time: Optional[time] = None
     title: Optional[str] = None
@@ -139,6 +174,7 @@ class EventUpdate(BaseModel):
     category_type: Optional[str] = None
     is_refundable: Optional[bool] = None
     reservation_link: Optional[str] = None
+    envelope_id: Optional[int] = None
 
 
 class EventRead(BaseModel):
@@ -155,10 +191,62 @@ class EventRead(BaseModel):
     category_type: Optional[str] = None
     is_refundable: bool
     reservation_link: Optional[str] = None
+    envelope_id: Optional[int] = None
+    # Converted total of the expenses linked to this event.
+    paid_amount: float = 0.0
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class EventConflict(BaseModel):
+    date: date
+    event_ids: list[int]
+    overlap_start: time
+    overlap_end: time
+
+
+class EventWithConflicts(EventRead):
+    conflicts: list[EventConflict] = []
+
+
+class TravelTransition(BaseModel):
+    date: date
+    from_event_id: int
+    to_event_id: int
+    distance_km: float
+    gap_minutes: float
+    travel_minutes: float
+    mode: str
+    feasible: bool
+
+
+class ItineraryFeasibilityResponse(BaseModel):
+    trip_id: int
+    revision: int
+    mode: str
+    transitions: list[TravelTransition]
+    infeasible_count: int
+
+
+class EventBatchOperation(BaseModel):
+    op: Literal["create", "update", "delete"]
+    id: Optional[int] = None
+    # EventCreate fields (without trip_id) for creates, EventUpdate fields for updates.
+    data: dict[str, Any] = {}
+
+
+class EventBatchRequest(BaseModel):
+    operations: list[EventBatchOperation]
+
+
+class EventBatchResult(BaseModel):
+    index: int
+    op: str
+    id: int
+    event: Optional[EventRead] = None
+    conflicts: list[EventConflict] = []
+
+
 class BudgetEnvelopeCreate(BaseModel):
     trip_id: int
     category: str
@@ -176,6 +264,18 @@ class BudgetEnvelopeRead(BaseModel):
     model_config = ConfigDict(from_attributes=True)
 
 
+class ExpenseShareIn(BaseModel):
+    user_id: int
+    weight: float = Field(default=1.0, gt=0)
+
+
+class ExpenseShareRead(BaseModel):
+    user_id: int
+    weight: float
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class ExpenseCreate(BaseModel):
     trip_id: int
     envelope_id: Optional[int] = None
@@ -184,6 +284,9 @@ class ExpenseCreate(BaseModel):
     amount: float
     currency: str = "USD"
     spent_at_date: date
+    paid_by_user_id: Optional[int] = None
+    # Omit to split evenly across everyone on the trip.
+    shares: Optional[list[ExpenseShareIn]] = None
 
 
 class ExpenseRead(BaseModel):
@@ -195,10 +298,35 @@ class ExpenseRead(BaseModel):
     amount: float
     currency: str
     spent_at_date: date
+    amount_converted: Optional[float] = None
+    paid_by_user_id: Optional[int] = None
+    shares: list[ExpenseShareRead] = []
 
     model_config = ConfigDict(from_attributes=True)
 
 
+class SettlementBalance(BaseModel):
+    user_id: int
+    username: str
+    paid: float
+    owed: float
+    # Positive: is owed money; negative: owes money.
+    net: float
+
+
+class SettlementTransfer(BaseModel):
+    from_user_id: int
+    to_user_id: int
+    amount: float
+
+
+class SettlementResponse(BaseModel):
+    trip_id: int
+    currency: str
+    balances: list[SettlementBalance]
+    transfers: list[SettlementTransfer]
+
+
 class WeatherAlertRead(BaseModel):
     id: int
     trip_id: int
@@ -248,6 +376,36 @@ class BudgetEnvelopeSummary(BaseModel):
     actual_spent: float
     remaining: float
     percent_used: float
+    expense_count: int = 0
+    last_spent_date: Optional[date] = None
+    # Planned event costs held against this envelope: total, paid so far, still to pay, refundable.
+    committed_amount: float = 0.0
+    committed_paid: float = 0.0
+    committed_outstanding: float = 0.0
+    refundable_amount: float = 0.0
+
+
+class EnvelopeForecast(BaseModel):
+    # None for uncategorized spending.
+    envelope_id: Optional[int] = None
+    category: str
+    planned_amount: Optional[float] = None
+    spent: float
+    # Costs of upcoming events not yet logged as expenses.
+    committed: float
+    daily_burn_rate: float
+    projected_total: float
+    overrun_date: Optional[date] = None
+
+
+class BudgetForecast(BaseModel):
+    as_of: date
+    days_elapsed: int
+    days_remaining: int
+    envelopes: list[EnvelopeForecast]
+    daily_burn_rate: float
+    projected_total: float
+    overrun_date: Optional[date] = None
 
 
 class BudgetSummaryResponse(BaseModel):
@@ -257,3 +415,117 @@ class BudgetSummaryResponse(BaseModel):
     remaining_total: float
     recommended_daily_spend: float
     categories: dict
+    forecast: Optional[BudgetForecast] = None
+
+
+class BudgetScenario(BaseModel):
+    name: str
+    # Overrides of the trip's own settings; unset fields keep the trip's values.
+    total_budget: Optional[float] = Field(None, ge=0)
+    price_sensitivity: Optional[str] = None
+    trip_type: Optional[str] = None
+    extra_days: int = Field(0, ge=-365, le=365)
+    # Re-derive the envelopes as /budget/recalculate would under this scenario's settings.
+    reallocate: bool = False
+    # Multipliers on a category's upcoming spend (outstanding commitments and daily pace), e.g. {"lodging": 0.7}.
+    spend_multipliers: dict[str, Annotated[float, Field(ge=0)]] = {}
+
+
+class BudgetScenarioRequest(BaseModel):
+    scenarios: list[BudgetScenario] = Field(min_length=1, max_length=100)
+
+
+class ScenarioEnvelope(BaseModel):
+    category: str
+    planned_amount: float
+    projected_total: float
+    remaining: float
+    over_budget: bool
+
+
+class ScenarioResult(BaseModel):
+    name: str
+    total_budget: float
+    trip_days: int
+    envelopes: list[ScenarioEnvelope]
+    projected_total: float
+    remaining_total: float
+    over_budget: bool
+
+
+class BudgetScenarioResponse(BaseModel):
+    as_of: date
+    currency: str
+    spent: float
+    committed_outstanding: float
+    scenarios: list[ScenarioResult]
+
+
+class ItineraryImportLocation(BaseModel):
+    location_name: Optional[str] = None
+    location_type: Optional[str] = None
+    location_address: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+
+class ItineraryImportDestination(ItineraryImportLocation):
+    kind: Literal["destination"]
+    location_name: str
+    sort_order: Optional[int] = None
+
+
+class ItineraryImportEvent(ItineraryImportLocation):
+    kind: Literal["event"]
+    date: date
+    start_time: Optional[time] = None
+    end_time: Optional[time] = None
+    title: str
+    type: str
+    cost: Optional[float] = None
+    notes: Optional[str] = None
+    category_type: str = "other"
+    is_refundable: bool = False
+    reservation_link: Optional[str] = None
+
+
+class ItineraryImportExpense(BaseModel):
+    kind: Literal["expense"]
+    description: str
+    amount: float
+    currency: Optional[str] = None
+    spent_at_date: date
+    envelope: Optional[str] = None
+
+
+class ItineraryImportResult(BaseModel):
+    destinations: int
+    events: int
+    expenses: int
+    locations_created: int
+    envelopes_created: int
+
+
+class StatementImportResult(BaseModel):
+    rows: int
+    imported: int
+    duplicates: int
+    # Rows with the non-spending sign (refunds, card payments).
+    skipped: int
+    categorized: int
+    uncategorized: int
+
+
+class SearchHit(BaseModel):
+    kind: Literal["trip", "event", "location", "envelope"]
+    id: int
+    trip_id: Optional[int] = None
+    title: str
+    snippet: Optional[str] = None
+    rank: float
+
+
+class SearchResults(BaseModel):
+    query: str
+    results: list[SearchHit]
+    next_offset: Optional[int] = None
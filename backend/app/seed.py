@@ -9,13 +9,13 @@ from app.models import (
     BudgetEnvelope,
     Event,
     Expense,
-    Location,
     Trip,
     TripDestination,
     User,
     WeatherAlert,
 )
 from app.routers.auth import get_password_hash
+from app.services.locations import resolve_location
 
 
 def seed_demo(db: Session) -> None:
@@ -66,13 +66,9 @@ def seed_demo(db: Session) -> None:
     ]
     locations = {}
     for name, ltype, addr, lat, lon in loc_data:
-        loc = db.query(Location).filter(Location.name == name).first()
-        if not loc:
-            loc = Location(name=name, type=ltype, address=addr, latitude=lat, longitude=lon)
-            db.add(loc)
-            db.commit()
-            db.refresh(loc)
+        loc, _ = resolve_location(db, name, ltype, addr, lat, lon)
         locations[name] = loc
+    db.commit()
 
     # Trip destinations
     destinations = [
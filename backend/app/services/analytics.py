@@ -0,0 +1,246 @@
+"""Cross-trip spend benchmarks: how real trips split their spending across categories.
+
+`aggregate_spend_benchmarks` (run periodically via `python -m app.aggregate_spend`)
+streams per-trip category totals from the budget rollups and feeds each category's
+share of the trip's spend into streaming P² quantile sketches per segment
+(trip_type, price_sensitivity, duration bucket). Only the summary rows are stored.
+Request-time readers go through an in-memory index of ready-made ratios per segment.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from itertools import groupby
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models import BudgetEnvelope, BudgetRollup, SpendBenchmark, Trip
+
+# Upper bound (days, inclusive) and label of each duration bucket; longer trips fall in the last label.
+DURATION_BUCKETS = ((3, "1-3"), (7, "4-7"), (14, "8-14"))
+LONGEST_BUCKET = "15+"
+ALL_DURATIONS = "*"
+# A segment needs this many finished trips before its ratios replace the defaults.
+MIN_SEGMENT_TRIPS = 5
+# Categories present in fewer of a segment's trips than this are left out of its ratios.
+MIN_CATEGORY_PRESENCE = 0.5
+RELOAD_SECONDS = 3600
+AGGREGATE_BATCH_SIZE = 1000
+
+Segment = Tuple[str, str, str]
+
+
+class P2Quantile:
+    """Streaming estimate of one quantile in O(1) memory (Jain & Chlamtac's P² algorithm)."""
+
+    def __init__(self, p: float):
+        self.p = p
+        self._initial: List[float] = []
+        self._heights: Optional[List[float]] = None
+
+    def add(self, x: float) -> None:
+        if self._heights is None:
+            self._initial.append(x)
+            if len(self._initial) == 5:
+                p = self.p
+                self._heights = sorted(self._initial)
+                self._positions = [1.0, 2.0, 3.0, 4.0, 5.0]
+                self._desired = [1.0, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5.0]
+                self._increments = [0.0, p / 2, p, (1 + p) / 2, 1.0]
+            return
+
+        q, n = self._heights, self._positions
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= x < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+
+        # Move the three middle markers towards their desired positions.
+        for i in (1, 2, 3):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = q[i] + step / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+                )
+                if not q[i - 1] < candidate < q[i + 1]:
+                    candidate = q[i] + step * (q[i + step] - q[i]) / (n[i + step] - n[i])
+                q[i] = candidate
+                n[i] += step
+
+    def value(self) -> float:
+        if self._heights is not None:
+            return self._heights[2]
+        if not self._initial:
+            return 0.0
+        # Fewer than five observations: exact, with linear interpolation.
+        ordered = sorted(self._initial)
+        rank = self.p * (len(ordered) - 1)
+        lo = int(rank)
+        hi = min(lo + 1, len(ordered) - 1)
+        return ordered[lo] + (ordered[hi] - ordered[lo]) * (rank - lo)
+
+
+class _ShareStats:
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.quantiles = {p: P2Quantile(p) for p in (0.25, 0.5, 0.75)}
+
+    def add(self, share: float) -> None:
+        self.count += 1
+        self.total += share
+        for sketch in self.quantiles.values():
+            sketch.add(share)
+
+
+def duration_bucket(days: int) -> str:
+    for upper, label in DURATION_BUCKETS:
+        if days <= upper:
+            return label
+    return LONGEST_BUCKET
+
+
+def _segment_key(trip_type: Optional[str], price_sensitivity: Optional[str]) -> Tuple[str, str]:
+    return (trip_type or "balanced").lower(), (price_sensitivity or "balanced").lower()
+
+
+def aggregate_spend_benchmarks(db: Session, today: Optional[date] = None) -> int:
+    """Rebuild spend_benchmarks from finished, non-template trips; returns the rows written.
+
+    Reads the rollups (O(envelopes) per trip), never the raw expenses.
+    """
+    today = today or date.today()
+    category = func.lower(BudgetEnvelope.category)
+    spent = func.coalesce(func.sum(BudgetRollup.total_converted), 0.0)
+    totals = (
+        select(Trip.id, Trip.trip_type, Trip.price_sensitivity, Trip.start_date, Trip.end_date, category, spent)
+        .join(BudgetEnvelope, BudgetEnvelope.trip_id == Trip.id)
+        .outerjoin(
+            BudgetRollup, and_(BudgetRollup.trip_id == Trip.id, BudgetRollup.envelope_key == BudgetEnvelope.id)
+        )
+        .where(Trip.is_template.is_(False), Trip.end_date < today)
+        .group_by(Trip.id, Trip.trip_type, Trip.price_sensitivity, Trip.start_date, Trip.end_date, category)
+        .order_by(Trip.id)
+        .execution_options(stream_results=True, yield_per=AGGREGATE_BATCH_SIZE)
+    )
+
+    segment_trips: Dict[Segment, int] = defaultdict(int)
+    stats: Dict[Tuple[Segment, str], _ShareStats] = defaultdict(_ShareStats)
+    for _, rows in groupby(db.execute(totals), key=lambda row: row[0]):
+        rows = list(rows)
+        trip_total = sum(row[6] for row in rows)
+        if trip_total <= 0:
+            continue
+        first = rows[0]
+        trip_type, sensitivity = _segment_key(first[1], first[2])
+        days = (first[4] - first[3]).days + 1
+        for bucket in (duration_bucket(days), ALL_DURATIONS):
+            segment = (trip_type, sensitivity, bucket)
+            segment_trips[segment] += 1
+            for row in rows:
+                stats[(segment, row[5])].add(row[6] / trip_total)
+
+    computed_at = datetime.utcnow()
+    records = [
+        {
+            "trip_type": segment[0],
+            "price_sensitivity": segment[1],
+            "duration_bucket": segment[2],
+            "category": category_name,
+            "trip_count": share.count,
+            "segment_trip_count": segment_trips[segment],
+            "mean_share": share.total / share.count,
+            "p25_share": share.quantiles[0.25].value(),
+            "p50_share": share.quantiles[0.5].value(),
+            "p75_share": share.quantiles[0.75].value(),
+            "computed_at": computed_at,
+        }
+        for (segment, category_name), share in stats.items()
+    ]
+    db.execute(delete(SpendBenchmark))
+    if records:
+        db.execute(insert(SpendBenchmark), records)
+    spend_benchmarks.invalidate()
+    return len(records)
+
+
+class SpendBenchmarkIndex:
+    """Allocation ratios per segment, derived once per load so lookups are a dict hit."""
+
+    def __init__(self) -> None:
+        self._ratios: Dict[Segment, Dict[str, float]] = {}
+        self._loaded_at: Optional[float] = None
+        self._lock = Lock()
+
+    def invalidate(self) -> None:
+        self._loaded_at = None
+
+    def ensure_loaded(self, db: Session) -> None:
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < RELOAD_SECONDS:
+            return
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at < RELOAD_SECONDS:
+                return
+            medians: Dict[Segment, Dict[str, float]] = defaultdict(dict)
+            rows = db.execute(
+                select(
+                    SpendBenchmark.trip_type,
+                    SpendBenchmark.price_sensitivity,
+                    SpendBenchmark.duration_bucket,
+                    SpendBenchmark.category,
+                    SpendBenchmark.p50_share,
+                    SpendBenchmark.mean_share,
+                ).where(
+                    SpendBenchmark.segment_trip_count >= MIN_SEGMENT_TRIPS,
+                    SpendBenchmark.trip_count >= SpendBenchmark.segment_trip_count * MIN_CATEGORY_PRESENCE,
+                )
+            )
+            for trip_type, sensitivity, bucket, category, p50, mean in rows:
+                # Medians resist the odd outlier trip; fall back to the mean for mostly-zero categories.
+                medians[(trip_type, sensitivity, bucket)][category] = p50 or mean
+            ratios = {}
+            for segment, shares in medians.items():
+                total = sum(shares.values())
+                if total > 0:
+                    ratios[segment] = {category: share / total for category, share in shares.items() if share > 0}
+            self._ratios = ratios
+            self._loaded_at = time.monotonic()
+
+    def ratios(self, segment: Segment) -> Optional[Dict[str, float]]:
+        return self._ratios.get(segment)
+
+
+spend_benchmarks = SpendBenchmarkIndex()
+
+
+def segment_ratios(
+    db: Session, trip_type: Optional[str], price_sensitivity: Optional[str], days: int
+) -> Optional[Dict[str, float]]:
+    """Category ratios observed on finished trips of this profile and length, or None when there are too few."""
+    spend_benchmarks.ensure_loaded(db)
+    trip_type, sensitivity = _segment_key(trip_type, price_sensitivity)
+    for bucket in (duration_bucket(days), ALL_DURATIONS):
+        ratios = spend_benchmarks.ratios((trip_type, sensitivity, bucket))
+        if ratios:
+            return ratios
+    return None
+
+
+def benchmark_ratios(db: Session, trip: Trip) -> Optional[Dict[str, float]]:
+    """Category ratios observed on similar finished trips, or None when there are too few."""
+    return segment_ratios(db, trip.trip_type, trip.price_sensitivity, (trip.end_date - trip.start_date).days + 1)
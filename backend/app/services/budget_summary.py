@@ -0,0 +1,101 @@
+"""Budget aggregation shared by the budget API and the PDF export."""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date
+from typing import Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import BudgetEnvelope, BudgetRollup, Expense, Trip
+from app.schemas import BudgetEnvelopeRead, BudgetEnvelopeSummary, BudgetSummaryResponse, ExpenseRead
+from app.services.rollups import UNCATEGORIZED_KEY
+
+UNCATEGORIZED = "uncategorized"
+
+
+def envelope_rollups(db: Session, trip_id: int) -> Dict[Optional[int], BudgetRollup]:
+    """Stored rollup per envelope id (None for uncategorized expenses and events); O(envelopes)."""
+    rows = db.scalars(select(BudgetRollup).where(BudgetRollup.trip_id == trip_id))
+    return {(None if row.envelope_key == UNCATEGORIZED_KEY else row.envelope_key): row for row in rows}
+
+
+def _commitments(rollup: Optional[BudgetRollup]) -> Dict[str, float]:
+    if rollup is None:
+        return {}
+    return {
+        "committed_amount": rollup.committed_amount,
+        "committed_paid": rollup.paid_amount,
+        "committed_outstanding": max(rollup.committed_amount - rollup.paid_amount, 0.0),
+        "refundable_amount": rollup.refundable_amount,
+    }
+
+
+def summarize_budget(
+    db: Session, trip: Trip, include_expenses: bool = True, today: Optional[date] = None
+) -> BudgetSummaryResponse:
+    """Per-envelope and per-category planned/actual/committed totals, read from the rollups in O(envelopes)."""
+    today = today or date.today()
+    envelopes = db.query(BudgetEnvelope).filter(BudgetEnvelope.trip_id == trip.id).order_by(BudgetEnvelope.id).all()
+    rollups = envelope_rollups(db, trip.id)
+    # Actuals are in the trip currency; expenses without an FX rate are counted, not added.
+    spend = {envelope_id: row.total_converted for envelope_id, row in rollups.items()}
+    unconverted = sum(row.unconverted_count for row in rollups.values())
+
+    category_planned: Dict[str, float] = defaultdict(float)
+    category_actual: Dict[str, float] = defaultdict(float)
+    envelope_summaries: List[BudgetEnvelopeSummary] = []
+    for env in envelopes:
+        actual = spend.get(env.id, 0.0)
+        rollup = rollups.get(env.id)
+        category_planned[env.category] += env.planned_amount
+        category_actual[env.category] += actual
+        pct = env.planned_amount and max(0.0, min(100.0, (actual / env.planned_amount) * 100.0)) or 0.0
+        envelope_summaries.append(
+            BudgetEnvelopeSummary(
+                envelope=BudgetEnvelopeRead.model_validate(env),
+                actual_spent=actual,
+                remaining=max(env.planned_amount - actual, 0.0),
+                percent_used=pct,
+                expense_count=rollup.expense_count if rollup else 0,
+                last_spent_date=rollup.last_spent_date if rollup else None,
+                **_commitments(rollup),
+            )
+        )
+    if None in rollups and rollups[None].expense_count:
+        category_actual[UNCATEGORIZED] += spend[None]
+
+    planned_total_all = sum(category_planned.values())
+    actual_total_all = sum(spend.values())
+
+    # Remaining budget and forward-looking guidance
+    remaining_total = max(trip.total_budget - actual_total_all, 0.0)
+    days_left = max((trip.end_date - today).days + 1, 1)
+    recommended_daily = remaining_total / days_left
+
+    expenses: List[ExpenseRead] = []
+    if include_expenses:
+        rows = db.query(Expense).filter(Expense.trip_id == trip.id).order_by(Expense.spent_at_date, Expense.id)
+        expenses = [ExpenseRead.model_validate(exp) for exp in rows]
+
+    return BudgetSummaryResponse(
+        envelopes=envelope_summaries,
+        expenses=expenses,
+        categories={
+            cat: {"planned_total": category_planned.get(cat, 0.0), "actual_total": category_actual.get(cat, 0.0)}
+            for cat in set(category_planned).union(category_actual)
+        },
+        totals={
+            "planned_total_all": planned_total_all,
+            "actual_total_all": actual_total_all,
+            "currency": trip.currency,
+            "unconverted_expense_count": unconverted,
+            "committed_total": sum(row.committed_amount for row in rollups.values()),
+            "committed_outstanding_total": sum(row.committed_amount - row.paid_amount for row in rollups.values()),
+            "refundable_total": sum(row.refundable_amount for row in rollups.values()),
+        },
+        remaining_total=remaining_total,
+        recommended_daily_spend=recommended_daily,
+    )
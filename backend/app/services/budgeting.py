@@ -2,9 +2,36 @@
 
 from __future__ import annotations
 
-from typing import Dict
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
 
 from app.models import BudgetEnvelope, Trip
+from app.services.analytics import benchmark_ratios
+
+# Budget category that an itinerary event's cost is drawn from, by event type.
+EVENT_TYPE_CATEGORIES = {
+    "meal": "food",
+    "breakfast": "food",
+    "lunch": "food",
+    "dinner": "food",
+    "restaurant": "food",
+    "food": "food",
+    "flight": "transport",
+    "train": "transport",
+    "bus": "transport",
+    "ferry": "transport",
+    "car": "transport",
+    "transfer": "transport",
+    "transport": "transport",
+    "activity": "activities",
+    "tour": "activities",
+    "museum": "activities",
+    "show": "activities",
+    "hotel": "lodging",
+    "lodging": "lodging",
+}
+FALLBACK_CATEGORY = "flex"
 
 
 def allocation_ratios(price_sensitivity: str, trip_type: str) -> Dict[str, float]:
@@ -39,19 +66,38 @@ def allocation_ratios(price_sensitivity: str, trip_type: str) -> Dict[str, float
     return {k: v / total for k, v in base.items()}
 
 
-def allocate_default_envelopes(trip: Trip) -> Dict[str, float]:
-    ratios = allocation_ratios(trip.price_sensitivity, trip.trip_type)
+def event_budget_category(event_type: Optional[str]) -> str:
+    """Envelope category for an event's cost; unknown types fall back to flex."""
+    return EVENT_TYPE_CATEGORIES.get((event_type or "").strip().lower(), FALLBACK_CATEGORY)
+
+
+def allocate_default_envelopes(trip: Trip, db: Optional[Session] = None) -> Dict[str, float]:
+    """Planned amount per category: ratios from similar past trips when known (needs `db`), else the defaults.
+
+    Benchmarks can cover other categories than the defaults, so with them every existing
+    envelope they leave out is planned at zero and the plan still adds up to the budget.
+    """
     total = trip.total_budget or 0
-    return {cat: round(total * pct, 2) for cat, pct in ratios.items()}
+    ratios = db is not None and benchmark_ratios(db, trip)
+    planned: Dict[str, float] = {}
+    if ratios:
+        planned = {env.category.lower(): 0.0 for env in trip.budget_envelopes}
+    else:
+        ratios = allocation_ratios(trip.price_sensitivity, trip.trip_type)
+    planned.update({cat: round(total * pct, 2) for cat, pct in ratios.items()})
+    return planned
 
 
 def ensure_envelopes(trip: Trip, db, planned: Dict[str, float]) -> None:
-    """Create or update key envelopes for a trip."""
-    existing = {env.category: env for env in trip.budget_envelopes}
+    """Create or update key envelopes for a trip; categories match case-insensitively, oldest envelope first."""
+    existing: Dict[str, BudgetEnvelope] = {}
+    for env in sorted(trip.budget_envelopes, key=lambda env: env.id):
+        existing.setdefault(env.category.lower(), env)
     for category, amount in planned.items():
-        env = existing.get(category)
+        env = existing.get(category.lower())
         if not env:
             env = BudgetEnvelope(trip_id=trip.id, category=category, planned_amount=amount)
             db.add(env)
+            existing[category.lower()] = env
         else:
             env.planned_amount = amount
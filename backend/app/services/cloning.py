@@ -0,0 +1,119 @@
+"""Set-based trip cloning: child rows are copied server-side with INSERT ... SELECT."""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import func, insert, literal, select, union_all
+from sqlalchemy.orm import Session, aliased
+
+from app.models import BudgetEnvelope, Event, Trip, TripDestination
+from app.services.rollups import rebuild_rollups
+from app.services.suggest import track_location_use
+
+
+def _shift_date(column, days: int, dialect: str):
+    """SQL expression for `column + days` on the running backend."""
+    if not days:
+        return column
+    if dialect == "sqlite":
+        return func.date(column, f"{days:+d} days")
+    return column + days  # Postgres: date + integer -> date
+
+
+def clone_trip(
+    db: Session,
+    source: Trip,
+    owner_id: int,
+    name: Optional[str] = None,
+    shift_days: int = 0,
+    is_template: bool = False,
+) -> Trip:
+    """Copy a trip with its destinations, events and budget envelopes.
+
+    Members, expenses and weather alerts are not copied: they belong to the
+    original journey, not to the plan. Events keep their envelope's category and
+    start unpaid. The caller commits.
+    """
+    delta = timedelta(days=shift_days)
+    clone = Trip(
+        owner_id=owner_id,
+        name=name or source.name,
+        destination=source.destination,
+        start_date=source.start_date + delta,
+        end_date=source.end_date + delta,
+        total_budget=source.total_budget,
+        currency=source.currency,
+        party_size=source.party_size,
+        price_sensitivity=source.price_sensitivity,
+        trip_type=source.trip_type,
+        is_template=is_template,
+    )
+    db.add(clone)
+    db.flush()
+
+    dialect = db.get_bind().dialect.name
+    new_trip_id = literal(clone.id)
+
+    db.execute(
+        insert(TripDestination).from_select(
+            ["trip_id", "location_id", "sort_order"],
+            select(new_trip_id, TripDestination.location_id, TripDestination.sort_order).where(
+                TripDestination.trip_id == source.id
+            ),
+        )
+    )
+
+    db.execute(
+        insert(BudgetEnvelope).from_select(
+            ["trip_id", "category", "planned_amount", "notes"],
+            select(new_trip_id, BudgetEnvelope.category, BudgetEnvelope.planned_amount, BudgetEnvelope.notes).where(
+                BudgetEnvelope.trip_id == source.id
+            ),
+        )
+    )
+
+    event_columns = [
+        "location_id",
+        "start_time",
+        "end_time",
+        "title",
+        "type",
+        "cost",
+        "notes",
+        "category_type",
+        "is_refundable",
+        "reservation_link",
+    ]
+    # Point each copied event at the clone's envelope with its source envelope's category.
+    source_envelope = aliased(BudgetEnvelope)
+    cloned_envelope = aliased(BudgetEnvelope)
+    envelope_id = (
+        select(func.min(cloned_envelope.id))
+        .where(cloned_envelope.trip_id == clone.id, cloned_envelope.category == source_envelope.category)
+        .scalar_subquery()
+    )
+    db.execute(
+        insert(Event).from_select(
+            ["trip_id", "date", *event_columns, "envelope_id"],
+            select(
+                new_trip_id,
+                _shift_date(Event.date, shift_days, dialect),
+                *(getattr(Event, col) for col in event_columns),
+                envelope_id,
+            )
+            .outerjoin(source_envelope, source_envelope.id == Event.envelope_id)
+            .where(Event.trip_id == source.id),
+        )
+    )
+    rebuild_rollups(db, [clone.id])
+
+    # The copies are Core inserts, so the autocomplete index has to be told about the new references.
+    refs = union_all(
+        select(TripDestination.location_id.label("location_id")).where(TripDestination.trip_id == clone.id),
+        select(Event.location_id.label("location_id")).where(Event.trip_id == clone.id, Event.location_id.is_not(None)),
+    ).subquery()
+    for location_id, uses in db.execute(select(refs.c.location_id, func.count()).group_by(refs.c.location_id)):
+        track_location_use(db, location_id, uses)
+    return clone
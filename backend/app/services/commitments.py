@@ -0,0 +1,134 @@
+"""Event commitments: which envelope an event's planned cost is held against, and which expenses paid it.
+
+New ORM events get an envelope from their type in a flush hook; bulk writers call
+`envelope_for_event` themselves. `reconcile_commitments` (run via
+`python -m app.reconcile_commitments`) catches up existing data set-wise: it assigns
+missing envelopes, links unambiguous expense/event pairs and rebuilds the rollups.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import case, func, select, update
+from sqlalchemy.orm import Session, aliased
+
+from app.models import BudgetEnvelope, Event, Expense
+from app.services.budgeting import EVENT_TYPE_CATEGORIES, FALLBACK_CATEGORY, event_budget_category
+from app.services.revisions import bump_trip_revision
+from app.services.rollups import rebuild_rollups
+
+# An expense pays for an event when its converted amount is within this of the event's cost.
+LINK_TOLERANCE = 0.01
+
+
+@dataclass
+class ReconcileResult:
+    envelopes_assigned: int
+    expenses_linked: int
+    trip_ids: Set[int]
+
+
+def trip_envelope_ids(db: Session, trip_id: int) -> Dict[str, int]:
+    """{lowercased category: envelope id} for a trip; the oldest envelope wins on duplicates."""
+    rows = db.execute(
+        select(func.lower(BudgetEnvelope.category), func.min(BudgetEnvelope.id))
+        .where(BudgetEnvelope.trip_id == trip_id)
+        .group_by(func.lower(BudgetEnvelope.category))
+    )
+    return dict(rows.all())
+
+
+def envelope_for_event(envelope_ids: Dict[str, int], event_type: Optional[str]) -> Optional[int]:
+    """Envelope for an event's type, else the flex envelope, else None (uncategorized)."""
+    return envelope_ids.get(event_budget_category(event_type), envelope_ids.get(FALLBACK_CATEGORY))
+
+
+def assign_envelopes_on_flush(session: Session, flush_context, instances) -> None:
+    """`before_flush` hook: commit new events without an explicit envelope to the one for their type."""
+    by_trip: Dict[int, Dict[str, int]] = {}
+    for obj in session.new:
+        if not isinstance(obj, Event) or obj.envelope_id is not None:
+            continue
+        trip_id = obj.trip_id if obj.trip_id is not None else getattr(obj.trip, "id", None)
+        if trip_id is None:
+            continue  # a brand-new trip has no envelopes yet
+        if trip_id not in by_trip:
+            with session.no_autoflush:
+                by_trip[trip_id] = trip_envelope_ids(session, trip_id)
+        obj.envelope_id = envelope_for_event(by_trip[trip_id], obj.type)
+
+
+def _typed_envelope(category):
+    return (
+        select(func.min(BudgetEnvelope.id))
+        .where(BudgetEnvelope.trip_id == Event.trip_id, func.lower(BudgetEnvelope.category) == category)
+        .scalar_subquery()
+    )
+
+
+def assign_event_envelopes(db: Session, trip_ids: Optional[Iterable[int]] = None) -> List[tuple]:
+    """Give events without an envelope the one for their type; returns (event id, trip id) per event."""
+    category = case(EVENT_TYPE_CATEGORIES, value=func.lower(func.trim(Event.type)), else_=FALLBACK_CATEGORY)
+    target = func.coalesce(_typed_envelope(category), _typed_envelope(FALLBACK_CATEGORY))
+    stmt = select(Event.id, Event.trip_id, target).where(Event.envelope_id.is_(None), target.is_not(None))
+    if trip_ids is not None:
+        stmt = stmt.where(Event.trip_id.in_(list(trip_ids)))
+    rows = db.execute(stmt).all()
+    if rows:
+        db.execute(update(Event), [{"id": event_id, "envelope_id": envelope_id} for event_id, _, envelope_id in rows])
+    return [(event_id, trip_id) for event_id, trip_id, _ in rows]
+
+
+def link_expenses_to_events(db: Session, trip_ids: Optional[Iterable[int]] = None) -> List[tuple]:
+    """Link unlinked expenses to the event they evidently paid for; returns (expense id, event id, trip id).
+
+    A pair matches on trip, date and amount (within LINK_TOLERANCE of the cost) and is only
+    linked when neither side has another candidate and the event has no payment yet.
+    Uncategorized expenses also take the event's envelope.
+    """
+    linked = aliased(Expense)
+    candidates = (
+        select(
+            Expense.id.label("expense_id"),
+            Event.id.label("event_id"),
+            Event.trip_id,
+            func.coalesce(Expense.envelope_id, Event.envelope_id).label("envelope_id"),
+            func.count().over(partition_by=Expense.id).label("per_expense"),
+            func.count().over(partition_by=Event.id).label("per_event"),
+        )
+        .join(Event, (Event.trip_id == Expense.trip_id) & (Event.date == Expense.spent_at_date))
+        .where(
+            Expense.event_id.is_(None),
+            Expense.amount_converted.is_not(None),
+            Event.cost > 0,
+            func.abs(Expense.amount_converted - Event.cost) <= LINK_TOLERANCE,
+            ~select(linked.id).where(linked.event_id == Event.id).exists(),
+        )
+    )
+    if trip_ids is not None:
+        candidates = candidates.where(Expense.trip_id.in_(list(trip_ids)))
+    candidates = candidates.subquery()
+    rows = db.execute(
+        select(candidates.c.expense_id, candidates.c.event_id, candidates.c.trip_id, candidates.c.envelope_id).where(
+            candidates.c.per_expense == 1, candidates.c.per_event == 1
+        )
+    ).all()
+    if rows:
+        db.execute(
+            update(Expense),
+            [{"id": expense_id, "event_id": event_id, "envelope_id": envelope_id} for expense_id, event_id, _, envelope_id in rows],
+        )
+    return [(expense_id, event_id, trip_id) for expense_id, event_id, trip_id, _ in rows]
+
+
+def reconcile_commitments(db: Session, trip_ids: Optional[Iterable[int]] = None) -> ReconcileResult:
+    """Assign envelopes, link payments and rebuild the rollups (all trips when trip_ids is None). The caller commits."""
+    ids = None if trip_ids is None else list(trip_ids)
+    assigned = assign_event_envelopes(db, ids)
+    links = link_expenses_to_events(db, ids)
+    touched = {trip_id for _, trip_id in assigned} | {trip_id for _, _, trip_id in links}
+    rebuild_rollups(db, ids)
+    bump_trip_revision(db, touched)
+    return ReconcileResult(envelopes_assigned=len(assigned), expenses_linked=len(links), trip_ids=touched)
@@ -0,0 +1,98 @@
+"""Overlap detection for timed itinerary events."""
+
+from __future__ import annotations
+
+import heapq
+from datetime import date, time
+from itertools import groupby
+from typing import Dict, Iterable, List, Sequence
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Event
+
+DAY_SECONDS = 24 * 60 * 60
+
+
+def _seconds(value: time) -> int:
+    return value.hour * 3600 + value.minute * 60 + value.second
+
+
+def _as_time(seconds: int) -> time:
+    if seconds >= DAY_SECONDS:
+        return time.max.replace(microsecond=0)
+    return time(seconds // 3600, (seconds % 3600) // 60, seconds % 60)
+
+
+def _interval(event) -> tuple:
+    start = _seconds(event.start_time)
+    if event.end_time is None:
+        end = start + 1  # open-ended events occupy their start instant
+    else:
+        end = _seconds(event.end_time)
+        if end <= start:
+            # Runs past midnight (or has no length): clip to the end of the day.
+            end = DAY_SECONDS if end < start else start + 1
+    return start, end
+
+
+def find_conflicts(events: Iterable) -> List[Dict]:
+    """Return every pair of overlapping timed events, grouped per day.
+
+    Sweep-line over each day's intervals sorted by start; a min-heap of the
+    active intervals' end times drops finished ones, so the cost is
+    O(n log n + k) for n events and k reported overlaps. Events without a
+    start_time are all-day entries and never conflict.
+    """
+    timed = sorted(
+        ((evt.date, *_interval(evt), evt.id) for evt in events if evt.start_time is not None),
+        key=lambda item: item[:3],
+    )
+    conflicts: List[Dict] = []
+    for day, items in groupby(timed, key=lambda item: item[0]):
+        active: List[tuple] = []  # (end, start, id)
+        for _, start, end, event_id in items:
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            for other_end, _, other_id in active:
+                overlap_end = min(end, other_end)
+                if overlap_end == start + 1:
+                    overlap_end = start  # an instant, not a one-second window
+                conflicts.append(
+                    {
+                        "date": day,
+                        "event_ids": [other_id, event_id],
+                        "overlap_start": _as_time(start),
+                        "overlap_end": _as_time(overlap_end),
+                    }
+                )
+            heapq.heappush(active, (end, start, event_id))
+    return conflicts
+
+
+def _timed_events(db: Session, trip_id: int, days: Sequence[date] | None = None):
+    stmt = select(Event.id, Event.date, Event.start_time, Event.end_time).where(
+        Event.trip_id == trip_id, Event.start_time.is_not(None)
+    )
+    if days is not None:
+        stmt = stmt.where(Event.date.in_(days))
+    return db.execute(stmt).all()
+
+
+def trip_conflicts(db: Session, trip_id: int) -> List[Dict]:
+    return find_conflicts(_timed_events(db, trip_id))
+
+
+def conflicts_by_event(db: Session, trip_id: int, event_ids: Iterable[int], days: Iterable[date]) -> Dict[int, List[Dict]]:
+    """Incremental check after writes: only the affected days are loaded and swept."""
+    wanted = set(event_ids)
+    by_event: Dict[int, List[Dict]] = {event_id: [] for event_id in wanted}
+    day_list = sorted(set(days))
+    if not day_list:
+        return by_event
+    for conflict in find_conflicts(_timed_events(db, trip_id, day_list)):
+        for event_id in conflict["event_ids"]:
+            if event_id in wanted:
+                by_event[event_id].append(conflict)
+    return by_event
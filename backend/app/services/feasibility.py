@@ -0,0 +1,117 @@
+"""Travel-time feasibility of consecutive itinerary events."""
+
+from __future__ import annotations
+
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import Event, Location, Trip
+from app.services.geo import haversine_km
+from app.services.revisions import RevisionCache
+
+# Door-to-door assumptions per mode: average speed (km/h) and fixed overhead (minutes)
+# for waiting, parking or boarding. Straight-line distance is inflated by a detour factor.
+TRAVEL_MODES: Dict[str, Dict[str, float]] = {
+    "walk": {"speed_kmh": 4.5, "overhead_min": 0.0},
+    "transit": {"speed_kmh": 20.0, "overhead_min": 10.0},
+    "drive": {"speed_kmh": 35.0, "overhead_min": 10.0},
+}
+DETOUR_FACTOR = 1.3
+# "auto" walks short hops, takes transit within a city and drives beyond that.
+AUTO_WALK_MAX_KM = 1.5
+AUTO_TRANSIT_MAX_KM = 30.0
+
+_report_cache = RevisionCache()
+
+
+def _minutes(values) -> np.ndarray:
+    return np.array([t.hour * 60 + t.minute + t.second / 60.0 for t in values], dtype=np.float64)
+
+
+def _estimate_minutes(distance_km: np.ndarray, mode: str):
+    """Vectorized travel estimate; returns (minutes, mode label per transition)."""
+    if mode != "auto":
+        params = TRAVEL_MODES[mode]
+        minutes = distance_km * DETOUR_FACTOR / params["speed_kmh"] * 60.0 + params["overhead_min"]
+        return minutes, np.full(distance_km.shape, mode, dtype=object)
+
+    names = ("walk", "transit", "drive")
+    idx = np.searchsorted([AUTO_WALK_MAX_KM, AUTO_TRANSIT_MAX_KM], distance_km, side="left")
+    speed = np.array([TRAVEL_MODES[name]["speed_kmh"] for name in names])
+    overhead = np.array([TRAVEL_MODES[name]["overhead_min"] for name in names])
+    labels = np.array(names, dtype=object)[idx]
+    minutes = distance_km * DETOUR_FACTOR / speed[idx] * 60.0 + overhead[idx]
+    return minutes, labels
+
+
+def _build_report(db: Session, trip: Trip, mode: str) -> Dict:
+    rows = db.execute(
+        select(Event.id, Event.date, Event.start_time, Event.end_time, Location.latitude, Location.longitude)
+        .join(Location, Location.id == Event.location_id)
+        .where(
+            Event.trip_id == trip.id,
+            Event.start_time.is_not(None),
+            Location.latitude.is_not(None),
+            Location.longitude.is_not(None),
+        )
+        .order_by(Event.date, Event.start_time, Event.id)
+    ).all()
+
+    transitions: List[Dict] = []
+    if len(rows) >= 2:
+        ids = np.array([r.id for r in rows])
+        days = np.array([r.date.toordinal() for r in rows])
+        lat = np.array([r.latitude for r in rows], dtype=np.float64)
+        lon = np.array([r.longitude for r in rows], dtype=np.float64)
+        starts = _minutes(r.start_time for r in rows)
+        ends = _minutes((r.end_time or r.start_time) for r in rows)
+        ends = np.where(ends < starts, 24 * 60.0, ends)  # past midnight: busy until day end
+
+        # Transitions are consecutive located events within the same day, computed in one pass.
+        same_day = days[:-1] == days[1:]
+        src = np.nonzero(same_day)[0]
+        dst = src + 1
+        distance = haversine_km(lat[src], lon[src], lat[dst], lon[dst])
+        gap = starts[dst] - ends[src]
+        needed, labels = _estimate_minutes(distance, mode)
+        feasible = gap >= needed
+
+        for k, (i, j) in enumerate(zip(src, dst)):
+            transitions.append(
+                {
+                    "date": rows[i].date,
+                    "from_event_id": int(ids[i]),
+                    "to_event_id": int(ids[j]),
+                    "distance_km": round(float(distance[k]), 3),
+                    "gap_minutes": round(float(gap[k]), 1),
+                    "travel_minutes": round(float(needed[k]), 1),
+                    "mode": labels[k],
+                    "feasible": bool(feasible[k]),
+                }
+            )
+
+    return {
+        "trip_id": trip.id,
+        "revision": trip.revision or 0,
+        "mode": mode,
+        "transitions": transitions,
+        "infeasible_count": sum(1 for t in transitions if not t["feasible"]),
+    }
+
+
+def itinerary_feasibility(db: Session, trip: Trip, mode: str = "auto") -> Dict:
+    """Flag consecutive same-day events that cannot be reached in the gap between them.
+
+    Results are cached per trip revision, so repeated views cost nothing until the itinerary changes.
+    Geocoding bumps the revision of every trip using a location (see
+    app.services.locations.bump_trips_using_locations), so reports built before
+    coordinates arrived are not served afterwards.
+    """
+    report = _report_cache.get(trip, mode)
+    if report is None:
+        report = _build_report(db, trip, mode)
+        _report_cache.put(trip, mode, value=report)
+    return report
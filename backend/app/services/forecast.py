@@ -0,0 +1,145 @@
+"""Per-envelope spend velocity and projected overruns."""
+
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+
+from app.models import BudgetEnvelope, Event, Expense, Trip
+from app.schemas import BudgetForecast, EnvelopeForecast
+from app.services.budget_summary import UNCATEGORIZED
+from app.services.revisions import RevisionCache
+
+# Daily spend is averaged with exponentially decaying weights, so recent days count most.
+BURN_HALF_LIFE_DAYS = 3.0
+
+_forecast_cache = RevisionCache()
+
+
+def _daily_spend(db: Session, trip_id: int):
+    """(envelope_id, spent_at_date, amount, amount not paid against an event) per day, in trip currency.
+
+    Payments against itinerary events are planned costs, so they count as spent but not towards the burn rate.
+    """
+    amount = func.coalesce(Expense.amount_converted, 0.0)
+    return db.execute(
+        select(
+            Expense.envelope_id,
+            Expense.spent_at_date,
+            func.sum(amount),
+            func.sum(case((Expense.event_id.is_(None), amount), else_=0.0)),
+        )
+        .where(Expense.trip_id == trip_id)
+        .group_by(Expense.envelope_id, Expense.spent_at_date)
+    ).all()
+
+
+def _committed_costs(db: Session, trip_id: int, today: date):
+    """(envelope_id, date, cost not yet paid) for events from today on."""
+    return db.execute(
+        select(Event.envelope_id, Event.date, Event.cost - Event.paid_amount).where(
+            Event.trip_id == trip_id, Event.date >= today, Event.cost > Event.paid_amount
+        )
+    ).all()
+
+
+def _overrun_offsets(cumulative: np.ndarray, limits: np.ndarray) -> np.ndarray:
+    """Index of the first column where each row exceeds its limit, or -1."""
+    over = cumulative > limits[:, None] + 1e-9
+    return np.where(over.any(axis=1), over.argmax(axis=1), -1)
+
+
+def _build_forecast(db: Session, trip: Trip, today: date) -> BudgetForecast:
+    envelopes = db.execute(
+        select(BudgetEnvelope.id, BudgetEnvelope.category, BudgetEnvelope.planned_amount)
+        .where(BudgetEnvelope.trip_id == trip.id)
+        .order_by(BudgetEnvelope.id)
+    ).all()
+    # One row per envelope plus a last row for uncategorized spending.
+    keys: List[Optional[int]] = [env.id for env in envelopes] + [None]
+    row_of = {key: index for index, key in enumerate(keys)}
+    planned = np.array([env.planned_amount for env in envelopes] + [0.0])
+
+    trip_days = (trip.end_date - trip.start_date).days + 1
+    elapsed = min(max((today - trip.start_date).days + 1, 0), trip_days)
+    remaining = max((trip.end_date - today).days, 0)
+
+    # Spend to date and the elapsed-days series the burn rate is fitted on.
+    spend = _daily_spend(db, trip.id)
+    rows = np.array([row_of.get(row[0], len(keys) - 1) for row in spend], dtype=np.int64)
+    offsets = np.array([(row[1] - trip.start_date).days for row in spend], dtype=np.int64)
+    amounts = np.array([row[2] for row in spend], dtype=np.float64)
+    organic = np.array([row[3] for row in spend], dtype=np.float64)
+    spent = np.bincount(rows, weights=amounts, minlength=len(keys)) if len(spend) else np.zeros(len(keys))
+    burn = np.zeros(len(keys))
+    if elapsed:
+        in_window = (offsets >= 0) & (offsets < elapsed)
+        daily = np.zeros((len(keys), elapsed))
+        np.add.at(daily, (rows[in_window], offsets[in_window]), organic[in_window])
+        weights = 0.5 ** (np.arange(elapsed)[::-1] / BURN_HALF_LIFE_DAYS)
+        burn = daily @ weights / weights.sum()
+
+    # Committed event costs, placed on their day of the horizon (today .. end of trip).
+    committed = np.zeros((len(keys), remaining + 1))
+    for envelope_id, event_date, cost in _committed_costs(db, trip.id, today):
+        committed[row_of.get(envelope_id, len(keys) - 1), min((event_date - today).days, remaining)] += cost
+
+    # Today's spending is already in `spent`; the burn rate applies from tomorrow.
+    cumulative = spent[:, None] + burn[:, None] * np.arange(remaining + 1)[None, :] + np.cumsum(committed, axis=1)
+    projected = cumulative[:, -1]
+
+    def overrun_date(offset: int) -> Optional[date]:
+        return today + timedelta(days=int(offset)) if offset >= 0 else None
+
+    envelope_offsets = _overrun_offsets(cumulative[:-1], planned[:-1])
+    trip_offset = _overrun_offsets(cumulative.sum(axis=0, keepdims=True), np.array([trip.total_budget or 0.0]))[0]
+
+    forecasts = [
+        EnvelopeForecast(
+            envelope_id=env.id,
+            category=env.category,
+            planned_amount=env.planned_amount,
+            spent=round(float(spent[i]), 2),
+            committed=round(float(committed[i].sum()), 2),
+            daily_burn_rate=round(float(burn[i]), 2),
+            projected_total=round(float(projected[i]), 2),
+            overrun_date=overrun_date(envelope_offsets[i]),
+        )
+        for i, env in enumerate(envelopes)
+    ]
+    if spent[-1] or committed[-1].any():
+        forecasts.append(
+            EnvelopeForecast(
+                category=UNCATEGORIZED,
+                spent=round(float(spent[-1]), 2),
+                committed=round(float(committed[-1].sum()), 2),
+                daily_burn_rate=round(float(burn[-1]), 2),
+                projected_total=round(float(projected[-1]), 2),
+            )
+        )
+    return BudgetForecast(
+        as_of=today,
+        days_elapsed=elapsed,
+        days_remaining=remaining,
+        envelopes=forecasts,
+        daily_burn_rate=round(float(burn.sum()), 2),
+        projected_total=round(float(projected.sum()), 2),
+        overrun_date=overrun_date(trip_offset),
+    )
+
+
+def forecast_budget(db: Session, trip: Trip, today: Optional[date] = None) -> BudgetForecast:
+    """Burn rate, committed costs and projected overrun date per envelope and for the trip.
+
+    Cached per trip revision and day, so dashboards re-rendering many trips only pay once.
+    """
+    today = today or date.today()
+    forecast = _forecast_cache.get(trip, today)
+    if forecast is None:
+        forecast = _build_forecast(db, trip, today)
+        _forecast_cache.put(trip, today, value=forecast)
+    return forecast
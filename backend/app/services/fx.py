@@ -0,0 +1,169 @@
+"""Historical FX rates and vectorized conversion into a trip's currency.
+
+Rates live in `fx_rates` as units of a currency per one BASE_CURRENCY on a date,
+loaded from a file by `python -m app.load_fx_rates`. Lookups go through an
+in-memory index: per currency, a sorted array of day numbers and the matching
+rates, searched with numpy.searchsorted. A date between published rates uses the
+latest rate on or before it; dates before the first rate use the first one.
+"""
+
+from __future__ import annotations
+
+import time
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from sqlalchemy import func, inspect, select, update
+from sqlalchemy.orm import Session
+
+from app.models import Expense, FxRate, Trip
+
+BASE_CURRENCY = "USD"
+# Other processes (the loader) may change the rates; compare the table's version marker at most this often.
+VERSION_CHECK_SECONDS = 60
+UPDATE_BATCH_SIZE = 1000
+
+
+def _day_numbers(dates: Sequence) -> np.ndarray:
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+class FxRateIndex:
+    def __init__(self) -> None:
+        self._series: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._version: Optional[tuple] = None
+        self._checked_at = 0.0
+        self._lock = Lock()
+
+    def invalidate(self) -> None:
+        self._version = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _table_version(db: Session) -> tuple:
+        # Other processes (the loader) add rates or overwrite them in place; the sum catches the latter.
+        return tuple(db.execute(select(func.count(), func.max(FxRate.id), func.sum(FxRate.rate))).one())
+
+    def ensure_loaded(self, db: Session) -> None:
+        """Re-read the table when its version marker changed; the marker is checked at most every VERSION_CHECK_SECONDS."""
+        if self._version is not None and time.monotonic() - self._checked_at < VERSION_CHECK_SECONDS:
+            return
+        version = self._table_version(db)
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if version == self._version:
+                return
+            rows = db.execute(select(FxRate.currency, FxRate.rate_date, FxRate.rate).order_by(FxRate.currency, FxRate.rate_date)).all()
+            series: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+            if rows:
+                currencies = np.array([row.currency for row in rows])
+                days = _day_numbers([row.rate_date for row in rows])
+                rates = np.array([row.rate for row in rows], dtype=np.float64)
+                # Rows are sorted by currency, so each currency is one contiguous slice.
+                names, starts = np.unique(currencies, return_index=True)
+                bounds = list(starts) + [len(rows)]
+                for i, name in enumerate(names):
+                    lo, hi = bounds[i], bounds[i + 1]
+                    series[str(name)] = (days[lo:hi], rates[lo:hi])
+            self._series = series
+            self._version = version
+
+    def rates(self, currency: str, days: np.ndarray) -> np.ndarray:
+        """Units of `currency` per BASE_CURRENCY on each day; NaN where the currency has no rates."""
+        if currency == BASE_CURRENCY:
+            return np.ones(len(days))
+        series = self._series.get(currency)
+        if series is None:
+            return np.full(len(days), np.nan)
+        rate_days, rates = series
+        idx = np.clip(np.searchsorted(rate_days, days, side="right") - 1, 0, len(rates) - 1)
+        return rates[idx]
+
+    def convert(self, db: Session, amounts, currencies, dates, target: str) -> np.ndarray:
+        """Convert amounts into `target` at each row's date; NaN where a rate is missing."""
+        self.ensure_loaded(db)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        result = np.full(len(amounts), np.nan)
+        if not len(amounts):
+            return result
+        currencies = np.asarray([(code or "").upper() for code in currencies])
+        days = _day_numbers(dates)
+        target = target.upper()
+        target_rates = None
+        for currency in np.unique(currencies):
+            mask = currencies == currency
+            if currency == target:
+                result[mask] = amounts[mask]
+                continue
+            if target_rates is None:
+                target_rates = self.rates(target, days)
+            result[mask] = amounts[mask] / self.rates(str(currency), days[mask]) * target_rates[mask]
+        return result
+
+
+fx_rates = FxRateIndex()
+
+
+def _as_optional(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(value) else round(float(value), 6) for value in values]
+
+
+def convert_amount(db: Session, amount: float, currency: str, on, target: str) -> Optional[float]:
+    return _as_optional(fx_rates.convert(db, [amount], [currency], [on], target))[0]
+
+
+def convert_expense_rows(db: Session, rows: List[dict], target: str) -> None:
+    """Set amount_converted on expense row dicts in place, one vectorized pass."""
+    if not rows:
+        return
+    converted = fx_rates.convert(
+        db, [row["amount"] for row in rows], [row["currency"] for row in rows], [row["spent_at_date"] for row in rows], target
+    )
+    for row, value in zip(rows, _as_optional(converted)):
+        row["amount_converted"] = value
+
+
+def reconvert_expenses(db: Session, trip_ids: Optional[Iterable[int]] = None, foreign_only: bool = False) -> Set[int]:
+    """Recompute amount_converted for the given trips (all when None); returns the trips touched.
+
+    Callers rebuild those trips' rollups afterwards.
+    """
+    stmt = select(Expense.id, Expense.trip_id, Expense.amount, Expense.currency, Expense.spent_at_date, Trip.currency).join(
+        Trip, Trip.id == Expense.trip_id
+    )
+    if trip_ids is not None:
+        stmt = stmt.where(Expense.trip_id.in_(list(trip_ids)))
+    if foreign_only:
+        stmt = stmt.where(Expense.currency != Trip.currency)
+    rows = db.execute(stmt).all()
+    if not rows:
+        return set()
+
+    by_target: Dict[str, List] = {}
+    for row in rows:
+        by_target.setdefault(row[5].upper(), []).append(row)
+    updates = []
+    for target, group in by_target.items():
+        converted = fx_rates.convert(db, [r.amount for r in group], [r.currency for r in group], [r.spent_at_date for r in group], target)
+        updates.extend({"id": r.id, "amount_converted": value} for r, value in zip(group, _as_optional(converted)))
+    for offset in range(0, len(updates), UPDATE_BATCH_SIZE):
+        db.execute(update(Expense), updates[offset : offset + UPDATE_BATCH_SIZE])
+    return {row.trip_id for row in rows}
+
+
+def convert_expenses_on_flush(session: Session, flush_context, instances) -> None:
+    """`before_flush` hook: price new or edited expenses in their trip's currency."""
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Expense) or obj.amount is None:
+            continue
+        if obj in session.dirty:
+            attrs = inspect(obj).attrs
+            if not any(attrs[key].history.has_changes() for key in ("amount", "currency", "spent_at_date")):
+                continue
+        trip = session.get(Trip, obj.trip_id)
+        if trip is None:
+            continue
+        # An unset currency gets the column default on insert, so convert from that.
+        currency = obj.currency or Expense.__table__.c.currency.default.arg
+        obj.amount_converted = convert_amount(session, obj.amount, currency, obj.spent_at_date, trip.currency)
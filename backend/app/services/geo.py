@@ -0,0 +1,109 @@
+"""Vectorized great-circle distance helpers."""
+
+from __future__ import annotations
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Element-wise great-circle distance in km between two sets of coordinates (degrees)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def haversine_matrix(lat, lon) -> np.ndarray:
+    """Full pairwise distance matrix in km for one set of coordinates, via broadcasting."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    return haversine_km(lat[:, None], lon[:, None], lat[None, :], lon[None, :])
+
+
+# --- Geohash -----------------------------------------------------------------
+# Locations store a geohash so proximity queries become a handful of prefix
+# range scans on an ordinary B-tree index instead of a full table scan.
+
+GEOHASH_PRECISION = 9  # ~4.8m x 4.8m cells
+MAX_COVER_CELLS = 16
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def geohash_encode(lat: float, lon: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_lo, lat_hi, lon_lo, lon_hi = -90.0, 90.0, -180.0, 180.0
+    chars = []
+    bits = 0
+    value = 0
+    even = True  # bits alternate starting with longitude
+    while len(chars) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            value = value * 2 + (lon >= mid)
+            lon_lo, lon_hi = (mid, lon_hi) if lon >= mid else (lon_lo, mid)
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            value = value * 2 + (lat >= mid)
+            lat_lo, lat_hi = (mid, lat_hi) if lat >= mid else (lat_lo, mid)
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def geohash_or_none(lat, lon) -> str | None:
+    return geohash_encode(lat, lon) if lat is not None and lon is not None else None
+
+
+def _cell_size(precision: int) -> tuple[float, float]:
+    """(height, width) of a geohash cell in degrees."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2**lat_bits, 360.0 / 2**lon_bits
+
+
+def geohash_cover(lat: float, lon: float, radius_km: float) -> list[str]:
+    """Geohash prefixes whose cells together cover the circle's bounding box.
+
+    Picks the finest precision that needs at most MAX_COVER_CELLS cells.
+    """
+    dlat = np.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(np.cos(np.radians(lat)), 1e-6)
+    dlon = min(np.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)), 180.0)
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    west, east = lon - dlon, lon + dlon
+
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = _cell_size(precision)
+        first_row, last_row = int((south + 90.0) // height), int(min((north + 90.0) // height, 180.0 / height - 1))
+        first_col, last_col = int((west + 180.0) // width), int((east + 180.0) // width)
+        total_cols = int(round(360.0 / width))
+        cols = min(last_col - first_col + 1, total_cols)
+        if (last_row - first_row + 1) * cols <= MAX_COVER_CELLS or precision == 1:
+            break
+
+    # Encode the centre of each covered cell; columns wrap across the antimeridian.
+    return sorted(
+        {
+            geohash_encode(-90.0 + (row + 0.5) * height, -180.0 + ((first_col + col) % total_cols + 0.5) * width, precision)
+            for row in range(first_row, last_row + 1)
+            for col in range(cols)
+        }
+    )
+
+
+def geohash_upper_bound(prefix: str) -> str | None:
+    """Smallest geohash string greater than every hash starting with `prefix` (None if unbounded).
+
+    Stays within the base32 alphabet so the range works under any sane collation.
+    """
+    chars = list(prefix)
+    while chars:
+        idx = _BASE32.index(chars[-1])
+        if idx + 1 < len(_BASE32):
+            chars[-1] = _BASE32[idx + 1]
+            return "".join(chars)
+        chars.pop()
+    return None
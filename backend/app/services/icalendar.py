@@ -0,0 +1,102 @@
+"""Incremental RFC 5545 (iCalendar) rendering for trip itineraries."""
+
+from __future__ import annotations
+
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, Iterator, Optional
+
+PRODID = "-//Trip Itinerary Planner//Itinerary Feed//EN"
+
+
+def _escape(value: str) -> str:
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\r\n", "\\n")
+        .replace("\n", "\\n")
+    )
+
+
+def _fold(line: str) -> str:
+    """Fold a content line to 75 octets as required by RFC 5545 section 3.1."""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= 75:
+        return line + "\r\n"
+    parts = []
+    limit = 75
+    while encoded:
+        cut = min(limit, len(encoded))
+        # Never split inside a multi-byte UTF-8 sequence.
+        while cut < len(encoded) and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode("utf-8"))
+        encoded = encoded[cut:]
+        limit = 74  # continuation lines start with a space
+    return "\r\n ".join(parts) + "\r\n"
+
+
+def _fmt_date(value: date) -> str:
+    return value.strftime("%Y%m%d")
+
+
+def _fmt_datetime(day: date, at: time) -> str:
+    return datetime.combine(day, at).strftime("%Y%m%dT%H%M%S")
+
+
+def calendar_header(name: str) -> str:
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{_escape(name)}",
+    ]
+    return "".join(_fold(line) for line in lines)
+
+
+def calendar_footer() -> str:
+    return _fold("END:VCALENDAR")
+
+
+def render_vevent(row, stamp: str, trip_name: Optional[str] = None) -> str:
+    """Render one itinerary row (event columns plus optional location columns) as a VEVENT."""
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:trip-{row.trip_id}-event-{row.id}@trip-planner",
+        f"DTSTAMP:{stamp}",
+    ]
+    if row.start_time is None:
+        lines.append(f"DTSTART;VALUE=DATE:{_fmt_date(row.date)}")
+        lines.append(f"DTEND;VALUE=DATE:{_fmt_date(row.date + timedelta(days=1))}")
+    else:
+        lines.append(f"DTSTART:{_fmt_datetime(row.date, row.start_time)}")
+        if row.end_time is not None:
+            end_day = row.date + timedelta(days=1) if row.end_time < row.start_time else row.date
+            lines.append(f"DTEND:{_fmt_datetime(end_day, row.end_time)}")
+    summary = row.title if not trip_name else f"{row.title} ({trip_name})"
+    lines.append(f"SUMMARY:{_escape(summary)}")
+    if row.type:
+        lines.append(f"CATEGORIES:{_escape(row.type)}")
+    if row.notes:
+        lines.append(f"DESCRIPTION:{_escape(row.notes)}")
+    place = ", ".join(part for part in (row.location_name, row.location_address) if part)
+    if place:
+        lines.append(f"LOCATION:{_escape(place)}")
+    if row.latitude is not None and row.longitude is not None:
+        lines.append(f"GEO:{row.latitude:.6f};{row.longitude:.6f}")
+    if row.reservation_link:
+        lines.append(f"URL:{row.reservation_link}")
+    lines.append("END:VEVENT")
+    return "".join(_fold(line) for line in lines)
+
+
+def stream_calendar(name: str, rows: Iterable, trip_names: Optional[dict] = None) -> Iterator[str]:
+    """Yield the calendar piece by piece so large feeds are never buffered in full."""
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield calendar_header(name)
+    for row in rows:
+        trip_name = trip_names.get(row.trip_id) if trip_names else None
+        yield render_vevent(row, stamp, trip_name)
+    yield calendar_footer()
@@ -0,0 +1,380 @@
+"""Bulk itinerary import/export in flat JSON and CSV records."""
+
+from __future__ import annotations
+
+import csv
+import io
+import json
+from collections import Counter
+from typing import Annotated, Dict, Iterable, Iterator, List, Optional, TextIO, Union
+
+from pydantic import Field, TypeAdapter, ValidationError
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.models import BudgetEnvelope, Event, Expense, Location, Trip, TripDestination
+from app.schemas import (
+    ItineraryImportDestination,
+    ItineraryImportEvent,
+    ItineraryImportExpense,
+    ItineraryImportResult,
+    LocationRead,
+)
+from app.services.commitments import envelope_for_event
+from app.services.fx import convert_expense_rows
+from app.services.locations import location_key, resolve_location_ids
+from app.services.revisions import bump_trip_revision
+from app.services.rollups import apply_event_rows, apply_expense_rows
+from app.services.suggest import track_location_use
+
+IMPORT_CHUNK_SIZE = 500
+EXPORT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 50
+
+# One flat record layout shared by both formats, so a CSV export re-imports as-is.
+RECORD_FIELDS = [
+    "kind",
+    "date",
+    "start_time",
+    "end_time",
+    "title",
+    "type",
+    "cost",
+    "notes",
+    "category_type",
+    "is_refundable",
+    "reservation_link",
+    "location_name",
+    "location_type",
+    "location_address",
+    "latitude",
+    "longitude",
+    "sort_order",
+    "description",
+    "amount",
+    "currency",
+    "spent_at_date",
+    "envelope",
+]
+
+ImportRecord = Annotated[
+    Union[ItineraryImportDestination, ItineraryImportEvent, ItineraryImportExpense],
+    Field(discriminator="kind"),
+]
+_record_adapter = TypeAdapter(ImportRecord)
+
+
+class ItineraryImportError(ValueError):
+    """Raised when an import contains invalid records; nothing is written."""
+
+    def __init__(self, errors: List[dict]):
+        super().__init__(f"{len(errors)} invalid record(s)")
+        self.errors = errors
+
+
+def iter_csv_records(fp: TextIO) -> Iterator[dict]:
+    """Yield CSV rows as dicts; empty cells are treated as missing values."""
+    for row in csv.DictReader(fp):
+        yield {key: value for key, value in row.items() if key and value not in (None, "")}
+
+
+def iter_json_records(fp: TextIO, chunk_size: int = 64 * 1024) -> Iterator[dict]:
+    """Incrementally decode a JSON array of objects (or newline-delimited objects).
+
+    Only the current object and one read-ahead chunk are held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    in_array = None
+
+    def fill() -> bool:
+        nonlocal buf, pos, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buf = buf[pos:] + chunk
+        pos = 0
+        return True
+
+    while True:
+        while pos < len(buf) and (buf[pos].isspace() or (in_array and buf[pos] == ",")):
+            pos += 1
+        if pos >= len(buf):
+            if eof or not fill():
+                if in_array:
+                    raise ValueError("Unterminated JSON array")
+                return
+            continue
+        if in_array is None:
+            in_array = buf[pos] == "["
+            if in_array:
+                pos += 1
+            continue
+        if in_array and buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof or not fill():
+                raise
+            continue
+        if not isinstance(obj, dict):
+            raise ValueError("Each itinerary record must be a JSON object")
+        pos = end
+        yield obj
+
+
+class _LocationResolver:
+    """Resolve location columns to registry ids, a chunk at a time."""
+
+    def __init__(self, db: Session):
+        self.db = db
+        self.ids: Dict[str, int] = {}
+        self.created = 0
+        self.needs_geocoding: List[int] = []
+        self.uses: Counter = Counter()
+        self.new_locations: Dict[int, dict] = {}
+
+    def resolve(self, records: Iterable) -> None:
+        pending: Dict[str, dict] = {}
+        for rec in records:
+            if not getattr(rec, "location_name", None):
+                continue
+            key = location_key(rec.location_name, rec.location_address)
+            if key in self.ids or key in pending:
+                continue
+            pending[key] = {
+                "name": rec.location_name.strip(),
+                "type": rec.location_type or ("city" if rec.kind == "destination" else "place"),
+                "address": rec.location_address,
+                "latitude": rec.latitude,
+                "longitude": rec.longitude,
+            }
+        if not pending:
+            return
+
+        ids, created = resolve_location_ids(self.db, pending)
+        self.ids.update(ids)
+        self.created += len(created)
+        self.new_locations.update((ids[key], pending[key]) for key in created)
+        self.needs_geocoding.extend(ids[key] for key in created if pending[key]["latitude"] is None)
+
+    def id_for(self, rec) -> Optional[int]:
+        if not getattr(rec, "location_name", None):
+            return None
+        loc_id = self.ids[location_key(rec.location_name, rec.location_address)]
+        self.uses[loc_id] += 1
+        return loc_id
+
+    def track(self) -> None:
+        """Queue autocomplete index updates for the rows these bulk inserts wrote."""
+        for loc_id, uses in self.uses.items():
+            fields = self.new_locations.get(loc_id)
+            track_location_use(self.db, loc_id, uses, LocationRead(id=loc_id, **fields) if fields else None)
+
+
+def import_itinerary(
+    db: Session, trip: Trip, records: Iterable[dict], geocode_queue: Optional[List[int]] = None
+) -> ItineraryImportResult:
+    """Validate and insert itinerary records in chunks inside the caller's transaction.
+
+    All rows are written with executemany batches; the caller commits on success.
+    Ids of newly registered locations without coordinates are appended to `geocode_queue`.
+    Raises ItineraryImportError (after rolling back) if any record is invalid.
+    """
+    locations = _LocationResolver(db)
+    envelope_ids = {
+        category.lower(): env_id
+        for env_id, category in db.execute(
+            select(BudgetEnvelope.id, BudgetEnvelope.category).where(BudgetEnvelope.trip_id == trip.id)
+        )
+    }
+    next_sort_order = (
+        db.scalar(
+            select(func.coalesce(func.max(TripDestination.sort_order), 0)).where(TripDestination.trip_id == trip.id)
+        )
+        + 1
+    )
+    counts = {"destination": 0, "event": 0, "expense": 0}
+    envelopes_created = 0
+    errors: List[dict] = []
+
+    def flush_chunk(chunk: List) -> None:
+        nonlocal next_sort_order, envelopes_created
+        locations.resolve(chunk)
+
+        new_categories = {
+            rec.envelope.strip().lower(): rec.envelope.strip()
+            for rec in chunk
+            if rec.kind == "expense" and rec.envelope and rec.envelope.strip().lower() not in envelope_ids
+        }
+        if new_categories:
+            new_ids = db.scalars(
+                insert(BudgetEnvelope).returning(BudgetEnvelope.id, sort_by_parameter_order=True),
+                [{"trip_id": trip.id, "category": category, "planned_amount": 0.0} for category in new_categories.values()],
+            ).all()
+            envelope_ids.update(zip(new_categories, new_ids))
+            envelopes_created += len(new_ids)
+
+        destinations, events, expenses = [], [], []
+        for rec in chunk:
+            if rec.kind == "destination":
+                sort_order = rec.sort_order if rec.sort_order is not None else next_sort_order
+                next_sort_order = max(next_sort_order, sort_order) + 1
+                destinations.append({"trip_id": trip.id, "location_id": locations.id_for(rec), "sort_order": sort_order})
+            elif rec.kind == "event":
+                fields = rec.model_dump(exclude={"kind", "location_name", "location_type", "location_address", "latitude", "longitude"})
+                events.append(
+                    {
+                        **fields,
+                        "trip_id": trip.id,
+                        "location_id": locations.id_for(rec),
+                        "envelope_id": envelope_for_event(envelope_ids, rec.type),
+                    }
+                )
+            else:
+                expenses.append(
+                    {
+                        "trip_id": trip.id,
+                        "envelope_id": envelope_ids.get(rec.envelope.strip().lower()) if rec.envelope else None,
+                        "description": rec.description,
+                        "amount": rec.amount,
+                        "currency": rec.currency or trip.currency,
+                        "spent_at_date": rec.spent_at_date,
+                    }
+                )
+        convert_expense_rows(db, expenses, trip.currency)
+        for model, rows in ((TripDestination, destinations), (Event, events), (Expense, expenses)):
+            if rows:
+                db.execute(insert(model), rows)
+        apply_event_rows(db, events)
+        apply_expense_rows(db, expenses)
+
+    chunk: List = []
+    for index, raw in enumerate(records, start=1):
+        try:
+            rec = _record_adapter.validate_python(raw)
+        except ValidationError as exc:
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({"record": index, "errors": exc.errors(include_url=False, include_input=False)})
+            continue
+        counts[rec.kind] += 1
+        if errors:
+            continue  # keep validating to report errors, but stop writing
+        chunk.append(rec)
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            flush_chunk(chunk)
+            chunk = []
+
+    if errors:
+        db.rollback()
+        raise ItineraryImportError(errors)
+    if chunk:
+        flush_chunk(chunk)
+
+    bump_trip_revision(db, trip.id)
+    locations.track()
+    if geocode_queue is not None:
+        geocode_queue.extend(locations.needs_geocoding)
+    return ItineraryImportResult(
+        destinations=counts["destination"],
+        events=counts["event"],
+        expenses=counts["expense"],
+        locations_created=locations.created,
+        envelopes_created=envelopes_created,
+    )
+
+
+def _export_rows(db: Session, trip_id: int) -> Iterator[dict]:
+    """Yield flat records for a trip, reading each table through a server-side cursor."""
+    stream = {"stream_results": True, "yield_per": EXPORT_BATCH_SIZE}
+
+    destinations = (
+        select(TripDestination.sort_order, Location.name, Location.type, Location.address, Location.latitude, Location.longitude)
+        .join(Location, Location.id == TripDestination.location_id)
+        .where(TripDestination.trip_id == trip_id)
+        .order_by(TripDestination.sort_order)
+        .execution_options(**stream)
+    )
+    for row in db.execute(destinations):
+        yield {
+            "kind": "destination",
+            "sort_order": row.sort_order,
+            "location_name": row.name,
+            "location_type": row.type,
+            "location_address": row.address,
+            "latitude": row.latitude,
+            "longitude": row.longitude,
+        }
+
+    events = (
+        select(Event, Location.name, Location.type, Location.address, Location.latitude, Location.longitude)
+        .outerjoin(Location, Location.id == Event.location_id)
+        .where(Event.trip_id == trip_id)
+        .order_by(Event.date, Event.start_time, Event.id)
+        .execution_options(**stream)
+    )
+    for evt, name, ltype, address, lat, lon in db.execute(events):
+        yield {
+            "kind": "event",
+            "date": evt.date.isoformat(),
+            "start_time": evt.start_time.isoformat() if evt.start_time else None,
+            "end_time": evt.end_time.isoformat() if evt.end_time else None,
+            "title": evt.title,
+            "type": evt.type,
+            "cost": evt.cost,
+            "notes": evt.notes,
+            "category_type": evt.category_type,
+            "is_refundable": evt.is_refundable,
+            "reservation_link": evt.reservation_link,
+            "location_name": name,
+            "location_type": ltype,
+            "location_address": address,
+            "latitude": lat,
+            "longitude": lon,
+        }
+        db.expunge(evt)
+
+    expenses = (
+        select(Expense.description, Expense.amount, Expense.currency, Expense.spent_at_date, BudgetEnvelope.category)
+        .outerjoin(BudgetEnvelope, BudgetEnvelope.id == Expense.envelope_id)
+        .where(Expense.trip_id == trip_id)
+        .order_by(Expense.spent_at_date, Expense.id)
+        .execution_options(**stream)
+    )
+    for row in db.execute(expenses):
+        yield {
+            "kind": "expense",
+            "description": row.description,
+            "amount": row.amount,
+            "currency": row.currency,
+            "spent_at_date": row.spent_at_date.isoformat(),
+            "envelope": row.category,
+        }
+
+
+def stream_export_json(db: Session, trip_id: int) -> Iterator[str]:
+    """Yield a JSON array with one record per line."""
+    yield "[\n"
+    first = True
+    for record in _export_rows(db, trip_id):
+        compact = {key: value for key, value in record.items() if value is not None}
+        yield ("" if first else ",\n") + json.dumps(compact)
+        first = False
+    yield "\n]\n"
+
+
+def stream_export_csv(db: Session, trip_id: int) -> Iterator[str]:
+    """Yield CSV text row by row using the shared record header."""
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=RECORD_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    for record in _export_rows(db, trip_id):
+        writer.writerow(record)
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    yield out.getvalue()
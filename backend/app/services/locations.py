@@ -0,0 +1,201 @@
+"""Deduplicated location registry with background geocoding."""
+
+from __future__ import annotations
+
+import asyncio
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models import Event, Location, TripDestination
+from app.services.geo import geohash_or_none
+from app.services.revisions import bump_trip_revision
+from app.services.weather_client import geocode_city
+
+GEOCODE_CONCURRENCY = 5
+GEOCODE_BATCH_SIZE = 50
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """Case-, accent- and punctuation-insensitive form used for matching places."""
+    if not value:
+        return ""
+    decomposed = unicodedata.normalize("NFKD", value)
+    stripped = "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", stripped.lower()).strip()
+
+
+def location_key(name: str, address: Optional[str]) -> str:
+    return f"{normalize_text(name)}|{normalize_text(address)}"
+
+
+def set_coordinates(location: Location, latitude: float, longitude: float) -> None:
+    """Set a location's coordinates, keeping its geohash in step for proximity search."""
+    location.latitude, location.longitude = latitude, longitude
+    location.geohash = geohash_or_none(latitude, longitude)
+
+
+def bump_trips_using_locations(db: Session, location_ids: Iterable[int]) -> None:
+    """Bump every trip whose destinations or events point at these locations.
+
+    Locations are shared across trips, so a coordinate change must invalidate all of their cached views.
+    """
+    ids = list(location_ids)
+    if not ids:
+        return
+    touched = set()
+    for model in (TripDestination, Event):
+        touched.update(db.scalars(select(model.trip_id).where(model.location_id.in_(ids)).distinct()))
+    bump_trip_revision(db, touched)
+
+
+def resolve_location(
+    db: Session,
+    name: str,
+    type: str,
+    address: Optional[str] = None,
+    latitude: Optional[float] = None,
+    longitude: Optional[float] = None,
+) -> Tuple[Location, bool]:
+    """Return the registry row for a place, creating it if needed. The flag is True when created."""
+    key = location_key(name, address)
+    location = db.query(Location).filter(Location.normalized_key == key).first()
+    if location:
+        if location.latitude is None and latitude is not None and longitude is not None:
+            set_coordinates(location, latitude, longitude)
+            bump_trips_using_locations(db, [location.id])
+        return location, False
+
+    location = Location(
+        name=name.strip(),
+        type=type,
+        address=address,
+        latitude=latitude,
+        longitude=longitude,
+        geohash=geohash_or_none(latitude, longitude),
+        normalized_key=key,
+    )
+    try:
+        with db.begin_nested():
+            db.add(location)
+    except IntegrityError:
+        # A concurrent request registered the same place first; use theirs.
+        return db.query(Location).filter(Location.normalized_key == key).one(), False
+    return location, True
+
+
+def _location_ids(db: Session, keys: List[str]) -> Dict[str, int]:
+    rows = db.execute(select(Location.normalized_key, Location.id).where(Location.normalized_key.in_(keys)))
+    return dict(rows.all())
+
+
+def resolve_location_ids(db: Session, places: Dict[str, dict]) -> Tuple[Dict[str, int], List[str]]:
+    """Bulk variant of resolve_location for `{location_key: column values}`.
+
+    One lookup through the unique index, one batched insert for the misses. Keys a
+    concurrent writer registered in between are skipped by the insert and re-selected.
+    Returns the key -> id map and the keys of the rows that were created.
+    """
+    ids: Dict[str, int] = {}
+    if not places:
+        return ids, []
+    ids.update(_location_ids(db, list(places)))
+
+    missing = [key for key in places if key not in ids]
+    if not missing:
+        return ids, []
+    dialect = db.get_bind().dialect.name
+    stmt = (postgresql if dialect == "postgresql" else sqlite).insert(Location)
+    created = dict(
+        db.execute(
+            stmt.on_conflict_do_nothing(index_elements=[Location.normalized_key]).returning(
+                Location.normalized_key, Location.id
+            ),
+            [
+                {
+                    **places[key],
+                    "normalized_key": key,
+                    "geohash": geohash_or_none(places[key].get("latitude"), places[key].get("longitude")),
+                }
+                for key in missing
+            ],
+        ).all()
+    )
+    ids.update(created)
+    lost = [key for key in missing if key not in created]
+    if lost:
+        ids.update(_location_ids(db, lost))
+    return ids, [key for key in missing if key in created]
+
+
+async def _geocode_one(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, name: str, address: Optional[str]):
+    async with semaphore:
+        coords = await geocode_city(name, client)
+        if coords is None and address:
+            coords = await geocode_city(address, client)
+        return coords
+
+
+def _ungeocoded(location_ids: List[int]) -> List[tuple]:
+    """(id, name, address) of the given locations that still lack coordinates."""
+    from app.db import SessionLocal  # local import: app.db imports the services package
+
+    db = SessionLocal()
+    try:
+        return db.execute(
+            select(Location.id, Location.name, Location.address).where(
+                Location.id.in_(location_ids), Location.latitude.is_(None)
+            )
+        ).all()
+    finally:
+        db.close()
+
+
+def _save_coordinates(coords: Dict[int, tuple]) -> int:
+    """Store geocoded coordinates and bump the trips using them, in one transaction; returns the rows set."""
+    from app.db import SessionLocal
+
+    db = SessionLocal()
+    try:
+        locations = db.query(Location).filter(Location.id.in_(list(coords)), Location.latitude.is_(None)).all()
+        for location in locations:
+            set_coordinates(location, *coords[location.id])
+        bump_trips_using_locations(db, [location.id for location in locations])
+        db.commit()
+        return len(locations)
+    finally:
+        db.close()
+
+
+async def geocode_locations(location_ids: Iterable[int]) -> int:
+    """Fill in coordinates for the given locations, a batch at a time with bounded concurrency.
+
+    Only the HTTP lookups run on the event loop; each batch's read and write happen in
+    the threadpool with their own session. Commits after each batch, bumping the revision
+    of every trip that uses a geocoded location. Returns the number of locations geocoded.
+    """
+    ids = list(location_ids)
+    updated = 0
+    semaphore = asyncio.Semaphore(GEOCODE_CONCURRENCY)
+    async with httpx.AsyncClient(timeout=10) as client:
+        for offset in range(0, len(ids), GEOCODE_BATCH_SIZE):
+            batch = await run_in_threadpool(_ungeocoded, ids[offset : offset + GEOCODE_BATCH_SIZE])
+            results = await asyncio.gather(*(_geocode_one(client, semaphore, row.name, row.address) for row in batch))
+            coords = {row.id: found for row, found in zip(batch, results) if found}
+            if coords:
+                updated += await run_in_threadpool(_save_coordinates, coords)
+    return updated
+
+
+async def geocode_in_background(location_ids: List[int]) -> None:
+    """BackgroundTasks entry point: runs after the response; database work stays off the event loop."""
+    await geocode_locations(location_ids)
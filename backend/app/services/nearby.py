@@ -0,0 +1,52 @@
+"""Proximity search over the location registry using geohash prefix ranges."""
+
+from __future__ import annotations
+
+from typing import List, Optional
+
+import numpy as np
+from sqlalchemy import and_, or_, select
+from sqlalchemy.orm import Session
+
+from app.models import Location
+from app.schemas import LocationRead, NearbyLocation
+from app.services.geo import geohash_cover, geohash_upper_bound, haversine_km
+
+
+def nearby_locations(
+    db: Session,
+    lat: float,
+    lon: float,
+    radius_km: float,
+    type: Optional[str] = None,
+    limit: int = 20,
+    exclude_id: Optional[int] = None,
+) -> List[NearbyLocation]:
+    """Locations within `radius_km` of a point, nearest first.
+
+    Candidates come from a few index range scans over the covering geohash cells;
+    only those are distance-checked.
+    """
+    ranges = []
+    for prefix in geohash_cover(lat, lon, radius_km):
+        upper = geohash_upper_bound(prefix)
+        lower_bound = Location.geohash >= prefix
+        ranges.append(and_(lower_bound, Location.geohash < upper) if upper else lower_bound)
+
+    stmt = select(Location).where(or_(*ranges))
+    if type:
+        stmt = stmt.where(Location.type == type)
+    if exclude_id is not None:
+        stmt = stmt.where(Location.id != exclude_id)
+    candidates = db.scalars(stmt).all()
+    if not candidates:
+        return []
+
+    distances = haversine_km(
+        lat, lon, [loc.latitude for loc in candidates], [loc.longitude for loc in candidates]
+    )
+    order = [i for i in np.argsort(distances, kind="stable") if distances[i] <= radius_km][:limit]
+    return [
+        NearbyLocation(**LocationRead.model_validate(candidates[i]).model_dump(), distance_km=round(float(distances[i]), 3))
+        for i in order
+    ]
@@ -0,0 +1,34 @@
+"""Opaque keyset-pagination cursors."""
+
+from __future__ import annotations
+
+import base64
+import json
+from datetime import date, time
+from typing import Any, List
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+
+def encode_cursor(*values: Any) -> str:
+    """Encode the sort key of the last row returned into an opaque, URL-safe token."""
+    raw = json.dumps([_plain(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> List[Any]:
+    """Inverse of encode_cursor; raises ValueError for anything malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
@@ -0,0 +1,99 @@
+"""Per-trip revision counters and conditional-request helpers."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Hashable, Iterable, Optional, Set
+
+from fastapi import Request, Response, status
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.models import Trip
+
+
+def bump_trip_revision(db: Session, trip_ids: int | Iterable[int]) -> None:
+    """Increment the revision of one or more trips inside the current transaction.
+
+    Writes issued as bulk/Core statements bypass the flush listener below, so
+    callers performing them must bump the revision explicitly.
+    """
+    ids = {trip_ids} if isinstance(trip_ids, int) else set(trip_ids)
+    ids.discard(None)
+    if not ids:
+        return
+    db.connection().execute(
+        update(Trip).where(Trip.id.in_(ids)).values(revision=Trip.revision + 1)
+    )
+
+
+def _touched_trip_ids(session: Session) -> Set[int]:
+    trip_ids: Set[int] = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Trip):
+            # New trips start at revision 0; deleted trips take their revision with them.
+            if obj in session.dirty and session.is_modified(obj):
+                trip_ids.add(obj.id)
+            continue
+        trip_id = getattr(obj, "trip_id", None)
+        if trip_id is not None and (obj not in session.dirty or session.is_modified(obj)):
+            trip_ids.add(trip_id)
+    return trip_ids
+
+
+def bump_revisions_on_flush(session: Session, flush_context, instances) -> None:
+    """`before_flush` hook: bump the revision of every trip whose rows are being written."""
+    bump_trip_revision(session, _touched_trip_ids(session))
+
+
+def trip_etag(trip: Trip, *parts: object) -> str:
+    """Weak ETag for a trip-scoped representation at the trip's current revision."""
+    suffix = "".join(f"-{part}" for part in parts if part is not None)
+    return f'W/"trip-{trip.id}-r{trip.revision or 0}{suffix}"'
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: ignore the W/ prefix on both sides.
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def not_modified(request: Request, response: Response, etag: str) -> Optional[Response]:
+    """Attach the ETag to the response and return a 304 if the client already has it."""
+    response.headers["ETag"] = etag
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    return None
+
+
+class RevisionCache:
+    """Small LRU for derived per-trip results, keyed by the trip revision they were computed at.
+
+    A write bumps the revision, so stale entries simply stop being hit and age out.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Any]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, trip: Trip, *key: Hashable) -> Optional[Any]:
+        full_key = (trip.id, trip.revision or 0, *key)
+        with self._lock:
+            value = self._entries.get(full_key)
+            if value is not None:
+                self._entries.move_to_end(full_key)
+            return value
+
+    def put(self, trip: Trip, *key: Hashable, value: Any) -> None:
+        full_key = (trip.id, trip.revision or 0, *key)
+        with self._lock:
+            self._entries[full_key] = value
+            self._entries.move_to_end(full_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
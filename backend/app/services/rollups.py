@@ -0,0 +1,462 @@
+"""Per-trip, per-envelope budget rollups kept in step with the ledger and the itinerary.
+
+`budget_rollups` holds one row per (trip, envelope) with additive totals (see MEASURES)
+and the latest spend date; envelope_key 0 collects uncategorized expenses and events.
+Expense totals come from the expense ledger; committed/paid/refundable amounts come from
+events' planned costs and the expenses paid against them (Event.paid_amount).
+
+ORM writes are folded in by the flush hooks below. Bulk/Core writes must call
+`apply_expense_rows` / `apply_event_rows`, or build a `RollupDelta` (see
+`add_event_contributions`) and apply it themselves.
+"""
+
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import bindparam, case, delete, func, insert, inspect, literal, null, select, tuple_, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.models import BudgetEnvelope, BudgetRollup, Event, Expense
+
+UNCATEGORIZED_KEY = 0
+PENDING_KEY = "rollup_pending"
+# Float sums drift in the last bits; differences below this are not inconsistencies.
+TOLERANCE = 1e-6
+
+# Additive rollup columns fed by the expense ledger, and how each aggregates from it.
+EXPENSE_MEASURES = {
+    "total_amount": func.sum(Expense.amount),
+    "expense_count": func.count(),
+    "total_converted": func.coalesce(func.sum(Expense.amount_converted), 0.0),
+    "unconverted_count": func.sum(case((Expense.amount_converted.is_(None), 1), else_=0)),
+}
+# Additive rollup columns fed by events' planned costs (see event_measures).
+EVENT_MEASURES = ("committed_amount", "paid_amount", "refundable_amount")
+MEASURES = (*EXPENSE_MEASURES, *EVENT_MEASURES)
+
+RollupKey = Tuple[int, int]
+
+
+def envelope_key(envelope_id: Optional[int]) -> int:
+    return envelope_id if envelope_id is not None else UNCATEGORIZED_KEY
+
+
+def expense_measures(amount: float, amount_converted: Optional[float]) -> Dict[str, float]:
+    """One expense's contribution to each measure."""
+    return {
+        "total_amount": amount,
+        "expense_count": 1,
+        "total_converted": amount_converted or 0.0,
+        "unconverted_count": 1 if amount_converted is None else 0,
+    }
+
+
+def event_measures(cost: Optional[float], paid_amount: Optional[float], is_refundable: bool) -> Dict[str, float]:
+    """One event's contribution: its cost, the part of it already paid, and the cost if refundable."""
+    cost = cost or 0.0
+    return {
+        "committed_amount": cost,
+        "paid_amount": min(paid_amount or 0.0, cost),
+        "refundable_amount": cost if is_refundable else 0.0,
+    }
+
+
+class RollupDelta:
+    """Accumulated rollup changes, applied with one upsert per touched (trip, envelope)."""
+
+    def __init__(self) -> None:
+        self.totals: Dict[RollupKey, Dict[str, float]] = defaultdict(lambda: dict.fromkeys(MEASURES, 0))
+        self.last_dates: Dict[RollupKey, date] = {}
+        self.stale_dates: Set[RollupKey] = set()
+        self.dropped: Dict[RollupKey, RollupKey] = {}
+
+    def __bool__(self) -> bool:
+        return bool(self.totals or self.stale_dates or self.dropped)
+
+    def add(self, trip_id: int, envelope_id: Optional[int], measures: Dict[str, float], spent_at_date: Optional[date] = None) -> None:
+        key = (trip_id, envelope_key(envelope_id))
+        entry = self.totals[key]
+        for name, value in measures.items():
+            entry[name] += value or 0
+        if spent_at_date is not None and (key not in self.last_dates or spent_at_date > self.last_dates[key]):
+            self.last_dates[key] = spent_at_date
+
+    def remove(self, trip_id: int, envelope_id: Optional[int], measures: Dict[str, float]) -> None:
+        self.add(trip_id, envelope_id, {name: -(value or 0) for name, value in measures.items()})
+        self.stale_dates.add((trip_id, envelope_key(envelope_id)))
+
+    def change(self, trip_id: int, envelope_id: Optional[int], old: Dict[str, float], new: Dict[str, float]) -> None:
+        """Replace measures within one envelope; unlike remove(), leaves the spend date alone."""
+        self.add(trip_id, envelope_id, {name: new[name] - old[name] for name in new})
+
+    def drop_envelope(self, trip_id: int, envelope_id: int) -> None:
+        """The envelope is being deleted: its expenses and events become uncategorized (ON DELETE SET NULL)."""
+        self.dropped[(trip_id, envelope_id)] = (trip_id, UNCATEGORIZED_KEY)
+
+    def apply(self, db: Session) -> None:
+        conn = db.connection()
+        if self.dropped:
+            dropped_keys = list(self.dropped)
+            moved = conn.execute(
+                select(BudgetRollup).where(tuple_(BudgetRollup.trip_id, BudgetRollup.envelope_key).in_(dropped_keys))
+            ).all()
+            for row in moved:
+                self.add(row.trip_id, None, {name: getattr(row, name) for name in MEASURES}, row.last_spent_date)
+            # Pending changes against a dropped envelope land in the uncategorized bucket too.
+            for key, target in self.dropped.items():
+                pending = self.totals.pop(key, None)
+                if pending:
+                    self.add(target[0], None, pending, self.last_dates.pop(key, None))
+                if key in self.stale_dates:
+                    self.stale_dates.discard(key)
+                    self.stale_dates.add(target)
+            conn.execute(delete(BudgetRollup).where(tuple_(BudgetRollup.trip_id, BudgetRollup.envelope_key).in_(dropped_keys)))
+
+        rows = [
+            {"trip_id": key[0], "envelope_key": key[1], **measures, "last_spent_date": self.last_dates.get(key)}
+            for key, measures in self.totals.items()
+            if any(measures.values()) or key in self.last_dates
+        ]
+        if rows:
+            conn.execute(_upsert(db), rows)
+        if self.stale_dates:
+            _refresh_last_spent(db, self.stale_dates)
+
+
+def _upsert(db: Session):
+    # app.db only starts on PostgreSQL or SQLite, the two dialects with ON CONFLICT upserts here.
+    dialect = db.get_bind().dialect.name
+    stmt = (postgresql if dialect == "postgresql" else sqlite).insert(BudgetRollup)
+    current, incoming = BudgetRollup.__table__.c, stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[current.trip_id, current.envelope_key],
+        set_={
+            **{name: current[name] + incoming[name] for name in MEASURES},
+            "last_spent_date": case(
+                (incoming.last_spent_date.is_(None), current.last_spent_date),
+                (current.last_spent_date.is_(None), incoming.last_spent_date),
+                (incoming.last_spent_date > current.last_spent_date, incoming.last_spent_date),
+                else_=current.last_spent_date,
+            ),
+        },
+    )
+
+
+def _refresh_last_spent(db: Session, keys: Iterable[RollupKey]) -> None:
+    """Recompute last_spent_date for keys that lost expenses (a MAX can't be decremented)."""
+    latest = (
+        select(func.max(Expense.spent_at_date))
+        .where(
+            Expense.trip_id == BudgetRollup.trip_id,
+            func.coalesce(Expense.envelope_id, UNCATEGORIZED_KEY) == BudgetRollup.envelope_key,
+        )
+        .scalar_subquery()
+    )
+    db.connection().execute(
+        update(BudgetRollup)
+        .where(tuple_(BudgetRollup.trip_id, BudgetRollup.envelope_key).in_(list(keys)))
+        .values(last_spent_date=latest)
+    )
+
+
+def apply_expense_rows(db: Session, rows: Iterable[dict]) -> None:
+    """Fold freshly bulk-inserted expense rows (dicts of Expense columns) into the rollups."""
+    delta = RollupDelta()
+    for row in rows:
+        delta.add(
+            row["trip_id"],
+            row.get("envelope_id"),
+            expense_measures(row["amount"], row.get("amount_converted")),
+            row["spent_at_date"],
+        )
+    if delta:
+        delta.apply(db)
+
+
+def apply_event_rows(db: Session, rows: Iterable[dict]) -> None:
+    """Fold freshly bulk-inserted event rows (dicts of Event columns) into the rollups."""
+    delta = RollupDelta()
+    for row in rows:
+        if row.get("cost"):
+            delta.add(
+                row["trip_id"],
+                row.get("envelope_id"),
+                event_measures(row["cost"], row.get("paid_amount"), row.get("is_refundable", False)),
+            )
+    if delta:
+        delta.apply(db)
+
+
+def add_event_contributions(db: Session, delta: RollupDelta, event_ids: Iterable[int], sign: int = 1) -> None:
+    """Add (sign=1) or remove (sign=-1) the stored events' current contributions.
+
+    Bulk event writes call this with -1 before and +1 after the statement.
+    """
+    ids = list(event_ids)
+    if not ids:
+        return
+    rows = db.connection().execute(
+        select(Event.trip_id, Event.envelope_id, Event.cost, Event.paid_amount, Event.is_refundable).where(
+            Event.id.in_(ids), Event.cost.is_not(None)
+        )
+    )
+    zero = dict.fromkeys(EVENT_MEASURES, 0.0)
+    for row in rows:
+        measures = event_measures(row.cost, row.paid_amount, row.is_refundable)
+        if sign > 0:
+            delta.change(row.trip_id, row.envelope_id, zero, measures)
+        else:
+            delta.change(row.trip_id, row.envelope_id, measures, zero)
+
+
+def _apply_paid_changes(session: Session, delta: RollupDelta, paid_changes: Dict[int, float]) -> None:
+    """Move Event.paid_amount by the flushed expenses' amounts and fold the effect into `delta`."""
+    ids = [event_id for event_id, change in paid_changes.items() if change]
+    if not ids:
+        return
+    conn = session.connection()
+    rows = conn.execute(
+        select(Event.id, Event.trip_id, Event.envelope_id, Event.cost, Event.paid_amount, Event.is_refundable).where(
+            Event.id.in_(ids)
+        )
+    ).all()
+    if not rows:
+        return  # the events themselves were deleted
+    paid = {}
+    for row in rows:
+        paid[row.id] = (row.paid_amount or 0.0) + paid_changes[row.id]
+        delta.change(
+            row.trip_id,
+            row.envelope_id,
+            event_measures(row.cost, row.paid_amount, row.is_refundable),
+            event_measures(row.cost, paid[row.id], row.is_refundable),
+        )
+    conn.execute(
+        update(Event).where(Event.id == bindparam("event_id")).values(paid_amount=bindparam("paid")),
+        [{"event_id": event_id, "paid": value} for event_id, value in paid.items()],
+    )
+    # Keep already-loaded events in step without marking them dirty.
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Event) and obj.id in paid:
+            set_committed_value(obj, "paid_amount", paid[obj.id])
+
+
+def event_expense_delta(db: Session, event_ids: Iterable[int], skip_expense_ids: Iterable[int] = ()) -> RollupDelta:
+    """Removals for the expenses that ON DELETE CASCADE will take with these events. Call before deleting."""
+    delta = RollupDelta()
+    ids = list(event_ids)
+    if not ids:
+        return delta
+    stmt = (
+        select(Expense.trip_id, Expense.envelope_id, *(expr.label(name) for name, expr in EXPENSE_MEASURES.items()))
+        .where(Expense.event_id.in_(ids))
+        .group_by(Expense.trip_id, Expense.envelope_id)
+    )
+    skip = list(skip_expense_ids)
+    if skip:
+        stmt = stmt.where(Expense.id.not_in(skip))
+    for row in db.connection().execute(stmt):
+        delta.remove(row.trip_id, row.envelope_id, {name: getattr(row, name) for name in EXPENSE_MEASURES})
+    return delta
+
+
+def _previous(obj, key: str):
+    """Value of `key` as of the last flush, or raise LookupError if it was never loaded."""
+    history = inspect(obj).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    if not history.added:
+        return getattr(obj, key)
+    raise LookupError(key)
+
+
+def collect_cascades_on_flush(session: Session, flush_context, instances) -> None:
+    """`before_flush` hook: capture expenses that deleted events will cascade away, while they still exist."""
+    deleted_events = [obj.id for obj in session.deleted if isinstance(obj, Event)]
+    if deleted_events:
+        loaded = [obj.id for obj in session.deleted if isinstance(obj, Expense)]
+        session.info[PENDING_KEY] = event_expense_delta(session, deleted_events, loaded)
+    else:
+        session.info.pop(PENDING_KEY, None)
+
+
+_TRACKED = ("envelope_id", "amount", "amount_converted", "spent_at_date")
+_EVENT_TRACKED = ("envelope_id", "cost", "paid_amount", "is_refundable")
+
+
+def apply_rollup_changes_after_flush(session: Session, flush_context) -> None:
+    """`after_flush` hook: fold the flushed Expense/Event/BudgetEnvelope writes into the rollups.
+
+    Runs after the flush so foreign keys set through relationships are populated.
+    """
+    delta = session.info.pop(PENDING_KEY, None) or RollupDelta()
+    rebuild: Set[int] = set()
+    # Expense amounts moving onto or off an event, by event id.
+    paid_changes: Dict[int, float] = defaultdict(float)
+    for obj in session.new:
+        if isinstance(obj, Expense):
+            delta.add(obj.trip_id, obj.envelope_id, expense_measures(obj.amount, obj.amount_converted), obj.spent_at_date)
+            if obj.event_id is not None:
+                paid_changes[obj.event_id] += obj.amount_converted or 0.0
+        elif isinstance(obj, Event):
+            delta.add(obj.trip_id, obj.envelope_id, event_measures(obj.cost, obj.paid_amount, obj.is_refundable))
+    for obj in session.dirty:
+        if not session.is_modified(obj):
+            continue
+        if isinstance(obj, Expense):
+            try:
+                old = tuple(_previous(obj, key) for key in (*_TRACKED, "event_id"))
+            except LookupError:
+                rebuild.add(obj.trip_id)
+                continue
+            if old[:-1] != tuple(getattr(obj, key) for key in _TRACKED):
+                delta.remove(obj.trip_id, old[0], expense_measures(old[1], old[2]))
+                delta.add(obj.trip_id, obj.envelope_id, expense_measures(obj.amount, obj.amount_converted), obj.spent_at_date)
+            if (old[-1], old[2]) != (obj.event_id, obj.amount_converted):
+                if old[-1] is not None:
+                    paid_changes[old[-1]] -= old[2] or 0.0
+                if obj.event_id is not None:
+                    paid_changes[obj.event_id] += obj.amount_converted or 0.0
+        elif isinstance(obj, Event):
+            try:
+                old = {key: _previous(obj, key) for key in _EVENT_TRACKED}
+            except LookupError:
+                rebuild.add(obj.trip_id)
+                continue
+            if any(old[key] != getattr(obj, key) for key in _EVENT_TRACKED):
+                delta.remove(obj.trip_id, old["envelope_id"], event_measures(old["cost"], old["paid_amount"], old["is_refundable"]))
+                delta.add(obj.trip_id, obj.envelope_id, event_measures(obj.cost, obj.paid_amount, obj.is_refundable))
+    for obj in session.deleted:
+        if isinstance(obj, Expense):
+            old = {key: _previous(obj, key) for key in (*_TRACKED, "event_id")}
+            delta.remove(obj.trip_id, old["envelope_id"], expense_measures(old["amount"], old["amount_converted"]))
+            if old["event_id"] is not None:
+                paid_changes[old["event_id"]] -= old["amount_converted"] or 0.0
+        elif isinstance(obj, Event):
+            old = {key: _previous(obj, key) for key in _EVENT_TRACKED}
+            delta.remove(obj.trip_id, old["envelope_id"], event_measures(old["cost"], old["paid_amount"], old["is_refundable"]))
+        elif isinstance(obj, BudgetEnvelope):
+            delta.drop_envelope(obj.trip_id, obj.id)
+
+    _apply_paid_changes(session, delta, paid_changes)
+    if delta:
+        delta.apply(session)
+    if rebuild:
+        rebuild_rollups(session, rebuild)
+
+
+def _event_paid_select():
+    """Amount paid against each event, from the expenses linked to it."""
+    return select(
+        Expense.event_id, func.coalesce(func.sum(Expense.amount_converted), 0.0).label("paid")
+    ).where(Expense.event_id.is_not(None)).group_by(Expense.event_id)
+
+
+def _aggregate_select(trip_ids: Optional[Iterable[int]] = None):
+    """Rollup rows recomputed from scratch: expense aggregates plus event aggregates per key."""
+    ids = None if trip_ids is None else list(trip_ids)
+    expense_key = func.coalesce(Expense.envelope_id, UNCATEGORIZED_KEY)
+    expenses = select(
+        Expense.trip_id.label("trip_id"),
+        expense_key.label("envelope_key"),
+        *(expr.label(name) for name, expr in EXPENSE_MEASURES.items()),
+        *(literal(0.0).label(name) for name in EVENT_MEASURES),
+        func.max(Expense.spent_at_date).label("last_spent_date"),
+    ).group_by(Expense.trip_id, expense_key)
+
+    paid_by_event = _event_paid_select().subquery()
+    cost = func.coalesce(Event.cost, 0.0)
+    paid = func.coalesce(paid_by_event.c.paid, 0.0)
+    event_key = func.coalesce(Event.envelope_id, UNCATEGORIZED_KEY)
+    events = (
+        select(
+            Event.trip_id,
+            event_key,
+            *(literal(0).label(name) for name in EXPENSE_MEASURES),
+            func.sum(cost).label("committed_amount"),
+            func.sum(case((paid < cost, paid), else_=cost)).label("paid_amount"),
+            func.sum(case((Event.is_refundable, cost), else_=0.0)).label("refundable_amount"),
+            null().label("last_spent_date"),
+        )
+        .outerjoin(paid_by_event, paid_by_event.c.event_id == Event.id)
+        .where(Event.cost.is_not(None))
+        .group_by(Event.trip_id, event_key)
+    )
+    if ids is not None:
+        expenses = expenses.where(Expense.trip_id.in_(ids))
+        events = events.where(Event.trip_id.in_(ids))
+
+    parts = union_all(expenses, events).subquery()
+    return select(
+        parts.c.trip_id,
+        parts.c.envelope_key,
+        *(func.sum(parts.c[name]).label(name) for name in MEASURES),
+        func.max(parts.c.last_spent_date).label("last_spent_date"),
+    ).group_by(parts.c.trip_id, parts.c.envelope_key)
+
+
+def refresh_event_paid(db: Session, trip_ids: Optional[Iterable[int]] = None) -> None:
+    """Recompute Event.paid_amount from the linked expenses with one correlated UPDATE."""
+    paid = (
+        select(func.coalesce(func.sum(Expense.amount_converted), 0.0))
+        .where(Expense.event_id == Event.id)
+        .scalar_subquery()
+    )
+    stmt = update(Event).values(paid_amount=paid)
+    if trip_ids is not None:
+        stmt = stmt.where(Event.trip_id.in_(list(trip_ids)))
+    db.connection().execute(stmt)
+
+
+def rebuild_rollups(db: Session, trip_ids: Optional[Iterable[int]] = None) -> None:
+    """Recompute rollups from the ledger and events (all trips when trip_ids is None).
+
+    Event.paid_amount is refreshed first, since the incremental path builds on it.
+    """
+    ids = None if trip_ids is None else list(trip_ids)
+    refresh_event_paid(db, ids)
+    clear = delete(BudgetRollup)
+    if ids is not None:
+        clear = clear.where(BudgetRollup.trip_id.in_(ids))
+    conn = db.connection()
+    conn.execute(clear)
+    conn.execute(
+        insert(BudgetRollup).from_select(
+            ["trip_id", "envelope_key", *MEASURES, "last_spent_date"], _aggregate_select(ids)
+        )
+    )
+
+
+def check_rollups(db: Session, trip_ids: Optional[Iterable[int]] = None) -> List[dict]:
+    """Compare stored rollups against a fresh aggregate of the ledger and events; one dict per mismatch."""
+    ids = None if trip_ids is None else list(trip_ids)
+    fields = [*MEASURES, "last_spent_date"]
+    empty = {**dict.fromkeys(MEASURES, 0), "last_spent_date": None}
+    expected = {
+        (row.trip_id, row.envelope_key): {name: getattr(row, name) for name in fields}
+        for row in db.execute(_aggregate_select(ids))
+    }
+    stored_stmt = select(BudgetRollup)
+    if ids is not None:
+        stored_stmt = stored_stmt.where(BudgetRollup.trip_id.in_(ids))
+    stored = {
+        (row.trip_id, row.envelope_key): {name: getattr(row, name) for name in fields}
+        for row in db.scalars(stored_stmt)
+    }
+
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        want, have = expected.get(key, empty), stored.get(key, empty)
+        drifted = want["last_spent_date"] != have["last_spent_date"] or any(
+            abs((want[name] or 0) - (have[name] or 0)) > TOLERANCE for name in MEASURES
+        )
+        if drifted:
+            mismatches.append({"trip_id": key[0], "envelope_key": key[1], "expected": want, "stored": have})
+    return mismatches
@@ -0,0 +1,89 @@
+"""Visiting-order optimization over destination coordinates."""
+
+from __future__ import annotations
+
+from typing import List, Optional
+
+import numpy as np
+
+from app.services.geo import haversine_matrix
+
+MAX_TWO_OPT_PASSES = 50
+
+
+def path_length(dist: np.ndarray, order: List[int]) -> float:
+    if len(order) < 2:
+        return 0.0
+    idx = np.asarray(order)
+    return float(dist[idx[:-1], idx[1:]].sum())
+
+
+def _nearest_neighbour(dist: np.ndarray, first: int, last: Optional[int]) -> List[int]:
+    n = dist.shape[0]
+    visited = np.zeros(n, dtype=bool)
+    visited[first] = True
+    if last is not None:
+        visited[last] = True
+    order = [first]
+    current = first
+    for _ in range(n - 1 - (last is not None and last != first)):
+        candidates = np.where(visited, np.inf, dist[current])
+        current = int(np.argmin(candidates))
+        visited[current] = True
+        order.append(current)
+    if last is not None and last != first:
+        order.append(last)
+    return order
+
+
+def _two_opt(dist: np.ndarray, order: List[int], fix_first: bool, fix_last: bool) -> List[int]:
+    """Improve an open path by segment reversals; each i scans all j in one vectorized step."""
+    path = np.asarray(order)
+    n = len(path)
+    lo = 1 if fix_first else 0
+    hi = n - 2 if fix_last else n - 1
+    for _ in range(MAX_TWO_OPT_PASSES):
+        improved = False
+        for i in range(lo, hi):
+            js = np.arange(i + 1, hi + 1)
+            if i > 0:
+                delta = dist[path[i - 1], path[js]] - dist[path[i - 1], path[i]]
+            else:
+                delta = np.zeros(len(js))
+            inner = js < n - 1
+            nxt = path[np.minimum(js + 1, n - 1)]
+            delta = delta + np.where(inner, dist[path[i], nxt] - dist[path[js], nxt], 0.0)
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                j = int(js[best])
+                path[i : j + 1] = path[i : j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return path.tolist()
+
+
+def optimize_order(lat, lon, start: Optional[int] = None, end: Optional[int] = None) -> List[int]:
+    """Near-optimal open visiting order: nearest-neighbour construction refined by 2-opt.
+
+    `start`/`end` are optional fixed endpoint indices and must differ. Returns indices into the inputs.
+    """
+    n = len(lat)
+    if start is not None and start == end and n > 1:
+        raise ValueError("start and end must be different stops")
+    if n <= 2:
+        order = list(range(n))
+        if start is not None and order and order[0] != start:
+            order.reverse()
+        if end is not None and order and order[-1] != end:
+            order.reverse()
+        return order
+    dist = haversine_matrix(lat, lon)
+    # Without a fixed start, every node except the fixed end is a candidate seed; keep the shortest tour.
+    seeds = [start] if start is not None else [node for node in range(n) if node != end]
+    order = _nearest_neighbour(dist, seeds[0], end)
+    for seed in seeds[1:]:
+        candidate = _nearest_neighbour(dist, seed, end)
+        if path_length(dist, candidate) < path_length(dist, order):
+            order = candidate
+    return _two_opt(dist, order, fix_first=start is not None, fix_last=end is not None)
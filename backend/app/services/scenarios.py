@@ -0,0 +1,152 @@
+"""Budget what-if scenarios, evaluated side by side without touching the database.
+
+The trip's current position (spent, outstanding commitments and daily spend pace per
+category) is read once from the rollups and the cached forecast; every scenario is
+then a row in a scenarios x categories matrix, so dozens cost a few array operations.
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.models import BudgetEnvelope, Trip
+from app.schemas import BudgetScenario, BudgetScenarioResponse, ScenarioEnvelope, ScenarioResult
+from app.services.analytics import segment_ratios
+from app.services.budget_summary import UNCATEGORIZED, envelope_rollups
+from app.services.budgeting import allocation_ratios
+from app.services.forecast import forecast_budget
+
+
+def _categories(envelopes, scenario_ratios: List[Optional[Dict[str, float]]]) -> List[str]:
+    """Column order: current envelope categories, then ones only a reallocation adds, then uncategorized."""
+    categories = list(dict.fromkeys(env.category for env in envelopes))
+    known = {category.lower() for category in categories}
+    for ratios in scenario_ratios:
+        for category in ratios or ():
+            if category.lower() not in known:
+                categories.append(category)
+                known.add(category.lower())
+    return categories + [UNCATEGORIZED]
+
+
+def evaluate_scenarios(
+    db: Session, trip: Trip, scenarios: List[BudgetScenario], today: Optional[date] = None
+) -> BudgetScenarioResponse:
+    """Planned vs projected spend per category for each scenario; read-only."""
+    today = today or date.today()
+    envelopes = db.execute(
+        select(BudgetEnvelope.id, BudgetEnvelope.category, BudgetEnvelope.planned_amount)
+        .where(BudgetEnvelope.trip_id == trip.id)
+        .order_by(BudgetEnvelope.id)
+    ).all()
+    rollups = envelope_rollups(db, trip.id)
+    forecast = forecast_budget(db, trip, today)
+    trip_days = (trip.end_date - trip.start_date).days + 1
+
+    # Reallocating scenarios get ratios like allocate_default_envelopes: benchmarks first, then the defaults.
+    ratio_cache: Dict[Tuple, Tuple[Dict[str, float], bool]] = {}
+    scenario_ratios: List[Optional[Dict[str, float]]] = []
+    benchmarked: List[bool] = []
+    for scenario in scenarios:
+        if not scenario.reallocate:
+            scenario_ratios.append(None)
+            benchmarked.append(False)
+            continue
+        key = (
+            scenario.trip_type or trip.trip_type,
+            scenario.price_sensitivity or trip.price_sensitivity,
+            max(trip_days + scenario.extra_days, 1),
+        )
+        if key not in ratio_cache:
+            ratios = segment_ratios(db, *key)
+            ratio_cache[key] = (ratios, True) if ratios else (allocation_ratios(key[1], key[0]), False)
+        scenario_ratios.append(ratio_cache[key][0])
+        benchmarked.append(ratio_cache[key][1])
+
+    categories = _categories(envelopes, scenario_ratios)
+    column = {category: index for index, category in enumerate(categories)}
+    by_name: Dict[str, int] = {}
+    for index, category in enumerate(categories):
+        by_name.setdefault(category.lower(), index)
+    uncategorized = column[UNCATEGORIZED]
+    size = len(categories)
+
+    # Current position per category.
+    planned = np.zeros(size)
+    spent = np.zeros(size)
+    committed = np.zeros(size)
+    outstanding = np.zeros(size)
+    burn = np.zeros(size)
+    envelope_column = {env.id: column[env.category] for env in envelopes}
+    for env in envelopes:
+        planned[column[env.category]] += env.planned_amount
+    for envelope_id, row in rollups.items():
+        index = envelope_column.get(envelope_id, uncategorized)
+        spent[index] += row.total_converted
+        committed[index] += row.committed_amount
+        outstanding[index] += max(row.committed_amount - row.paid_amount, 0.0)
+    for entry in forecast.envelopes:
+        burn[envelope_column.get(entry.envelope_id, uncategorized)] += entry.daily_burn_rate
+    # Before any spending history, assume the uncommitted part of the plan is spent evenly.
+    pace = burn if forecast.days_elapsed else np.maximum(planned - committed, 0.0) / trip_days
+
+    # One row per scenario.
+    count = len(scenarios)
+    totals = np.array([(trip.total_budget or 0.0) if s.total_budget is None else s.total_budget for s in scenarios])
+    extra_days = np.array([s.extra_days for s in scenarios])
+    future_days = np.maximum(trip_days - forecast.days_elapsed + extra_days, 0)
+    multipliers = np.ones((count, size))
+    ratios = np.zeros((count, size))
+    reallocated = np.zeros((count, size), dtype=bool)
+    for row, scenario in enumerate(scenarios):
+        for category, factor in scenario.spend_multipliers.items():
+            if category.lower() in by_name:
+                multipliers[row, by_name[category.lower()]] = factor
+        if benchmarked[row]:
+            reallocated[row, :] = True
+        for category, ratio in (scenario_ratios[row] or {}).items():
+            ratios[row, by_name[category.lower()]] = ratio
+            reallocated[row, by_name[category.lower()]] = True
+
+    # Like ensure_envelopes, a reallocation rewrites the categories its ratios cover, and with
+    # benchmark ratios plans every other category at zero.
+    scenario_planned = np.where(reallocated, totals[:, None] * ratios, planned[None, :])
+    projected = spent[None, :] + multipliers * (outstanding[None, :] + pace[None, :] * future_days[:, None])
+    remaining = scenario_planned - projected
+    over = (remaining < -1e-9) & (np.arange(size) != uncategorized)[None, :]
+    projected_totals = projected.sum(axis=1)
+
+    results = [
+        ScenarioResult(
+            name=scenario.name,
+            total_budget=round(float(totals[row]), 2),
+            trip_days=max(trip_days + scenario.extra_days, 1),
+            envelopes=[
+                ScenarioEnvelope(
+                    category=category,
+                    planned_amount=round(float(scenario_planned[row, index]), 2),
+                    projected_total=round(float(projected[row, index]), 2),
+                    remaining=round(float(remaining[row, index]), 2),
+                    over_budget=bool(over[row, index]),
+                )
+                for index, category in enumerate(categories)
+                if scenario_planned[row, index] or projected[row, index]
+            ],
+            projected_total=round(float(projected_totals[row]), 2),
+            remaining_total=round(float(totals[row] - projected_totals[row]), 2),
+            over_budget=bool(projected_totals[row] > totals[row] + 1e-9),
+        )
+        for row, scenario in enumerate(scenarios)
+    ]
+    return BudgetScenarioResponse(
+        as_of=today,
+        currency=trip.currency,
+        spent=round(float(spent.sum()), 2),
+        committed_outstanding=round(float(outstanding.sum()), 2),
+        scenarios=results,
+    )
@@ -0,0 +1,127 @@
+"""Ranked full-text search over the trips a user can access.
+
+Backed by the indexes from migration 0011: tsvector/GIN columns on Postgres and
+the FTS5 `search_index` table on SQLite.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.schemas import SearchHit
+
+# FTS5 rowid = source id * 4 + kind code.
+SEARCH_KINDS = ("event", "location", "trip", "envelope")
+
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+_ACCESS_CTES = """
+    accessible AS (
+        SELECT id AS trip_id FROM trips WHERE owner_id = :user_id
+        UNION
+        SELECT trip_id FROM trip_members WHERE user_id = :user_id
+    ),
+    location_refs AS (
+        SELECT location_id, trip_id FROM trip_destinations WHERE trip_id IN (SELECT trip_id FROM accessible)
+        UNION
+        SELECT location_id, trip_id FROM events
+        WHERE location_id IS NOT NULL AND trip_id IN (SELECT trip_id FROM accessible)
+    )
+"""
+
+_POSTGRES_SQL = text(
+    f"""
+    WITH {_ACCESS_CTES},
+    q AS (SELECT to_tsquery('english', :query) AS query),
+    hits AS (
+        SELECT 'trip' AS kind, t.id, t.id AS trip_id, t.name AS title, t.destination AS body,
+               ts_rank(t.search_vector, q.query) AS rank
+        FROM trips t, q
+        WHERE t.search_vector @@ q.query AND t.id IN (SELECT trip_id FROM accessible)
+        UNION ALL
+        SELECT 'event', e.id, e.trip_id, e.title, e.notes, ts_rank(e.search_vector, q.query)
+        FROM events e, q
+        WHERE e.search_vector @@ q.query AND e.trip_id IN (SELECT trip_id FROM accessible)
+        UNION ALL
+        SELECT 'envelope', b.id, b.trip_id, b.category, b.notes, ts_rank(b.search_vector, q.query)
+        FROM budget_envelopes b, q
+        WHERE b.search_vector @@ q.query AND b.trip_id IN (SELECT trip_id FROM accessible)
+        UNION ALL
+        SELECT 'location', l.id, (SELECT min(r.trip_id) FROM location_refs r WHERE r.location_id = l.id),
+               l.name, l.address, ts_rank(l.search_vector, q.query)
+        FROM locations l, q
+        WHERE l.search_vector @@ q.query AND l.id IN (SELECT location_id FROM location_refs)
+    ),
+    page AS (
+        SELECT * FROM hits ORDER BY rank DESC, kind, id LIMIT :limit OFFSET :offset
+    )
+    SELECT page.kind, page.id, page.trip_id, page.title,
+           ts_headline('english', coalesce(page.body, ''), q.query,
+                       'StartSel=<b>, StopSel=</b>, MaxFragments=1, MaxWords=12, MinWords=4') AS snippet,
+           page.rank
+    FROM page, q
+    ORDER BY page.rank DESC, page.kind, page.id
+    """
+)
+
+_SQLITE_SQL = text(
+    f"""
+    WITH {_ACCESS_CTES}
+    SELECT s.rowid % 4 AS kind_code,
+           s.rowid / 4 AS id,
+           CASE WHEN s.rowid % 4 = 1
+                THEN (SELECT min(r.trip_id) FROM location_refs r WHERE r.location_id = s.rowid / 4)
+                ELSE s.trip_id END AS trip_id,
+           s.title,
+           snippet(search_index, 2, '<b>', '</b>', '…', 12) AS snippet,
+           -bm25(search_index, 0.0, 2.0, 1.0) AS rank
+    FROM search_index s
+    WHERE search_index MATCH :query
+      AND (
+        (s.rowid % 4 != 1 AND s.trip_id IN (SELECT trip_id FROM accessible))
+        OR (s.rowid % 4 = 1 AND s.rowid / 4 IN (SELECT location_id FROM location_refs))
+      )
+    ORDER BY rank DESC, s.rowid
+    LIMIT :limit OFFSET :offset
+    """
+)
+
+
+def _terms(query: str) -> List[str]:
+    return _WORD.findall(query.lower())
+
+
+def search(db: Session, user_id: int, query: str, limit: int = 20, offset: int = 0) -> List[SearchHit]:
+    """All terms must match; the last one also matches as a prefix so results follow typing."""
+    terms = _terms(query)
+    if not terms:
+        return []
+    params = {"user_id": user_id, "limit": limit, "offset": offset}
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        params["query"] = " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+        rows = db.execute(_POSTGRES_SQL, params).all()
+        return [
+            SearchHit(kind=row.kind, id=row.id, trip_id=row.trip_id, title=row.title, snippet=row.snippet or None, rank=row.rank)
+            for row in rows
+        ]
+
+    # SQLite: app.db refuses to start on any other backend.
+    params["query"] = " ".join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+    rows = db.execute(_SQLITE_SQL, params).all()
+    return [
+        SearchHit(
+            kind=SEARCH_KINDS[row.kind_code],
+            id=row.id,
+            trip_id=row.trip_id,
+            title=row.title,
+            snippet=row.snippet or None,
+            rank=row.rank,
+        )
+        for row in rows
+    ]
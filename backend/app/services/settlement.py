@@ -0,0 +1,111 @@
+"""Group balances and minimal-transfer settle-up for shared trip expenses."""
+
+from __future__ import annotations
+
+import heapq
+from typing import Dict, List, Set
+
+from sqlalchemy import Integer, exists, func, literal, select, union_all
+from sqlalchemy.orm import Session
+
+from app.models import Expense, ExpenseShare, Trip, TripMember, User
+from app.schemas import SettlementBalance, SettlementResponse, SettlementTransfer
+
+
+def trip_participant_ids(db: Session, trip: Trip) -> Set[int]:
+    """The owner plus every member: who may pay for, and share in, the trip's expenses."""
+    members = db.scalars(select(TripMember.user_id).where(TripMember.trip_id == trip.id))
+    return {trip.owner_id, *members}
+
+
+def _paid_and_owed(db: Session, trip_id: int) -> Dict[object, tuple]:
+    """{user_id: (paid, owed)} in trip currency from one grouped query.
+
+    The None key holds expenses without shares, which split evenly across participants.
+    Only expenses with a payer and a converted amount take part.
+    """
+    amount = Expense.amount_converted
+    settled = (Expense.trip_id == trip_id, Expense.paid_by_user_id.is_not(None), amount.is_not(None))
+    weights = (
+        select(ExpenseShare.expense_id, func.sum(ExpenseShare.weight).label("total"))
+        .join(Expense, Expense.id == ExpenseShare.expense_id)
+        .where(Expense.trip_id == trip_id)
+        .group_by(ExpenseShare.expense_id)
+        .subquery()
+    )
+    paid = select(Expense.paid_by_user_id.label("user_id"), amount.label("paid"), literal(0.0).label("owed")).where(
+        *settled
+    )
+    shared = (
+        select(ExpenseShare.user_id, literal(0.0), amount * ExpenseShare.weight / weights.c.total)
+        .join(Expense, Expense.id == ExpenseShare.expense_id)
+        .join(weights, weights.c.expense_id == ExpenseShare.expense_id)
+        .where(*settled)
+    )
+    even = select(literal(None, type_=Integer), literal(0.0), amount).where(
+        *settled, ~exists().where(ExpenseShare.expense_id == Expense.id)
+    )
+    entries = union_all(paid, shared, even).subquery()
+    rows = db.execute(
+        select(entries.c.user_id, func.sum(entries.c.paid), func.sum(entries.c.owed)).group_by(entries.c.user_id)
+    )
+    return {user_id: (paid or 0.0, owed or 0.0) for user_id, paid, owed in rows}
+
+
+def minimal_transfers(net_cents: Dict[int, int]) -> List[SettlementTransfer]:
+    """Settle balances (in cents, summing to zero) with at most n - 1 transfers.
+
+    Greedy: the largest debtor pays the largest creditor; both stay in max-heaps, so O(n log n).
+    """
+    creditors = [(-cents, user_id) for user_id, cents in net_cents.items() if cents > 0]
+    debtors = [(cents, user_id) for user_id, cents in net_cents.items() if cents < 0]
+    heapq.heapify(creditors)
+    heapq.heapify(debtors)
+    transfers: List[SettlementTransfer] = []
+    while creditors and debtors:
+        credit, creditor = heapq.heappop(creditors)
+        debt, debtor = heapq.heappop(debtors)
+        cents = min(-credit, -debt)
+        transfers.append(SettlementTransfer(from_user_id=debtor, to_user_id=creditor, amount=cents / 100))
+        if -credit > cents:
+            heapq.heappush(creditors, (credit + cents, creditor))
+        if -debt > cents:
+            heapq.heappush(debtors, (debt + cents, debtor))
+    return transfers
+
+
+def settle_trip(db: Session, trip: Trip) -> SettlementResponse:
+    """Net balance per person and the transfers that settle them, in the trip currency."""
+    participants = trip_participant_ids(db, trip)
+    totals = _paid_and_owed(db, trip.id)
+    even_share = totals.pop(None, (0.0, 0.0))[1] / len(participants)
+
+    # Former members who still paid for or share in expenses keep their balance.
+    user_ids = sorted(participants | set(totals))
+    names = dict(db.execute(select(User.id, User.username).where(User.id.in_(user_ids))).all())
+    paid = {user_id: totals.get(user_id, (0.0, 0.0))[0] for user_id in user_ids}
+    owed = {
+        user_id: totals.get(user_id, (0.0, 0.0))[1] + (even_share if user_id in participants else 0.0)
+        for user_id in user_ids
+    }
+
+    # Work in cents; put any rounding residue on the largest balance so the books close exactly.
+    net_cents = {user_id: round((paid[user_id] - owed[user_id]) * 100) for user_id in user_ids}
+    residue = sum(net_cents.values())
+    if residue and net_cents:
+        largest = max(net_cents, key=lambda user_id: abs(net_cents[user_id]))
+        net_cents[largest] -= residue
+
+    balances = [
+        SettlementBalance(
+            user_id=user_id,
+            username=names.get(user_id, ""),
+            paid=round(paid[user_id], 2),
+            owed=round(owed[user_id], 2),
+            net=net_cents[user_id] / 100,
+        )
+        for user_id in user_ids
+    ]
+    return SettlementResponse(
+        trip_id=trip.id, currency=trip.currency, balances=balances, transfers=minimal_transfers(net_cents)
+    )
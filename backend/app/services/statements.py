@@ -0,0 +1,369 @@
+"""Bank-statement (CSV / OFX) import into a trip's expenses."""
+
+from __future__ import annotations
+
+import csv
+import hashlib
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.models import BudgetEnvelope, Expense, Trip
+from app.schemas import StatementImportResult
+from app.services.fx import convert_expense_rows
+from app.services.locations import normalize_text
+from app.services.revisions import bump_trip_revision
+from app.services.rollups import apply_expense_rows
+
+IMPORT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 50
+# Past descriptions used to learn merchant -> envelope rules.
+HISTORY_LIMIT = 5000
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%m/%d/%y", "%d.%m.%Y", "%Y%m%d")
+
+# Header aliases for the columns banks commonly export (matched after normalize_text).
+CSV_COLUMNS = {
+    "date": ("date", "transaction date", "posted date", "posting date", "booking date", "value date"),
+    "description": ("description", "payee", "merchant", "name", "details", "memo", "narrative"),
+    "amount": ("amount", "transaction amount"),
+    "debit": ("debit", "withdrawal", "withdrawals", "money out"),
+    "credit": ("credit", "deposit", "deposits", "money in"),
+    "currency": ("currency",),
+    "category": ("category",),
+    "reference": ("transaction id", "reference", "fitid", "id"),
+}
+
+# Keywords for the default envelopes (see app.services.budgeting), on top of the category names themselves.
+CATEGORY_KEYWORDS = {
+    "food": (
+        "restaurant", "cafe", "coffee", "bakery", "bar", "pub", "bistro", "grocery", "supermarket",
+        "market", "pizza", "sushi", "burger", "deli", "starbucks", "mcdonalds", "dining", "food",
+    ),
+    "transport": (
+        "uber", "lyft", "taxi", "cab", "airline", "airlines", "airways", "rail", "train", "metro",
+        "subway", "bus", "ferry", "parking", "fuel", "gas station", "shell", "car rental", "toll",
+    ),
+    "activities": (
+        "museum", "tour", "tours", "ticket", "tickets", "theatre", "theater", "cinema", "park",
+        "gallery", "zoo", "aquarium", "concert", "admission", "excursion",
+    ),
+    "lodging": ("hotel", "hostel", "motel", "airbnb", "inn", "resort", "lodging"),
+}
+
+_DIGITS = re.compile(r"\b\w*\d\w*\b")
+_SPACES = re.compile(r"\s+")
+_AMOUNT_JUNK = re.compile(r"[^\d.\-]")
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+class StatementImportError(ValueError):
+    """Raised when a statement contains unreadable rows; nothing is written."""
+
+    def __init__(self, errors: List[dict]):
+        super().__init__(f"{len(errors)} invalid row(s)")
+        self.errors = errors
+
+
+@dataclass
+class StatementRow:
+    spent_at_date: date
+    description: str
+    # Signed as on the statement; which sign is spending depends on the source.
+    amount: float
+    currency: Optional[str] = None
+    category: Optional[str] = None
+    reference: Optional[str] = None
+
+
+def merchant_text(description: Optional[str]) -> str:
+    """Description reduced to its words: store numbers, card digits and punctuation dropped."""
+    return _SPACES.sub(" ", _DIGITS.sub(" ", normalize_text(description))).strip()
+
+
+def _parse_date(value: str, date_format: Optional[str]) -> date:
+    value = value.strip()
+    for fmt in (date_format,) if date_format else DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date {value!r}")
+
+
+def _parse_amount(value: str) -> float:
+    value = value.strip()
+    negative = value.startswith("(") and value.endswith(")")
+    cleaned = _AMOUNT_JUNK.sub("", value)
+    if not cleaned:
+        raise ValueError(f"Unrecognized amount {value!r}")
+    amount = float(cleaned)
+    return -abs(amount) if negative else amount
+
+
+def _csv_columns(header: Iterable[str]) -> Dict[str, int]:
+    positions = {normalize_text(name): index for index, name in enumerate(header)}
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        index = next((positions[alias] for alias in aliases if alias in positions), None)
+        if index is not None:
+            columns[field] = index
+    if "date" not in columns or "description" not in columns:
+        raise ValueError("Statement needs date and description columns")
+    if "amount" not in columns and "debit" not in columns:
+        raise ValueError("Statement needs an amount (or debit) column")
+    return columns
+
+
+def iter_csv_statement(fp: TextIO, date_format: Optional[str] = None) -> Iterator[StatementRow | dict]:
+    """Yield StatementRows from a bank CSV, or an error dict for rows that cannot be read.
+
+    Debit/credit column pairs are folded into one signed amount (debits negative).
+    """
+    reader = csv.reader(fp)
+    header = next(reader, None)
+    if header is None:
+        return
+    columns = _csv_columns(header)
+
+    def cell(row: List[str], field: str) -> str:
+        index = columns.get(field)
+        return row[index].strip() if index is not None and index < len(row) else ""
+
+    for line, row in enumerate(reader, start=2):
+        if not any(value.strip() for value in row):
+            continue
+        try:
+            if cell(row, "amount"):
+                amount = _parse_amount(cell(row, "amount"))
+            elif cell(row, "debit"):
+                amount = -abs(_parse_amount(cell(row, "debit")))
+            elif cell(row, "credit"):
+                amount = abs(_parse_amount(cell(row, "credit")))
+            else:
+                raise ValueError("Missing amount")
+            yield StatementRow(
+                spent_at_date=_parse_date(cell(row, "date"), date_format),
+                description=cell(row, "description") or "(no description)",
+                amount=amount,
+                currency=cell(row, "currency").upper() or None,
+                category=cell(row, "category") or None,
+                reference=cell(row, "reference") or None,
+            )
+        except ValueError as exc:
+            yield {"row": line, "error": str(exc)}
+
+
+def iter_ofx_statement(fp: TextIO) -> Iterator[StatementRow | dict]:
+    """Yield StatementRows from the <STMTTRN> blocks of an OFX (SGML or XML) file, line by line."""
+    currency: Optional[str] = None
+    txn: Optional[Dict[str, str]] = None
+    count = 0
+
+    def finish(fields: Dict[str, str]):
+        try:
+            return StatementRow(
+                spent_at_date=_parse_date(fields.get("DTPOSTED", "")[:8], "%Y%m%d"),
+                description=fields.get("NAME") or fields.get("MEMO") or "(no description)",
+                amount=_parse_amount(fields.get("TRNAMT", "")),
+                currency=fields.get("CURRENCY") or currency,
+                reference=fields.get("FITID"),
+            )
+        except ValueError as exc:
+            return {"row": count, "error": str(exc)}
+
+    for line in fp:
+        for closing, tag, value in _OFX_TAG.findall(line):
+            tag = tag.upper()
+            value = value.strip()
+            if tag == "STMTTRN":
+                if closing and txn is not None:
+                    count += 1
+                    yield finish(txn)
+                    txn = None
+                elif not closing:
+                    txn = {}
+            elif closing:
+                continue
+            elif txn is not None:
+                if tag == "CURSYM" and value:
+                    txn["CURRENCY"] = value.upper()
+                elif value:
+                    txn[tag] = value
+            elif tag == "CURDEF" and value:
+                currency = value.upper()
+
+
+class EnvelopeMatcher:
+    """Keyword/merchant rules for one trip, compiled into two regexes.
+
+    Merchants learned from past categorized expenses win over category keywords.
+    Alternatives are ordered longest first, so the longest phrase at a position matches.
+    """
+
+    def __init__(self, merchants: Dict[str, int], keywords: Dict[str, int]):
+        self._merchants = merchants
+        self._keywords = keywords
+        self._merchant_pattern = self._compile(merchants)
+        self._keyword_pattern = self._compile(keywords)
+
+    @staticmethod
+    def _compile(phrases: Dict[str, int]) -> Optional[re.Pattern]:
+        if not phrases:
+            return None
+        ordered = sorted(phrases, key=len, reverse=True)
+        return re.compile(r"\b(?:" + "|".join(re.escape(phrase) for phrase in ordered) + r")\b")
+
+    def match(self, text: str) -> Optional[int]:
+        for pattern, phrases in ((self._merchant_pattern, self._merchants), (self._keyword_pattern, self._keywords)):
+            if pattern is not None:
+                found = pattern.search(text)
+                if found:
+                    return phrases[found.group(0)]
+        return None
+
+
+def _merchant_key(text: str) -> str:
+    return " ".join(text.split()[:2])
+
+
+def build_envelope_matcher(db: Session, trip: Trip) -> EnvelopeMatcher:
+    """Rules from the trip's envelope categories and its owner's past categorized expenses."""
+    envelopes = {
+        normalize_text(category): env_id
+        for env_id, category in db.execute(
+            select(BudgetEnvelope.id, BudgetEnvelope.category).where(BudgetEnvelope.trip_id == trip.id)
+        )
+    }
+    keywords: Dict[str, int] = {}
+    for category, env_id in envelopes.items():
+        if category:
+            keywords[category] = env_id
+        for keyword in CATEGORY_KEYWORDS.get(category, ()):
+            keywords.setdefault(keyword, env_id)
+
+    # Merchant -> category votes from the owner's trips, mapped onto this trip's envelopes by name.
+    history = db.execute(
+        select(Expense.description, BudgetEnvelope.category)
+        .join(BudgetEnvelope, BudgetEnvelope.id == Expense.envelope_id)
+        .join(Trip, Trip.id == Expense.trip_id)
+        .where(Trip.owner_id == trip.owner_id)
+        .order_by(Expense.id.desc())
+        .limit(HISTORY_LIMIT)
+    )
+    votes: Dict[str, Counter] = defaultdict(Counter)
+    for description, category in history:
+        env_id = envelopes.get(normalize_text(category))
+        merchant = _merchant_key(merchant_text(description))
+        if env_id is not None and len(merchant) >= 3:
+            votes[merchant][env_id] += 1
+    merchants = {merchant: counts.most_common(1)[0][0] for merchant, counts in votes.items()}
+    return EnvelopeMatcher(merchants, keywords)
+
+
+def _dedupe_hash(fingerprint: tuple, occurrence: int) -> str:
+    """Stable per-row hash; `occurrence` tells identical rows within one statement apart."""
+    key = "|".join(str(part) if part is not None else "" for part in (*fingerprint, occurrence))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def _insert_skipping_duplicates(db: Session):
+    """INSERT that leaves rows with a known (trip_id, dedupe_hash) alone and returns the hashes it wrote.
+
+    The pre-check in import_statement skips most duplicates; this covers concurrent imports
+    of overlapping statements racing past it.
+    """
+    dialect = db.get_bind().dialect.name
+    stmt = (postgresql if dialect == "postgresql" else sqlite).insert(Expense)
+    return stmt.on_conflict_do_nothing(index_elements=[Expense.trip_id, Expense.dedupe_hash]).returning(
+        Expense.dedupe_hash
+    )
+
+
+def import_statement(
+    db: Session,
+    trip: Trip,
+    rows: Iterable[StatementRow | dict],
+    currency: Optional[str] = None,
+    spend_sign: int = -1,
+) -> StatementImportResult:
+    """Insert a statement's spending rows as expenses inside the caller's transaction.
+
+    Rows with the other sign (refunds, payments) are skipped, as are rows the trip
+    already has (same dedupe hash). The caller commits on success. Raises
+    StatementImportError (after rolling back) if any row is unreadable.
+    """
+    matcher = build_envelope_matcher(db, trip)
+    default_currency = (currency or trip.currency).upper()
+    occurrences: Counter = Counter()
+    counts = {"rows": 0, "imported": 0, "duplicates": 0, "skipped": 0, "categorized": 0}
+    errors: List[dict] = []
+
+    def flush_chunk(chunk: List[dict]) -> None:
+        existing = set(
+            db.scalars(
+                select(Expense.dedupe_hash).where(
+                    Expense.trip_id == trip.id, Expense.dedupe_hash.in_([row["dedupe_hash"] for row in chunk])
+                )
+            )
+        )
+        fresh = [row for row in chunk if row["dedupe_hash"] not in existing]
+        if fresh:
+            convert_expense_rows(db, fresh, trip.currency)
+            written = set(db.scalars(_insert_skipping_duplicates(db), fresh))
+            fresh = [row for row in fresh if row["dedupe_hash"] in written]
+        counts["duplicates"] += len(chunk) - len(fresh)
+        if not fresh:
+            return
+        apply_expense_rows(db, fresh)
+        counts["imported"] += len(fresh)
+        counts["categorized"] += sum(1 for row in fresh if row["envelope_id"] is not None)
+
+    chunk: List[dict] = []
+    for row in rows:
+        counts["rows"] += 1
+        if isinstance(row, dict):
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append(row)
+            continue
+        if errors:
+            continue  # keep reading to report errors, but stop writing
+        if row.amount * spend_sign <= 0:
+            counts["skipped"] += 1
+            continue
+        row_currency = row.currency or default_currency
+        merchant = merchant_text(row.description)
+        fingerprint = (row.reference, row.spent_at_date.isoformat(), f"{row.amount:.2f}", row_currency, merchant)
+        occurrence = occurrences[fingerprint]
+        occurrences[fingerprint] += 1
+        text = f"{merchant} {normalize_text(row.category)}" if row.category else merchant
+        chunk.append(
+            {
+                "trip_id": trip.id,
+                "envelope_id": matcher.match(text),
+                "description": row.description,
+                "amount": abs(row.amount),
+                "currency": row_currency,
+                "spent_at_date": row.spent_at_date,
+                "dedupe_hash": _dedupe_hash(fingerprint, occurrence),
+            }
+        )
+        if len(chunk) >= IMPORT_CHUNK_SIZE:
+            flush_chunk(chunk)
+            chunk = []
+
+    if errors:
+        db.rollback()
+        raise StatementImportError(errors)
+    if chunk:
+        flush_chunk(chunk)
+
+    if counts["imported"]:
+        bump_trip_revision(db, trip.id)
+    return StatementImportResult(**counts, uncategorized=counts["imported"] - counts["categorized"])
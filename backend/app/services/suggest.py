@@ -0,0 +1,205 @@
+"""In-memory prefix index for location autocomplete.
+
+Lookups are a bisect into a sorted token list and never touch the database. The
+index is built from the database on first use, then kept current from committed
+writes in this process. Writes made elsewhere (other workers, the backfill script)
+are picked up by a reload when the tables' version marker changes; the marker is
+checked at most every VERSION_CHECK_SECONDS.
+"""
+
+from __future__ import annotations
+
+import time
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, inspect, select, union_all
+from sqlalchemy.orm import Session
+
+from app.models import Event, Location, TripDestination
+from app.schemas import LocationRead
+from app.services.locations import normalize_text
+
+PENDING_KEY = "suggest_pending"
+REMOVED_KEY = "suggest_removed"
+VERSION_CHECK_SECONDS = 60
+# Equal usage ties go to locations whose name (rather than address or a later word) matches.
+NAME_MATCH_BONUS = 0.5
+
+
+def _tokens(location: LocationRead) -> Iterable[Tuple[str, bool]]:
+    """Every word-boundary suffix of the normalized name and address: "joe s pizza", "s pizza", "pizza".
+
+    The flag marks the full name, which ranks ahead of other matches.
+    """
+    for text, is_name in ((location.name, True), (location.address, False)):
+        words = normalize_text(text).split()
+        for start in range(len(words)):
+            yield " ".join(words[start:]), is_name and start == 0
+
+
+def _prefix_end(prefix: str) -> str:
+    return prefix + "\U0010ffff"
+
+
+class LocationSuggestIndex:
+    """Sorted token array (bisect) with parallel numpy columns for ranking a prefix range by usage."""
+
+    def __init__(self) -> None:
+        self._tokens: List[str] = []
+        self._ids = np.empty(0, dtype=np.int64)
+        self._bonus = np.empty(0, dtype=np.float64)
+        self._uses = np.zeros(1, dtype=np.float64)  # indexed by location id
+        self._locations: Dict[int, LocationRead] = {}
+        self._loaded = False
+        self._version: Optional[tuple] = None
+        self._checked_at = 0.0
+        self._lock = Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    @staticmethod
+    def _table_version(db: Session) -> tuple:
+        # Row counts catch deleted (merged) locations and references added elsewhere; max(id) catches new ones.
+        return (
+            db.scalar(select(func.count()).select_from(Location)),
+            db.scalar(select(func.max(Location.id))),
+            db.scalar(select(func.count()).select_from(TripDestination)),
+            db.scalar(select(func.count(Event.location_id))),
+        )
+
+    def ensure_loaded(self, db: Session) -> None:
+        """Load on first use, then reload when the version marker has changed since the last load."""
+        if self._loaded and time.monotonic() - self._checked_at < VERSION_CHECK_SECONDS:
+            return
+        version = self._table_version(db)
+        with self._lock:
+            self._checked_at = time.monotonic()
+            if self._loaded and version == self._version:
+                return
+            refs = union_all(
+                select(TripDestination.location_id.label("location_id")),
+                select(Event.location_id.label("location_id")).where(Event.location_id.is_not(None)),
+            ).subquery()
+            uses = db.execute(select(refs.c.location_id, func.count()).group_by(refs.c.location_id)).all()
+            self._locations = {loc.id: LocationRead.model_validate(loc) for loc in db.scalars(select(Location))}
+
+            entries = sorted(
+                (token, loc_id, is_name) for loc_id, loc in self._locations.items() for token, is_name in _tokens(loc)
+            )
+            self._tokens = [token for token, _, _ in entries]
+            self._ids = np.fromiter((loc_id for _, loc_id, _ in entries), dtype=np.int64, count=len(entries))
+            self._bonus = np.fromiter(
+                (NAME_MATCH_BONUS if is_name else 0.0 for _, _, is_name in entries), dtype=np.float64, count=len(entries)
+            )
+            self._uses = np.zeros(max(self._locations, default=0) + 1, dtype=np.float64)
+            for loc_id, count in uses:
+                if loc_id < len(self._uses):
+                    self._uses[loc_id] = count
+            self._version = version
+            self._loaded = True
+
+    def suggest(self, query: str, limit: int = 10) -> List[LocationRead]:
+        prefix = normalize_text(query)
+        if not prefix:
+            return []
+        with self._lock:
+            lo = bisect_left(self._tokens, prefix)
+            hi = bisect_left(self._tokens, _prefix_end(prefix), lo)
+            if lo == hi:
+                return []
+            ids = self._ids[lo:hi]
+            scores = self._uses[ids] + self._bonus[lo:hi]
+            # Partially order just enough of the range to fill `limit` distinct locations.
+            take = min(len(ids), limit * 4)
+            while True:
+                top = np.argpartition(-scores, take - 1)[:take] if take < len(ids) else np.arange(len(ids))
+                best: Dict[int, float] = {}
+                for pos in top:
+                    loc_id = int(ids[pos])
+                    best[loc_id] = max(best.get(loc_id, 0.0), float(scores[pos]))
+                if len(best) >= limit or take == len(ids):
+                    break
+                take = min(len(ids), take * 4)
+            ranked = sorted(best, key=lambda loc_id: (-best[loc_id], self._locations[loc_id].name))
+            return [self._locations[loc_id] for loc_id in ranked[:limit]]
+
+    def apply(self, changes: Iterable[Tuple[int, int, Optional[LocationRead]]]) -> None:
+        """Apply committed (location_id, uses, snapshot) changes; a snapshot adds or refreshes the entry."""
+        with self._lock:
+            if not self._loaded:
+                return  # the first lookup loads committed state from the database
+            for loc_id, uses, snapshot in changes:
+                if snapshot is not None:
+                    previous = self._locations.get(loc_id)
+                    if previous is None or (previous.name, previous.address) != (snapshot.name, snapshot.address):
+                        if previous is not None:
+                            self._remove_tokens(loc_id)
+                        self._insert_tokens(loc_id, snapshot)
+                    self._locations[loc_id] = snapshot
+                if uses and loc_id in self._locations:
+                    self._uses[loc_id] += uses
+
+    def remove(self, location_ids: Iterable[int]) -> None:
+        """Drop committed deletions so they are no longer suggested."""
+        with self._lock:
+            if not self._loaded:
+                return
+            for loc_id in location_ids:
+                if self._locations.pop(loc_id, None) is not None:
+                    self._remove_tokens(loc_id)
+
+    def _insert_tokens(self, loc_id: int, location: LocationRead) -> None:
+        if loc_id >= len(self._uses):
+            self._uses = np.concatenate([self._uses, np.zeros(max(loc_id + 1 - len(self._uses), 1024))])
+        for token, is_name in _tokens(location):
+            pos = bisect_left(self._tokens, token)
+            self._tokens.insert(pos, token)
+            self._ids = np.insert(self._ids, pos, loc_id)
+            self._bonus = np.insert(self._bonus, pos, NAME_MATCH_BONUS if is_name else 0.0)
+
+    def _remove_tokens(self, loc_id: int) -> None:
+        keep = self._ids != loc_id
+        self._tokens = [token for token, kept in zip(self._tokens, keep) if kept]
+        self._ids = self._ids[keep]
+        self._bonus = self._bonus[keep]
+
+
+location_suggestions = LocationSuggestIndex()
+
+
+def track_location_use(db: Session, location_id: int, uses: int = 1, snapshot: Optional[LocationRead] = None) -> None:
+    """Queue an index update to apply once the session commits (for Core writes the flush hook can't see)."""
+    db.info.setdefault(PENDING_KEY, []).append((location_id, uses, snapshot))
+
+
+def queue_location_changes_on_flush(session: Session, flush_context) -> None:
+    """`after_flush` hook: collect new/changed/deleted locations and new location references from ORM writes."""
+    for obj in session.deleted:
+        if isinstance(obj, Location):
+            session.info.setdefault(REMOVED_KEY, []).append(obj.id)
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Location):
+            if obj in session.new or session.is_modified(obj):
+                track_location_use(session, obj.id, 0, LocationRead.model_validate(obj))
+        elif isinstance(obj, (TripDestination, Event)) and obj.location_id is not None:
+            if obj in session.new or inspect(obj).attrs.location_id.history.has_changes():
+                track_location_use(session, obj.location_id)
+
+
+def apply_location_changes_on_commit(session: Session) -> None:
+    changes = session.info.pop(PENDING_KEY, None)
+    if changes:
+        location_suggestions.apply(changes)
+    removed = session.info.pop(REMOVED_KEY, None)
+    if removed:
+        location_suggestions.remove(removed)
+
+
+def discard_location_changes_on_rollback(session: Session) -> None:
+    session.info.pop(PENDING_KEY, None)
+    session.info.pop(REMOVED_KEY, None)
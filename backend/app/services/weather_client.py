@@ -4,21 +4,25 @@ from typing import Dict, List, Optional, Tuple
 import httpx
 
 
-async def geocode_city(name: str) -> Optional[Tuple[float, float]]:
+async def geocode_city(name: str, client: Optional[httpx.AsyncClient] = None) -> Optional[Tuple[float, float]]:
+    """Look up coordinates for a place name; pass `client` to reuse one connection pool across a batch."""
+    if client is None:
+        async with httpx.AsyncClient(timeout=10) as own_client:
+            return await geocode_city(name, own_client)
+
     url = "https://geocoding-api.open-meteo.com/v1/search"
     params = {"name": name, "count": 1}
-    async with httpx.AsyncClient(timeout=10) as client:
-        try:
-            resp = await client.get(url, params=params)
-            resp.raise_for_status()
-            data = resp.json()
-            results = data.get("results") or []
-            if not results:
-                return None
-            first = results[0]
-            return float(first["latitude"]), float(first["longitude"])
-        except Exception:
+    try:
+        resp = await client.get(url, params=params)
+        resp.raise_for_status()
+        data = resp.json()
+        results = data.get("results") or []
+        if not results:
             return None
+        first = results[0]
+        return float(first["latitude"]), float(first["longitude"])
+    except Exception:
+        return None
 
 
 async def fetch_daily_forecast(lat: float, lon: float, start_date: date, end_date: date) -> List[Dict]:
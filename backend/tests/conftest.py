@@ -0,0 +1,46 @@
+"""Test fixtures: a throwaway SQLite database migrated to head, and an authenticated client."""
+
+import os
+import subprocess
+import sys
+import tempfile
+from itertools import count
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+DB_PATH = Path(tempfile.mkdtemp()) / "test.db"
+
+# Settings are read once on import, so point them at the test database first.
+os.environ["TRIP_PLANNER_DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=BACKEND_DIR, check=True, capture_output=True)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.main import app  # noqa: E402
+
+_users = count(1)
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def headers(client):
+    """Bearer headers for a freshly registered user."""
+    name = f"user{next(_users)}"
+    client.post("/auth/register", json={"email": f"{name}@example.com", "username": name, "password": "pw"})
+    token = client.post("/auth/login", json={"username": name, "password": "pw"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def trip(client, headers):
+    body = {"name": "Test trip", "destination": "Paris", "start_date": "2030-01-01", "end_date": "2030-01-05", "total_budget": 1000}
+    response = client.post("/trips", json=body, headers=headers)
+    assert response.status_code == 201, response.text
+    return response.json()
@@ -0,0 +1,46 @@
+"""Visiting-order optimization honours fixed endpoints."""
+
+import numpy as np
+import pytest
+
+from app.services.routing import optimize_order
+
+
+def random_stops(rng, n):
+    return rng.uniform(48.0, 49.0, n), rng.uniform(2.0, 3.0, n)
+
+
+@pytest.mark.parametrize("n", [2, 3, 6, 12])
+def test_fixed_end_only(n):
+    rng = np.random.default_rng(n)
+    for _ in range(50):
+        lat, lon = random_stops(rng, n)
+        for end in (0, n - 1, int(rng.integers(n))):
+            order = optimize_order(lat, lon, start=None, end=end)
+            assert sorted(order) == list(range(n))
+            assert order[-1] == end
+
+
+@pytest.mark.parametrize("n", [3, 6, 12])
+def test_fixed_start_and_end(n):
+    rng = np.random.default_rng(100 + n)
+    for _ in range(50):
+        lat, lon = random_stops(rng, n)
+        start, end = rng.choice(n, size=2, replace=False)
+        order = optimize_order(lat, lon, start=int(start), end=int(end))
+        assert sorted(order) == list(range(n))
+        assert (order[0], order[-1]) == (start, end)
+
+
+def test_same_start_and_end_rejected():
+    with pytest.raises(ValueError):
+        optimize_order([48.1, 48.2, 48.3], [2.1, 2.2, 2.3], start=1, end=1)
+
+
+def test_optimize_endpoint_same_stop_is_bad_request(client, headers, trip):
+    response = client.post(
+        f"/trips/{trip['id']}/destinations/optimize",
+        json={"start_destination_id": 1, "end_destination_id": 1},
+        headers=headers,
+    )
+    assert response.status_code == 400
@@ -39,7 +39,7 @@ export default function TripsListPage() {
       setTrips(list)
       // Fetch budget summaries in the background so cards can show planned totals.
       const results = await Promise.allSettled(
-        list.map((t) => api.get<BudgetSummaryResponse>(`/trips/${t.id}/budget`).catch((e) => e))
+        list.map((t) => api.get<BudgetSummaryResponse>(`/trips/${t.id}/budget?include_expenses=false`).catch((e) => e))
       )
       const summaryMap: Record<number, { planned: number; actual: number }> = {}
       results.forEach((res, idx) => {